@@ -0,0 +1,99 @@
+# app/circuit_breaker.py
+"""
+Circuit breaker para as chamadas ao iFood.
+
+Com o iFood degradado (timeouts, erros de rede, 5xx), continuar chamando só acumula
+conexões presas e workers esperando. Depois de IFOOD_BREAKER_FAILURE_THRESHOLD falhas
+seguidas o circuito ABRE e as chamadas falham na hora (503) por IFOOD_BREAKER_RESET_SECONDS;
+então uma única chamada de teste (meio-aberto) decide se o circuito fecha ou abre de novo.
+"""
+import os
+import time
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+IFOOD_BREAKER_FAILURE_THRESHOLD = int(os.getenv("IFOOD_BREAKER_FAILURE_THRESHOLD", "10"))
+IFOOD_BREAKER_RESET_SECONDS = float(os.getenv("IFOOD_BREAKER_RESET_SECONDS", "30"))
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+
+# Valor numérico do estado, para o gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(HTTPException):
+    """
+    Chamada recusada sem ir ao iFood. É um HTTPException 503: os endpoints respondem 503 e a
+    fila de pedidos trata como erro transitório (nova tentativa com backoff).
+    """
+
+    def __init__(self, name: str, retry_after_seconds: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"API do iFood ({name}) indisponível no momento; tente novamente em {retry_after_seconds:.0f}s.",
+            headers={"Retry-After": str(max(1, round(retry_after_seconds)))},
+        )
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = IFOOD_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = IFOOD_BREAKER_RESET_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self) -> bool:
+        """
+        Libera a chamada ou levanta CircuitOpenError. Retorna True se ela é a chamada de teste
+        do meio-aberto (repassar ao `record`).
+        """
+        if self.state == OPEN:
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(self.name, remaining)
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.name, self.reset_seconds)
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record(self, success: Optional[bool], is_probe: bool = False) -> None:
+        """
+        Resultado da chamada: True (ok), False (falha do iFood) ou None (neutro, ex.: cancelada).
+        Só a chamada de teste decide o meio-aberto; uma chamada liberada com o circuito fechado
+        que termina depois dele abrir não mexe no estado nem na vaga do teste.
+        """
+        if is_probe:
+            self._probe_in_flight = False
+            if success is None:
+                return  # a vaga fica livre para outra chamada de teste
+            if success:
+                self.consecutive_failures = 0
+                self.state = CLOSED
+            else:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+            return
+
+        if success is None or self.state != CLOSED:
+            return
+        if success:
+            self.consecutive_failures = 0
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.state = OPEN
+            self._opened_at = time.monotonic()
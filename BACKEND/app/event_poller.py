@@ -0,0 +1,300 @@
+# app/event_poller.py
+"""
+Consumidor de eventos por polling (alternativa/complemento ao webhook).
+
+A cada rodada consulta o endpoint de polling do iFood para TODOS os merchants autorizados
+(em paralelo, com concorrência limitada), entrega todos os eventos da rodada de uma vez ao
+mesmo caminho de ingestão do webhook em lote (deduplicação + fila durável) e só então
+confirma (acknowledgment) os eventos em lote. Se a ingestão falhar, nada é confirmado e o
+iFood entrega os eventos de novo.
+
+O intervalo é adaptativo (encurta enquanto há eventos, dobra até o máximo quando vazio) e
+há back-pressure: com a fila de pedidos acima do limite, a rodada é adiada.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .ifood_http import IFOOD_API_BASE_URL, ifood_request
+from .metrics import registry
+from .repositories import IntegracoesRepository
+
+logger = logging.getLogger(__name__)
+
+IFOOD_EVENTS_POLLING_URL = f"{IFOOD_API_BASE_URL}/events/v1.0/events:polling"
+IFOOD_EVENTS_ACK_URL = f"{IFOOD_API_BASE_URL}/events/v1.0/events/acknowledgment"
+
+EVENT_POLLING_ENABLED = os.getenv("EVENT_POLLING_ENABLED", "0") == "1"
+EVENT_POLLING_MIN_INTERVAL_SECONDS = float(os.getenv("EVENT_POLLING_MIN_INTERVAL_SECONDS", "5"))
+EVENT_POLLING_MAX_INTERVAL_SECONDS = float(os.getenv("EVENT_POLLING_MAX_INTERVAL_SECONDS", "30"))
+EVENT_POLLING_CONCURRENCY = int(os.getenv("EVENT_POLLING_CONCURRENCY", "20"))
+EVENT_POLLING_MAX_QUEUE_DEPTH = int(os.getenv("EVENT_POLLING_MAX_QUEUE_DEPTH", "5000"))
+EVENT_POLLING_MERCHANTS_REFRESH_SECONDS = float(os.getenv("EVENT_POLLING_MERCHANTS_REFRESH_SECONDS", "60"))
+EVENT_POLLING_ACK_CHUNK = 1000
+
+# Códigos do polling (fullCode) -> códigos usados pelo webhook / pelo resto da aplicação
+POLLING_CODE_TO_WEBHOOK_CODE = {
+    "PLACED": "ORDER_PLACED",
+    "CONFIRMED": "ORDER_CONFIRMED",
+    "CANCELLED": "ORDER_CANCELED",
+    "CANCELED": "ORDER_CANCELED",
+}
+# Códigos abreviados do polling ('code') -> fullCode, para eventos que chegam sem o 'fullCode'
+POLLING_SHORT_CODE_TO_FULL_CODE = {
+    "PLC": "PLACED",
+    "CFM": "CONFIRMED",
+    "PRS": "PREPARATION_STARTED",
+    "RTP": "READY_TO_PICKUP",
+    "DSP": "DISPATCHED",
+    "CON": "CONCLUDED",
+    "CAN": "CANCELLED",
+}
+
+# record_fn(restaurante_id) -> registro de integração com token válido
+RecordFn = Callable[[str], Awaitable[Dict[str, Any]]]
+# ingest_fn([(restaurante_id, evento_no_formato_do_webhook)]) -> resumo
+IngestFn = Callable[[List[Tuple[str, Dict[str, Any]]]], Awaitable[Dict[str, Any]]]
+QueueDepthFn = Callable[[], int]
+
+ROUNDS = registry.counter(
+    "event_poller_rounds_total",
+    "Rodadas de polling por resultado (events, empty, error, backpressure).",
+    labelnames=("result",),
+)
+EVENTS = registry.counter(
+    "event_poller_events_total",
+    "Eventos recebidos (polled), confirmados (acked), descartados por inválidos (invalid) e deixados sem "
+    "confirmação por código desconhecido (unmapped) via polling.",
+    labelnames=("stage",),
+)
+MERCHANT_ERRORS = registry.counter(
+    "event_poller_merchant_errors_total",
+    "Falhas ao consultar ou confirmar eventos de um merchant.",
+    labelnames=("stage",),
+)
+ROUND_SECONDS = registry.histogram(
+    "event_poller_round_seconds",
+    "Duração de uma rodada completa (polling + ingestão + acknowledgment).",
+)
+INTERVAL_SECONDS = registry.gauge(
+    "event_poller_interval_seconds",
+    "Intervalo atual entre rodadas de polling.",
+)
+
+
+def to_webhook_event(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Converte um evento do polling para o formato do IfoodWebhookPayload. Sem 'fullCode', o
+    'code' abreviado é traduzido; se for desconhecido devolve None (o evento não é confirmado).
+    """
+    code = event.get("code")
+    full_code = event.get("fullCode") or POLLING_SHORT_CODE_TO_FULL_CODE.get(code)
+    if not full_code and code in POLLING_SHORT_CODE_TO_FULL_CODE.values():
+        full_code = code
+    if not full_code:
+        return None
+    return {
+        # Como no webhook, o 'id' é o ID do pedido; o ID do evento vira correlationId
+        "id": event.get("orderId") or event.get("id"),
+        "code": POLLING_CODE_TO_WEBHOOK_CODE.get(full_code, f"ORDER_{full_code}"),
+        "correlationId": event.get("id"),
+        "metadata": {**(event.get("metadata") or {}), "merchantId": event.get("merchantId")},
+    }
+
+
+class EventPoller:
+    def __init__(
+        self,
+        integracoes: IntegracoesRepository,
+        record_fn: RecordFn,
+        ingest_fn: IngestFn,
+        queue_depth_fn: QueueDepthFn,
+        plataforma: str = "ifood",
+        min_interval_seconds: float = EVENT_POLLING_MIN_INTERVAL_SECONDS,
+        max_interval_seconds: float = EVENT_POLLING_MAX_INTERVAL_SECONDS,
+        concurrency: int = EVENT_POLLING_CONCURRENCY,
+        max_queue_depth: int = EVENT_POLLING_MAX_QUEUE_DEPTH,
+    ):
+        self._integracoes = integracoes
+        self._record_fn = record_fn
+        self._ingest_fn = ingest_fn
+        self._queue_depth_fn = queue_depth_fn
+        self.plataforma = plataforma
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max_interval_seconds
+        self.max_queue_depth = max_queue_depth
+        self.interval_seconds = max_interval_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._merchants: List[Tuple[str, str]] = []  # (restaurante_id, external_merchant_id)
+        self._merchants_loaded_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _load_merchants(self) -> List[Tuple[str, str]]:
+        if time.monotonic() - self._merchants_loaded_at > EVENT_POLLING_MERCHANTS_REFRESH_SECONDS:
+            records = await self._integracoes.list_authorized(self.plataforma)
+            self._merchants = [
+                (record["restaurante_id"], record["external_merchant_id"])
+                for record in records
+                if record.get("external_merchant_id")
+            ]
+            self._merchants_loaded_at = time.monotonic()
+        return self._merchants
+
+    async def _poll_merchant(self, restaurante_id: str, merchant_id: str) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        async with self._semaphore:
+            try:
+                record = await self._record_fn(restaurante_id)
+                access_token = record.get("access_token")
+                response = await ifood_request(
+                    "GET",
+                    IFOOD_EVENTS_POLLING_URL,
+                    endpoint="events_poll",
+                    merchant_key=restaurante_id,
+                    headers={
+                        "accept": "application/json",
+                        "Authorization": f"Bearer {access_token}",
+                        "x-polling-merchants": merchant_id,
+                    },
+                )
+                if response.status_code == 204:
+                    return access_token, []
+                response.raise_for_status()
+                return access_token, response.json() or []
+            except Exception as e:
+                MERCHANT_ERRORS.inc(stage="poll")
+                logger.error("Erro no polling de eventos do merchant", extra={"merchant_id": merchant_id, "error": getattr(e, "detail", str(e))})
+                return None, []
+
+    async def _acknowledge(self, restaurante_id: str, access_token: str, event_ids: List[str]) -> None:
+        for start in range(0, len(event_ids), EVENT_POLLING_ACK_CHUNK):
+            chunk = event_ids[start:start + EVENT_POLLING_ACK_CHUNK]
+            async with self._semaphore:
+                try:
+                    response = await ifood_request(
+                        "POST",
+                        IFOOD_EVENTS_ACK_URL,
+                        endpoint="events_ack",
+                        merchant_key=restaurante_id,
+                        headers={"Authorization": f"Bearer {access_token}"},
+                        json=[{"id": event_id} for event_id in chunk],
+                    )
+                    response.raise_for_status()
+                    EVENTS.inc(len(chunk), stage="acked")
+                except Exception as e:
+                    # Sem ACK o iFood reentrega; a deduplicação descarta a repetição
+                    MERCHANT_ERRORS.inc(stage="ack")
+                    logger.error("Erro ao confirmar eventos no iFood", extra={"events": len(chunk), "error": str(e)})
+
+    async def poll_once(self) -> int:
+        """Executa uma rodada completa. Retorna quantos eventos foram recebidos."""
+        merchants = await self._load_merchants()
+        results = await asyncio.gather(*(
+            self._poll_merchant(restaurante_id, merchant_id) for restaurante_id, merchant_id in merchants
+        ))
+
+        mapped: List[Tuple[str, Dict[str, Any]]] = []
+        acks: List[Tuple[str, str, List[str]]] = []
+        malformed = 0
+        unmapped: List[str] = []
+        for (restaurante_id, _), (access_token, events) in zip(merchants, results):
+            # Sem ID o evento não pode nem ser confirmado: só é contado
+            valid = [event for event in events if isinstance(event, dict) and event.get("id")]
+            malformed += len(events) - len(valid)
+            event_ids = []
+            for event in valid:
+                webhook_event = to_webhook_event(event)
+                if webhook_event is None:
+                    # Código desconhecido: sem ACK o iFood reentrega (não some em silêncio)
+                    unmapped.append(str(event.get("code")))
+                    continue
+                mapped.append((restaurante_id, webhook_event))
+                event_ids.append(event["id"])
+            if event_ids:
+                acks.append((restaurante_id, access_token, event_ids))
+
+        if malformed:
+            EVENTS.inc(malformed, stage="invalid")
+            logger.warning("Eventos do polling sem ID descartados", extra={"events": malformed})
+        if unmapped:
+            EVENTS.inc(len(unmapped), stage="unmapped")
+            logger.warning(
+                "Eventos do polling com código desconhecido não confirmados",
+                extra={"events": len(unmapped), "codes": sorted(set(unmapped))},
+            )
+        if not mapped:
+            return 0
+        EVENTS.inc(len(mapped), stage="polled")
+
+        # Mesmo caminho do webhook em lote; se falhar, não confirma nada (o iFood reentrega).
+        # Eventos inválidos para o modelo são descartados lá e confirmados com os demais.
+        result = await self._ingest_fn(mapped)
+        if result.get("invalid"):
+            EVENTS.inc(result["invalid"], stage="invalid")
+        await asyncio.gather(*(self._acknowledge(*ack) for ack in acks))
+        return len(mapped)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="event-poller")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            if self._queue_depth_fn() > self.max_queue_depth:
+                # Back-pressure: os workers ainda não deram conta do que já foi recebido
+                ROUNDS.inc(result="backpressure")
+                self.interval_seconds = self.max_interval_seconds
+            else:
+                started = time.perf_counter()
+                try:
+                    received = await self.poll_once()
+                    ROUNDS.inc(result="events" if received else "empty")
+                except Exception:
+                    received = 0
+                    ROUNDS.inc(result="error")
+                    logger.exception("Erro na rodada de polling de eventos")
+                ROUND_SECONDS.observe(time.perf_counter() - started)
+
+                if received:
+                    self.interval_seconds = self.min_interval_seconds
+                else:
+                    self.interval_seconds = min(self.max_interval_seconds, self.interval_seconds * 2)
+
+            INTERVAL_SECONDS.set(self.interval_seconds)
+            await asyncio.sleep(self.interval_seconds)
+
+
+_poller: Optional[EventPoller] = None
+
+
+def start_event_poller(
+    integracoes: IntegracoesRepository,
+    record_fn: RecordFn,
+    ingest_fn: IngestFn,
+    queue_depth_fn: QueueDepthFn,
+) -> Optional[EventPoller]:
+    """Inicia o polling (chamado no lifespan). Ligado com EVENT_POLLING_ENABLED=1."""
+    global _poller
+    if not EVENT_POLLING_ENABLED:
+        return None
+    if _poller is None:
+        _poller = EventPoller(integracoes, record_fn, ingest_fn, queue_depth_fn)
+        _poller.start()
+    return _poller
+
+
+async def stop_event_poller() -> None:
+    global _poller
+    if _poller is not None:
+        await _poller.stop()
+        _poller = None
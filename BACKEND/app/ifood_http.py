@@ -0,0 +1,309 @@
+# app/ifood_http.py
+"""
+Cliente HTTP compartilhado para todas as chamadas à API do iFood.
+
+Um único httpx.AsyncClient vive durante todo o ciclo de vida da aplicação (aberto e
+fechado pelo lifespan em main.py), reaproveitando conexões keep-alive e HTTP/2 em vez
+de pagar um handshake TCP+TLS a cada chamada.
+
+Toda chamada passa por um limitador de taxa (global e por merchant, que respeita o
+Retry-After dos 429) e por um circuit breaker por endpoint. O limite por merchant usa o
+`merchant_key` que quem chama informa (o restaurante_id): o token não serve de chave, porque
+a Rappi manda no x-authorization um token da aplicação e a 99Food manda o token no corpo.
+
+Os adaptadores dos outros marketplaces (app/platforms) usam o mesmo pool com
+`ifood_request(..., platform="rappi")`: cada plataforma tem o seu limite global
+(<PLATAFORMA>_RATE_LIMIT_PER_SECOND) e seus endpoints aparecem nas métricas e nos circuit
+breakers com o prefixo da plataforma (ex.: rappi_order_get).
+"""
+import os
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from .circuit_breaker import STATE_VALUES, CircuitBreaker, CircuitOpenError
+from .metrics import registry
+from .rate_limit import KeyedRateLimiter, TokenBucket, parse_retry_after
+
+try:  # HTTP/2 depende do pacote opcional 'h2' (httpx[http2])
+    import h2  # noqa: F401
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+# Raiz da API do iFood. Pode apontar para um servidor local (ex.: bench/mock_ifood.py).
+IFOOD_API_BASE_URL = os.getenv("IFOOD_API_BASE_URL", "https://merchant-api.ifood.com.br").rstrip("/")
+
+# -----------------------------------------------------------
+# CONFIGURAÇÃO DO POOL (via variáveis de ambiente)
+# -----------------------------------------------------------
+IFOOD_HTTP_MAX_CONNECTIONS = int(os.getenv("IFOOD_HTTP_MAX_CONNECTIONS", "100"))
+IFOOD_HTTP_MAX_KEEPALIVE = int(os.getenv("IFOOD_HTTP_MAX_KEEPALIVE", "20"))
+IFOOD_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("IFOOD_HTTP_KEEPALIVE_EXPIRY", "30"))
+IFOOD_HTTP_POOL_TIMEOUT = float(os.getenv("IFOOD_HTTP_POOL_TIMEOUT", "5"))
+IFOOD_HTTP2 = os.getenv("IFOOD_HTTP2", "1") != "0" and _HTTP2_AVAILABLE
+
+# Timeout (segundos) por tipo de chamada. Pode ser sobrescrito com IFOOD_TIMEOUT_<ENDPOINT>,
+# ex.: IFOOD_TIMEOUT_ORDER_GET=20
+_DEFAULT_ENDPOINT_TIMEOUTS = {
+    "device_code": 10.0,
+    "token": 10.0,
+    "order_get": 15.0,
+    "order_action": 10.0,
+    "merchant_status": 10.0,
+    "menu": 10.0,
+    "events_poll": 10.0,
+    "events_ack": 10.0,
+}
+ENDPOINT_TIMEOUTS: Dict[str, float] = {
+    endpoint: float(os.getenv(f"IFOOD_TIMEOUT_{endpoint.upper()}", default))
+    for endpoint, default in _DEFAULT_ENDPOINT_TIMEOUTS.items()
+}
+DEFAULT_TIMEOUT = 10.0
+
+# -----------------------------------------------------------
+# LIMITE DE TAXA (global + por merchant)
+# -----------------------------------------------------------
+IFOOD_RATE_LIMIT_PER_SECOND = float(os.getenv("IFOOD_RATE_LIMIT_PER_SECOND", "50"))
+IFOOD_RATE_LIMIT_BURST = float(os.getenv("IFOOD_RATE_LIMIT_BURST", "50"))
+IFOOD_MERCHANT_RATE_LIMIT_PER_SECOND = float(os.getenv("IFOOD_MERCHANT_RATE_LIMIT_PER_SECOND", "10"))
+IFOOD_MERCHANT_RATE_LIMIT_BURST = float(os.getenv("IFOOD_MERCHANT_RATE_LIMIT_BURST", "10"))
+# Quantas vezes uma chamada que recebeu 429 é refeita, e a maior espera (Retry-After) aceita
+IFOOD_RATE_LIMIT_MAX_RETRIES = int(os.getenv("IFOOD_RATE_LIMIT_MAX_RETRIES", "2"))
+IFOOD_RETRY_AFTER_MAX_SECONDS = float(os.getenv("IFOOD_RETRY_AFTER_MAX_SECONDS", "10"))
+# Espera usada num 429 sem Retry-After
+IFOOD_RETRY_AFTER_DEFAULT_SECONDS = 1.0
+
+global_rate_limiter = TokenBucket(IFOOD_RATE_LIMIT_PER_SECOND, IFOOD_RATE_LIMIT_BURST)
+# Limite global de cada marketplace (a cota de um não é consumida pelo tráfego do outro)
+_platform_rate_limiters: Dict[str, TokenBucket] = {"ifood": global_rate_limiter}
+merchant_rate_limiter = KeyedRateLimiter(IFOOD_MERCHANT_RATE_LIMIT_PER_SECOND, IFOOD_MERCHANT_RATE_LIMIT_BURST)
+_breakers: Dict[str, CircuitBreaker] = {}
+
+# -----------------------------------------------------------
+# MÉTRICAS
+# -----------------------------------------------------------
+_client: Optional[httpx.AsyncClient] = None
+
+# Eventos do httpcore que marcam o fim da espera por uma conexão do pool
+_CONNECTION_ACQUIRED_EVENTS = (
+    "connection.connect_tcp.started",
+    "http11.send_request_headers.started",
+    "http2.send_request_headers.started",
+)
+
+
+def _pool_snapshot() -> Dict[str, float]:
+    pool = getattr(getattr(_client, "_transport", None), "_pool", None)
+    if pool is None:
+        return {"open": 0, "idle": 0, "waiting": 0}
+    connections = list(getattr(pool, "connections", []))
+    return {
+        "open": sum(1 for conn in connections if not conn.is_closed()),
+        "idle": sum(1 for conn in connections if conn.is_idle()),
+        "waiting": sum(1 for req in getattr(pool, "_requests", []) if getattr(req, "connection", None) is None),
+    }
+
+
+registry.callback_gauge(
+    "ifood_http_pool_connections",
+    "Conexões do pool HTTP do iFood por estado (open, idle, waiting).",
+    lambda: {(state,): value for state, value in _pool_snapshot().items()},
+    labelnames=("state",),
+)
+POOL_WAIT_SECONDS = registry.histogram(
+    "ifood_http_pool_wait_seconds",
+    "Tempo entre o envio da requisição ao transporte e a obtenção de uma conexão.",
+)
+REQUEST_SECONDS = registry.histogram(
+    "ifood_http_request_seconds",
+    "Latência das chamadas à API do iFood por endpoint.",
+    labelnames=("endpoint",),
+)
+REQUESTS_TOTAL = registry.counter(
+    "ifood_http_requests_total",
+    "Chamadas à API do iFood por endpoint e status HTTP (ou 'error' em falhas de transporte).",
+    labelnames=("endpoint", "status"),
+)
+RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    "ifood_rate_limit_wait_seconds",
+    "Tempo de espera no limitador de taxa antes de cada chamada ao iFood.",
+    labelnames=("scope",),
+)
+THROTTLED_TOTAL = registry.counter(
+    "ifood_http_throttled_total",
+    "Respostas 429 do iFood por endpoint e desfecho (retried, gave_up).",
+    labelnames=("endpoint", "outcome"),
+)
+CIRCUIT_REJECTED_TOTAL = registry.counter(
+    "ifood_circuit_rejected_total",
+    "Chamadas recusadas localmente com o circuito aberto, por endpoint.",
+    labelnames=("endpoint",),
+)
+registry.callback_gauge(
+    "ifood_circuit_state",
+    "Estado do circuit breaker por endpoint (0 = fechado, 1 = meio-aberto, 2 = aberto).",
+    lambda: {(endpoint,): STATE_VALUES[breaker.state] for endpoint, breaker in _breakers.items()},
+    labelnames=("endpoint",),
+)
+
+
+class _InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Transporte que mede quanto tempo cada requisição esperou por uma conexão do pool."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        previous_trace = request.extensions.get("trace")
+        acquired = False
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            nonlocal acquired
+            if not acquired and event_name in _CONNECTION_ACQUIRED_EVENTS:
+                acquired = True
+                POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+            if previous_trace is not None:
+                await previous_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        return await super().handle_async_request(request)
+
+
+# -----------------------------------------------------------
+# CICLO DE VIDA
+# -----------------------------------------------------------
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=IFOOD_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=IFOOD_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=IFOOD_HTTP_KEEPALIVE_EXPIRY,
+    )
+    transport = _InstrumentedTransport(limits=limits, http2=IFOOD_HTTP2)
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, pool=IFOOD_HTTP_POOL_TIMEOUT),
+        headers={"accept": "application/json"},
+    )
+
+
+def init_ifood_client() -> httpx.AsyncClient:
+    """Cria o cliente compartilhado. Chamado no startup (lifespan) da aplicação."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def close_ifood_client() -> None:
+    """Fecha o pool de conexões. Chamado no shutdown (lifespan) da aplicação."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_ifood_client() -> httpx.AsyncClient:
+    # Fallback para uso fora do lifespan (scripts, shell): cria sob demanda.
+    if _client is None or _client.is_closed:
+        return init_ifood_client()
+    return _client
+
+
+def endpoint_timeout(endpoint: str) -> httpx.Timeout:
+    return httpx.Timeout(ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT), pool=IFOOD_HTTP_POOL_TIMEOUT)
+
+
+def get_platform_rate_limiter(platform: str, env_prefix: Optional[str] = None) -> TokenBucket:
+    limiter = _platform_rate_limiters.get(platform)
+    if limiter is None:
+        prefix = env_prefix or platform.upper()
+        limiter = _platform_rate_limiters[platform] = TokenBucket(
+            float(os.getenv(f"{prefix}_RATE_LIMIT_PER_SECOND", str(IFOOD_RATE_LIMIT_PER_SECOND))),
+            float(os.getenv(f"{prefix}_RATE_LIMIT_BURST", str(IFOOD_RATE_LIMIT_BURST))),
+        )
+    return limiter
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+    return breaker
+
+
+async def _throttle(platform_bucket: TokenBucket, merchant_bucket: Optional[TokenBucket]) -> None:
+    started = time.perf_counter()
+    await platform_bucket.acquire()
+    RATE_LIMIT_WAIT_SECONDS.observe(time.perf_counter() - started, scope="global")
+    if merchant_bucket is not None:
+        started = time.perf_counter()
+        await merchant_bucket.acquire()
+        RATE_LIMIT_WAIT_SECONDS.observe(time.perf_counter() - started, scope="merchant")
+
+
+async def ifood_request(
+    method: str,
+    url: str,
+    *,
+    endpoint: str,
+    platform: str = "ifood",
+    merchant_key: Optional[str] = None,
+    **kwargs: Any,
+) -> httpx.Response:
+    """
+    Executa uma chamada à API do iFood pelo cliente compartilhado, aplicando o timeout do
+    endpoint e registrando latência/status. Não chama raise_for_status (fica a cargo de quem chama).
+
+    Antes de chamar, espera ficha nos limitadores de taxa (o por merchant só com
+    `merchant_key`); um 429 pausa o limitador pelo Retry-After (o do merchant, se houver) e
+    a chamada é refeita (até IFOOD_RATE_LIMIT_MAX_RETRIES vezes). Com o
+    circuito do endpoint aberto, levanta CircuitOpenError (503) sem ir ao iFood.
+    """
+    kwargs.setdefault("timeout", endpoint_timeout(endpoint))
+    if platform != "ifood":
+        endpoint = f"{platform}_{endpoint}"
+    client = get_ifood_client()
+    platform_bucket = get_platform_rate_limiter(platform)
+    merchant_bucket = merchant_rate_limiter.bucket(f"{platform}:{merchant_key}") if merchant_key else None
+
+    breaker = get_circuit_breaker(endpoint)
+    try:
+        is_probe = breaker.before_call()
+    except CircuitOpenError:
+        CIRCUIT_REJECTED_TOTAL.inc(endpoint=endpoint)
+        raise
+
+    success: Optional[bool] = None
+    try:
+        for attempt in range(IFOOD_RATE_LIMIT_MAX_RETRIES + 1):
+            await _throttle(platform_bucket, merchant_bucket)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                REQUESTS_TOTAL.inc(endpoint=endpoint, status="error")
+                success = False
+                raise
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+            REQUESTS_TOTAL.inc(endpoint=endpoint, status=str(response.status_code))
+
+            if response.status_code in (429, 503):
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                if response.status_code == 429 and retry_after is None:
+                    retry_after = IFOOD_RETRY_AFTER_DEFAULT_SECONDS
+                if retry_after is not None:
+                    # Todo o tráfego da mesma chave espera o prazo pedido pelo iFood
+                    (merchant_bucket or platform_bucket).pause(retry_after)
+                if response.status_code == 429:
+                    if attempt < IFOOD_RATE_LIMIT_MAX_RETRIES and retry_after <= IFOOD_RETRY_AFTER_MAX_SECONDS:
+                        THROTTLED_TOTAL.inc(endpoint=endpoint, outcome="retried")
+                        await response.aclose()
+                        continue
+                    THROTTLED_TOTAL.inc(endpoint=endpoint, outcome="gave_up")
+
+            # 429 significa iFood saudável, só limitando: não conta como falha no circuito
+            success = response.status_code < 500
+            return response
+    finally:
+        breaker.record(success, is_probe)
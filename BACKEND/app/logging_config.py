@@ -0,0 +1,101 @@
+# app/logging_config.py
+"""
+Logs estruturados (uma linha JSON por evento) sem bloquear o event loop.
+
+Um StreamHandler escreve no stdout de forma síncrona e, sob carga, segura o loop. Aqui os
+handlers do logger "app" só colocam o registro numa fila em memória (QueueHandler); uma
+thread (QueueListener) formata e escreve. Cada linha sai com os campos de correlação do
+contexto (tracing.bind) e os campos passados em `extra=`.
+
+- LOG_LEVEL: nível mínimo (padrão INFO; DEBUG inclui a duração de cada etapa).
+- LOG_FORMAT: json (padrão) ou text (leitura humana, desenvolvimento local).
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+from .tracing import current_context
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+
+# Atributos padrão do LogRecord; o resto veio de `extra=` ou do contexto
+_RESERVED_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+
+class ContextFilter(logging.Filter):
+    """Copia os campos de correlação do contexto atual para o registro (na thread que loga)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in current_context().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # O listener é uma thread do mesmo processo: mantém exc_info e os campos extras
+        # (o QueueHandler padrão os descarta) e só resolve a mensagem com os argumentos
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging() -> None:
+    """Liga o logger "app" à fila + thread de escrita. Chamado no startup (lifespan)."""
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        output.setFormatter(JsonFormatter())
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(ContextFilter())
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.handlers = [handler]
+    app_logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """Escreve o que ficou na fila e para a thread. Chamado no shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        logging.getLogger("app").handlers = []
@@ -1,10 +1,124 @@
 # main.py
+import time
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-from .routes import router  # Importação relativa se estiverem no mesmo módulo
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from .routes import (
+    router,
+    refresh_integration_tokens,
+    list_authorized_integrations,
+    order_placed_job_handler,
+    order_placed_batch_job_handler,
+    webhook_raw_job_handler,
+    ingest_polled_events,
+    get_integration_record,
+    publish_order_transition,
+    ORDER_PLACED_JOB,
+    ORDER_PLACED_BATCH_JOB,
+    WEBHOOK_RAW_JOB,
+)
+from .platform_routes import router as platform_router
+from .report_routes import router as report_router
+# Importação relativa se estiverem no mesmo módulo
 # OU (se main.py e routes.py estiverem no mesmo nível e você não usa módulos/pacotes):
 # from routes import router # (Como estava, mas pode causar problemas de estrutura)
+from .ifood_http import init_ifood_client, close_ifood_client
+from .metrics import render_metrics
+from .logging_config import configure_logging, stop_logging
+from .shared_state import start_state_backend, stop_state_backend
+from .token_refresher import start_token_refresher, stop_token_refresher
+from .repositories import init_repositories, close_repositories, get_integracoes_repository, get_pedidos_repository
+from .order_queue import start_order_queue, stop_order_queue, get_order_queue
+from .order_writer import start_order_writer, stop_order_writer, persist_order_transition
+from .order_state import order_state
+from .order_rollups import start_order_rollups, stop_order_rollups, record_order_transition
+from .event_poller import start_event_poller, stop_event_poller
+from .webhook_dedup import start_webhook_deduplicator, stop_webhook_deduplicator
+from .warmup import start_warmup, stop_warmup, warmup_report, record_startup_phase
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Logs JSON escritos por uma thread (a fila em memória não bloqueia o event loop)
+    configure_logging()
+    # Estado compartilhado entre workers/réplicas (STATE_BACKEND_URL; sem ela, em memória)
+    await start_state_backend()
+    # Startup: um único pool de conexões para o iFood durante toda a vida da aplicação
+    init_ifood_client()
+    # Cliente Supabase compartilhado (criado aqui, não no import) + pool de threads para as
+    # queries (não bloqueia o loop)
+    init_repositories()
+    # Renovação proativa dos tokens de todos os restaurantes autorizados
+    start_token_refresher(refresh_integration_tokens, list_authorized_integrations)
+    # Gravação em lote da tabela pedidos (os workers da fila esperam o upsert do seu lote)
+    start_order_writer()
+    # Máquina de estados dos pedidos: cada transição é gravada em lote e enviada ao stream SSE
+    order_state.add_listener(persist_order_transition)
+    order_state.add_listener(publish_order_transition)
+    # Agregados por hora para os relatórios (/reports), somados em lote no banco
+    order_state.add_listener(record_order_transition)
+    start_order_rollups()
+    order_state.start()
+    # Fila durável + pool de workers: eventos do webhook (corpo bruto) e ORDER_PLACED (buscar + confirmar)
+    start_order_queue({
+        WEBHOOK_RAW_JOB: webhook_raw_job_handler,
+        ORDER_PLACED_JOB: order_placed_job_handler,
+        ORDER_PLACED_BATCH_JOB: order_placed_batch_job_handler,
+    })
+    # Deduplicação de eventos reentregues (expurgo periódico da tabela webhook_eventos)
+    start_webhook_deduplicator()
+    # Polling de eventos do iFood (opcional, EVENT_POLLING_ENABLED=1), com back-pressure pela fila
+    start_event_poller(
+        get_integracoes_repository(),
+        get_integration_record,
+        ingest_polled_events,
+        lambda: get_order_queue().depth.get("pending", 0),
+    )
+    record_startup_phase("lifespan", time.perf_counter() - started)
+    # Aquecimento em segundo plano (índice de merchants, tokens e pedidos ativos): o servidor
+    # já responde /health/live e /health/ready fica 503 até terminar
+    start_warmup(list_authorized_integrations, refresh_integration_tokens, get_pedidos_repository())
+    yield
+    # Shutdown: deixa de estar pronto, para os workers, o agendador e fecha as conexões keep-alive
+    await stop_warmup()
+    await stop_event_poller()
+    await stop_webhook_deduplicator()
+    await stop_order_queue()
+    await order_state.stop()
+    await stop_order_writer()
+    await stop_order_rollups()
+    await stop_token_refresher()
+    await close_ifood_client()
+    await stop_state_backend()
+    close_repositories()
+    stop_logging()
+
+
+app = FastAPI(title="API iFood Usercode", lifespan=lifespan)
+
+# Incluir rotas (iFood + rotas comuns dos outros marketplaces + relatórios)
+app.include_router(router)
+app.include_router(platform_router)
+app.include_router(report_router)
+
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """Processo de pé e event loop respondendo (não consulta dependências)."""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """200 quando o aquecimento do startup terminou; 503 com o progresso de cada etapa antes disso."""
+    report = warmup_report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
 
-app = FastAPI(title="API iFood Usercode")
 
-# Incluir rotas
-app.include_router(router)
\ No newline at end of file
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas no formato texto do Prometheus (pool HTTP, latências, etc.)."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
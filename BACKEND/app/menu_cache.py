@@ -0,0 +1,144 @@
+# app/menu_cache.py
+"""
+Cache em memória dos cardápios (menus) por restaurante.
+
+O cardápio é grande e muda pouco, mas o dashboard o lê o tempo todo. Cada entrada guarda os
+bytes da resposta do iFood (e a versão gzip, comprimida uma única vez) e vale por
+MENU_CACHE_TTL_SECONDS; vencida, é revalidada com If-None-Match / If-Modified-Since e, num
+304, apenas renovada. Com o iFood fora (rede, 5xx ou circuito aberto) a entrada vencida é
+servida como está. O cache é um LRU limitado em número de entradas e em bytes.
+"""
+import asyncio
+import gzip
+import hashlib
+import os
+import time
+import weakref
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .metrics import registry
+
+MENU_CACHE_TTL_SECONDS = float(os.getenv("MENU_CACHE_TTL_SECONDS", "300"))
+MENU_CACHE_MAX_ENTRIES = int(os.getenv("MENU_CACHE_MAX_ENTRIES", "500"))
+MENU_CACHE_MAX_BYTES = int(os.getenv("MENU_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Abaixo disso o gzip não compensa (cabeçalhos + CPU)
+MENU_CACHE_GZIP_MIN_BYTES = 1024
+
+MenuKey = Tuple[str, str]  # (restaurante_id, plataforma)
+
+MENU_REQUESTS = registry.counter(
+    "menu_cache_requests_total",
+    "Leituras de cardápio por resultado (hit, revalidated, miss, stale, not_modified).",
+    labelnames=("result",),
+)
+
+
+class MenuEntry:
+    __slots__ = ("body", "gzip_body", "etag", "upstream_etag", "upstream_last_modified", "fresh_until")
+
+    def __init__(
+        self,
+        body: bytes,
+        upstream_etag: Optional[str],
+        upstream_last_modified: Optional[str],
+        ttl_seconds: float,
+    ):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6) if len(body) >= MENU_CACHE_GZIP_MIN_BYTES else None
+        # ETag servido ao dashboard: o do iFood quando existir, senão um hash do conteúdo
+        self.etag = upstream_etag or f'"{hashlib.sha1(body).hexdigest()}"'
+        self.upstream_etag = upstream_etag
+        self.upstream_last_modified = upstream_last_modified
+        self.fresh_until = time.monotonic() + ttl_seconds
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip_body or b"")
+
+    def is_fresh(self) -> bool:
+        return self.fresh_until > time.monotonic()
+
+    def renew(self, ttl_seconds: float) -> None:
+        self.fresh_until = time.monotonic() + ttl_seconds
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """Cabeçalhos para revalidar a entrada junto ao iFood."""
+        headers = {}
+        if self.upstream_etag:
+            headers["If-None-Match"] = self.upstream_etag
+        if self.upstream_last_modified:
+            headers["If-Modified-Since"] = self.upstream_last_modified
+        return headers
+
+
+class MenuCache:
+    def __init__(
+        self,
+        ttl_seconds: float = MENU_CACHE_TTL_SECONDS,
+        max_entries: int = MENU_CACHE_MAX_ENTRIES,
+        max_bytes: int = MENU_CACHE_MAX_BYTES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: "OrderedDict[MenuKey, MenuEntry]" = OrderedDict()
+        # Lock só vive enquanto alguém o segura: menus despejados do LRU não acumulam locks
+        self._locks: "weakref.WeakValueDictionary[MenuKey, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def get(self, key: MenuKey) -> Optional[MenuEntry]:
+        """Retorna a entrada (fresca ou vencida); quem chama decide se precisa revalidar."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self,
+        key: MenuKey,
+        body: bytes,
+        upstream_etag: Optional[str] = None,
+        upstream_last_modified: Optional[str] = None,
+    ) -> MenuEntry:
+        entry = MenuEntry(body, upstream_etag, upstream_last_modified, self.ttl_seconds)
+        self.invalidate(key)
+        self._entries[key] = entry
+        self.total_bytes += entry.size
+        while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+        return entry
+
+    def invalidate(self, key: MenuKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def lock(self, key: MenuKey) -> asyncio.Lock:
+        """Lock por restaurante: leituras simultâneas de um menu vencido geram UMA chamada ao iFood."""
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+menu_cache = MenuCache()
+
+registry.callback_gauge(
+    "menu_cache_entries",
+    "Cardápios atualmente em cache.",
+    lambda: {(): len(menu_cache)},
+)
+registry.callback_gauge(
+    "menu_cache_bytes",
+    "Bytes ocupados pelo cache de cardápios (original + gzip).",
+    lambda: {(): menu_cache.total_bytes},
+)
@@ -0,0 +1,382 @@
+# app/menu_store.py
+"""
+Cardápio normalizado por restaurante, com sincronização por diferença e índices de itens.
+
+O /merchant/menu devolve o JSON do iFood como veio (menu_cache.py); para saber o preço ou a
+disponibilidade de UM item, cada consumidor teria de baixar e percorrer o cardápio inteiro.
+Aqui o cardápio vira uma tabela compacta de itens (cardapio_itens, ver sql/005):
+
+- sincronização: o JSON é normalizado em itens (item_id, name, category, status, price) e
+  comparado com o snapshot anterior; só itens novos ou alterados são gravados (um upsert) e
+  os que saíram do cardápio são apagados (um delete). Com o mesmo ETag do iFood nem o parse
+  é refeito, então o custo acompanha as mudanças, não o tamanho do cardápio;
+- snapshot em memória (LRU de MENU_STORE_MAX_MENUS cardápios, recarregado da tabela quando
+  sai da memória) com índices por item_id, categoria, status e prefixo do nome: ler um item
+  é O(1) e os filtros não percorrem o cardápio todo.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import weakref
+from collections import OrderedDict, defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .metrics import registry
+from .repositories import CardapioItensRepository
+
+try:  # JSON rápido depende do pacote opcional 'orjson'
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+MENU_STORE_MAX_MENUS = int(os.getenv("MENU_STORE_MAX_MENUS", "1000"))
+MENU_STORE_MAX_RESULTS = 500
+
+MenuKey = Tuple[str, str]  # (restaurante_id, plataforma)
+
+SYNCS = registry.counter(
+    "menu_store_syncs_total",
+    "Sincronizações de cardápio por resultado (changed, unchanged, skipped, error).",
+    labelnames=("result",),
+)
+ITEMS_WRITTEN = registry.counter(
+    "menu_store_items_written_total",
+    "Itens de cardápio gravados na sincronização por operação (upsert, delete).",
+    labelnames=("operation",),
+)
+LOOKUPS = registry.counter(
+    "menu_store_lookups_total",
+    "Consultas ao cardápio normalizado por tipo (item, filter, stale) e origem do snapshot (memory, table).",
+    labelnames=("kind", "source"),
+)
+
+
+class MenuItem:
+    __slots__ = ("item_id", "name", "category", "status", "price")
+
+    def __init__(self, item_id: str, name: str, category: Optional[str], status: str, price: float):
+        self.item_id = item_id
+        self.name = name
+        self.category = category
+        self.status = status
+        self.price = round(float(price), 2)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, MenuItem):
+            return NotImplemented
+        return (self.item_id, self.name, self.category, self.status, self.price) == (
+            other.item_id, other.name, other.category, other.status, other.price
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Formato da API (IfoodMenuItem)."""
+        return {
+            "itemId": self.item_id,
+            "name": self.name,
+            "price": self.price,
+            "status": self.status,
+            "category": self.category,
+        }
+
+    def row(self, restaurante_id: str, plataforma: str, updated_at: str) -> Dict[str, Any]:
+        """Linha da tabela cardapio_itens."""
+        return {
+            "item_key": item_key(restaurante_id, plataforma, self.item_id),
+            "restaurante_id": restaurante_id,
+            "plataforma": plataforma,
+            "item_id": self.item_id,
+            "name": self.name,
+            "category": self.category,
+            "status": self.status,
+            "price": self.price,
+            "updated_at": updated_at,
+        }
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "MenuItem":
+        return cls(row["item_id"], row["name"], row.get("category"), row["status"], row.get("price") or 0)
+
+
+@dataclass
+class MenuSyncResult:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    # True quando o ETag do iFood não mudou e o cardápio nem foi lido
+    skipped: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def item_key(restaurante_id: str, plataforma: str, item_id: str) -> str:
+    return f"{restaurante_id}:{plataforma}:{item_id}"
+
+
+# -----------------------------------------------------------
+# NORMALIZAÇÃO (JSON DO IFOOD -> ITENS)
+# -----------------------------------------------------------
+def _price(value: Any) -> float:
+    # Catálogo do iFood: {"value": 10.0, "originalValue": 12.0}; exemplo simplificado: número
+    if isinstance(value, dict):
+        value = value.get("value", 0)
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _item(raw: Any, category: Optional[str]) -> Optional[MenuItem]:
+    if not isinstance(raw, dict):
+        return None
+    item_id = raw.get("itemId") or raw.get("id")
+    if not item_id:
+        return None
+    return MenuItem(
+        str(item_id),
+        str(raw.get("name") or ""),
+        raw.get("category") or raw.get("categoryName") or category,
+        str(raw.get("status") or "AVAILABLE"),
+        _price(raw.get("price")),
+    )
+
+
+def normalize_menu(menu: Any) -> Dict[str, MenuItem]:
+    """
+    Itens do cardápio por item_id. Aceita o formato simplificado ({items: [...]}, com a
+    categoria no item) e o do catálogo ({categories: [{name, items: [...]}]} ou a lista de
+    categorias na raiz).
+    """
+    items: Dict[str, MenuItem] = {}
+    categories = menu if isinstance(menu, list) else (menu.get("categories") or [] if isinstance(menu, dict) else [])
+    for category in categories:
+        if isinstance(category, dict):
+            for raw in category.get("items") or []:
+                item = _item(raw, category.get("name"))
+                if item is not None:
+                    items[item.item_id] = item
+    if isinstance(menu, dict):
+        for raw in menu.get("items") or []:
+            item = _item(raw, None)
+            if item is not None:
+                items[item.item_id] = item
+    return items
+
+
+# -----------------------------------------------------------
+# SNAPSHOT + ÍNDICES
+# -----------------------------------------------------------
+class MenuSnapshot:
+    def __init__(self, items: Iterable[MenuItem] = ()):
+        self.items: Dict[str, MenuItem] = {}
+        self.by_category: Dict[Optional[str], Set[str]] = defaultdict(set)
+        self.by_status: Dict[str, Set[str]] = defaultdict(set)
+        # (nome em minúsculas, item_id), ordenada: busca por prefixo com bisect
+        self._names: List[Tuple[str, str]] = []
+        # ETag do iFood da última versão sincronizada
+        self.source_etag: Optional[str] = None
+        for item in items:
+            self._index(item)
+        self._names.sort()
+
+    def _index(self, item: MenuItem, keep_sorted: bool = False) -> None:
+        self.items[item.item_id] = item
+        self.by_category[item.category].add(item.item_id)
+        self.by_status[item.status].add(item.item_id)
+        entry = (item.name.lower(), item.item_id)
+        if keep_sorted:
+            bisect.insort(self._names, entry)
+        else:
+            self._names.append(entry)
+
+    def _unindex(self, item_id: str) -> None:
+        item = self.items.pop(item_id)
+        self.by_category[item.category].discard(item_id)
+        if not self.by_category[item.category]:
+            del self.by_category[item.category]
+        self.by_status[item.status].discard(item_id)
+        if not self.by_status[item.status]:
+            del self.by_status[item.status]
+        entry = (item.name.lower(), item_id)
+        index = bisect.bisect_left(self._names, entry)
+        if index < len(self._names) and self._names[index] == entry:
+            del self._names[index]
+
+    def apply(self, upserts: List[MenuItem], removed: List[str]) -> None:
+        """Atualiza os índices só com o que mudou."""
+        for item_id in removed:
+            self._unindex(item_id)
+        for item in upserts:
+            if item.item_id in self.items:
+                self._unindex(item.item_id)
+            self._index(item, keep_sorted=True)
+
+    def diff(self, items: Dict[str, MenuItem]) -> Tuple[List[MenuItem], List[str], MenuSyncResult]:
+        """(itens a gravar, item_ids a apagar, contagens) entre este snapshot e o cardápio novo."""
+        result = MenuSyncResult()
+        upserts = []
+        for item_id, item in items.items():
+            current = self.items.get(item_id)
+            if current is None:
+                result.added += 1
+                upserts.append(item)
+            elif current != item:
+                result.updated += 1
+                upserts.append(item)
+            else:
+                result.unchanged += 1
+        removed = [item_id for item_id in self.items if item_id not in items]
+        result.removed = len(removed)
+        return upserts, removed, result
+
+    def find(
+        self,
+        category: Optional[str] = None,
+        status: Optional[str] = None,
+        name_prefix: Optional[str] = None,
+        limit: int = MENU_STORE_MAX_RESULTS,
+    ) -> List[MenuItem]:
+        """Itens que atendem a todos os filtros, em ordem de nome; parte do menor índice."""
+        candidates: List[Set[str]] = []
+        if category is not None:
+            candidates.append(self.by_category.get(category, set()))
+        if status is not None:
+            candidates.append(self.by_status.get(status, set()))
+        candidates.sort(key=len)
+
+        if name_prefix:
+            prefix = name_prefix.lower()
+            start = bisect.bisect_left(self._names, (prefix, ""))
+            ordered = []
+            for name, item_id in self._names[start:]:
+                if not name.startswith(prefix):
+                    break
+                ordered.append(item_id)
+        elif candidates:
+            ordered = sorted(candidates[0], key=lambda item_id: (self.items[item_id].name.lower(), item_id))
+            candidates = candidates[1:]
+        else:
+            ordered = [item_id for _, item_id in self._names]
+
+        result = []
+        for item_id in ordered:
+            if all(item_id in ids for ids in candidates):
+                result.append(self.items[item_id])
+                if len(result) >= limit:
+                    break
+        return result
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+# -----------------------------------------------------------
+# STORE (LRU DE SNAPSHOTS + SINCRONIZAÇÃO)
+# -----------------------------------------------------------
+class MenuStore:
+    def __init__(self, max_menus: int = MENU_STORE_MAX_MENUS):
+        self.max_menus = max_menus
+        self._snapshots: "OrderedDict[MenuKey, MenuSnapshot]" = OrderedDict()
+        # Lock só vive enquanto alguém o segura: cardápios despejados do LRU não acumulam locks
+        self._locks: "weakref.WeakValueDictionary[MenuKey, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def get(self, key: MenuKey) -> Optional[MenuSnapshot]:
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            self._snapshots.move_to_end(key)
+        return snapshot
+
+    def _put(self, key: MenuKey, snapshot: MenuSnapshot) -> None:
+        self._snapshots[key] = snapshot
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self.max_menus:
+            self._snapshots.popitem(last=False)
+
+    async def load(self, key: MenuKey, repository: CardapioItensRepository) -> Tuple[MenuSnapshot, str]:
+        """(snapshot, origem): da memória ou, fora dela, da tabela cardapio_itens."""
+        snapshot = self.get(key)
+        if snapshot is not None:
+            return snapshot, "memory"
+        rows = await repository.list_items(key[0], key[1])
+        snapshot = MenuSnapshot(MenuItem.from_row(row) for row in rows)
+        self._put(key, snapshot)
+        return snapshot, "table"
+
+    async def sync(
+        self,
+        key: MenuKey,
+        body: bytes,
+        source_etag: Optional[str],
+        repository: CardapioItensRepository,
+    ) -> MenuSyncResult:
+        """
+        Aplica o cardápio (JSON bruto do iFood) ao snapshot e à tabela, gravando só a diferença.
+        Com o mesmo ETag da última sincronização, não faz nada. Falha na gravação: o snapshot
+        fica como estava e a próxima sincronização tenta de novo.
+        """
+        async with self.lock(key):
+            snapshot, _ = await self.load(key, repository)
+            if source_etag is not None and snapshot.source_etag == source_etag:
+                SYNCS.inc(result="skipped")
+                return MenuSyncResult(unchanged=len(snapshot), skipped=True)
+
+            upserts, removed, result = snapshot.diff(normalize_menu(_loads(body)))
+            if result.changed:
+                restaurante_id, plataforma = key
+                now_iso = datetime.now(timezone.utc).isoformat()
+                try:
+                    await repository.upsert_many([item.row(restaurante_id, plataforma, now_iso) for item in upserts])
+                    await repository.delete_many([item_key(restaurante_id, plataforma, item_id) for item_id in removed])
+                except Exception:
+                    SYNCS.inc(result="error")
+                    # Parte pode ter sido gravada: relê da tabela na próxima vez
+                    self.invalidate(key)
+                    raise
+                ITEMS_WRITTEN.inc(len(upserts), operation="upsert")
+                ITEMS_WRITTEN.inc(len(removed), operation="delete")
+                snapshot.apply(upserts, removed)
+                logger.info("Cardápio sincronizado", extra={"restaurante_id": restaurante_id, "plataforma": plataforma, **result.as_dict()})
+            snapshot.source_etag = source_etag
+            SYNCS.inc(result="changed" if result.changed else "unchanged")
+            return result
+
+    def invalidate(self, key: MenuKey) -> None:
+        self._snapshots.pop(key, None)
+
+    def lock(self, key: MenuKey) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def item_count(self) -> int:
+        return sum(len(snapshot) for snapshot in self._snapshots.values())
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+
+menu_store = MenuStore()
+
+registry.callback_gauge(
+    "menu_store_menus",
+    "Cardápios normalizados em memória.",
+    lambda: {(): len(menu_store)},
+)
+registry.callback_gauge(
+    "menu_store_items",
+    "Itens de cardápio indexados em memória.",
+    lambda: {(): menu_store.item_count()},
+)
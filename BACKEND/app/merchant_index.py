@@ -0,0 +1,196 @@
+# app/merchant_index.py
+"""
+Índice em memória external_merchant_id -> restaurante_id usado pelo receptor de webhooks.
+
+É aquecido no startup (warmup.py) com todas as integrações autorizadas, atualizado quando
+o Passo 2 (/ifood/token) mapeia um novo merchant e guarda cache negativo para IDs não
+mapeados, de modo que o ACK do webhook não dependa de uma query ao Supabase.
+
+Com um backend compartilhado (shared_state.py), IDs resolvidos por um processo ficam
+visíveis aos demais e um novo mapeamento (`put`) é propagado para todos os processos.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from .metrics import registry
+from .repositories import IntegracoesRepository
+from .shared_state import broadcast_invalidation, get_state_backend, on_invalidation
+
+logger = logging.getLogger(__name__)
+
+MERCHANT_INDEX_NEGATIVE_TTL_SECONDS = float(os.getenv("MERCHANT_INDEX_NEGATIVE_TTL_SECONDS", "60"))
+MERCHANT_INDEX_SHARED_TTL_SECONDS = float(os.getenv("MERCHANT_INDEX_SHARED_TTL_SECONDS", "3600"))
+# Limite do cache negativo: IDs aleatórios (tráfego não assinado) não crescem a memória sem fim
+MERCHANT_INDEX_NEGATIVE_MAX_ENTRIES = int(os.getenv("MERCHANT_INDEX_NEGATIVE_MAX_ENTRIES", "10000"))
+
+MerchantKey = Tuple[str, str]  # (plataforma, external_merchant_id)
+
+LOOKUPS = registry.counter(
+    "merchant_index_lookups_total",
+    "Resoluções merchantId -> restaurante_id por resultado (hit, negative_hit, shared_hit, miss).",
+    labelnames=("result",),
+)
+
+
+class MerchantIndex:
+    def __init__(
+        self,
+        negative_ttl_seconds: float = MERCHANT_INDEX_NEGATIVE_TTL_SECONDS,
+        negative_max_entries: int = MERCHANT_INDEX_NEGATIVE_MAX_ENTRIES,
+    ):
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.negative_max_entries = negative_max_entries
+        self._mapping: Dict[MerchantKey, str] = {}
+        # Ordem de inserção = ordem de expiração (TTL único): o mais antigo sai primeiro
+        self._negative: "OrderedDict[MerchantKey, float]" = OrderedDict()
+
+    def get(self, external_merchant_id: str, plataforma: str) -> Optional[str]:
+        return self._mapping.get((plataforma, external_merchant_id))
+
+    def is_known_missing(self, external_merchant_id: str, plataforma: str) -> bool:
+        key = (plataforma, external_merchant_id)
+        expires_at = self._negative.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._negative[key]
+            return False
+        return True
+
+    def put(self, external_merchant_id: str, plataforma: str, restaurante_id: str) -> None:
+        self.put_local(external_merchant_id, plataforma, restaurante_id)
+        broadcast_invalidation(
+            "merchant", external_merchant_id, plataforma, restaurante_id,
+            shared_key=_shared_key(plataforma, external_merchant_id),
+        )
+
+    def put_local(self, external_merchant_id: str, plataforma: str, restaurante_id: str) -> None:
+        # Um restaurante tem um único merchant por plataforma: remove mapeamentos antigos
+        self.remove_restaurante(restaurante_id, plataforma)
+        key = (plataforma, external_merchant_id)
+        self._mapping[key] = restaurante_id
+        self._negative.pop(key, None)
+
+    def put_missing(self, external_merchant_id: str, plataforma: str) -> None:
+        key = (plataforma, external_merchant_id)
+        now = time.monotonic()
+        self._negative.pop(key, None)
+        self._negative[key] = now + self.negative_ttl_seconds
+        # Expurga os vencidos do início e, acima do limite, os mais antigos
+        while self._negative:
+            oldest_key, expires_at = next(iter(self._negative.items()))
+            if expires_at >= now and len(self._negative) <= self.negative_max_entries:
+                break
+            del self._negative[oldest_key]
+
+    def remove_restaurante(self, restaurante_id: str, plataforma: str) -> None:
+        stale = [key for key, value in self._mapping.items() if value == restaurante_id and key[0] == plataforma]
+        for key in stale:
+            del self._mapping[key]
+
+    def warm(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Carrega os mapeamentos a partir de registros de restaurante_integracoes."""
+        loaded = 0
+        for record in records:
+            external_merchant_id = record.get("external_merchant_id")
+            if external_merchant_id and record.get("restaurante_id") and record.get("plataforma"):
+                self._mapping[(record["plataforma"], external_merchant_id)] = record["restaurante_id"]
+                loaded += 1
+        return loaded
+
+    async def resolve(self, external_merchant_id: str, plataforma: str, integracoes: IntegracoesRepository) -> Optional[str]:
+        """Resolve em memória; só consulta o banco para IDs nunca vistos (e guarda o resultado)."""
+        restaurante_id = self.get(external_merchant_id, plataforma)
+        if restaurante_id is not None:
+            LOOKUPS.inc(result="hit")
+            return restaurante_id
+        if self.is_known_missing(external_merchant_id, plataforma):
+            LOOKUPS.inc(result="negative_hit")
+            return None
+
+        restaurante_id = await self._shared_get(external_merchant_id, plataforma)
+        if restaurante_id is not None:
+            return restaurante_id
+
+        LOOKUPS.inc(result="miss")
+        restaurante_id = await integracoes.find_restaurante_id(external_merchant_id, plataforma)
+        await self._remember(external_merchant_id, plataforma, restaurante_id)
+        return restaurante_id
+
+    async def resolve_many(
+        self, external_merchant_ids: Iterable[str], plataforma: str, integracoes: IntegracoesRepository
+    ) -> Dict[str, Optional[str]]:
+        """Resolve vários IDs; os desconhecidos vão ao banco numa única query."""
+        resolved: Dict[str, Optional[str]] = {}
+        pending = []
+        for external_merchant_id in set(external_merchant_ids):
+            restaurante_id = self.get(external_merchant_id, plataforma)
+            if restaurante_id is not None:
+                LOOKUPS.inc(result="hit")
+                resolved[external_merchant_id] = restaurante_id
+            elif self.is_known_missing(external_merchant_id, plataforma):
+                LOOKUPS.inc(result="negative_hit")
+                resolved[external_merchant_id] = None
+            else:
+                pending.append(external_merchant_id)
+
+        # Mesmo caminho de `resolve`: backend compartilhado antes do banco
+        shared = await asyncio.gather(*(self._shared_get(external_merchant_id, plataforma) for external_merchant_id in pending))
+        unknown = []
+        for external_merchant_id, restaurante_id in zip(pending, shared):
+            if restaurante_id is not None:
+                resolved[external_merchant_id] = restaurante_id
+            else:
+                LOOKUPS.inc(result="miss")
+                unknown.append(external_merchant_id)
+
+        if unknown:
+            found = await integracoes.find_restaurante_ids(unknown, plataforma)
+            for external_merchant_id in unknown:
+                restaurante_id = found.get(external_merchant_id)
+                await self._remember(external_merchant_id, plataforma, restaurante_id)
+                resolved[external_merchant_id] = restaurante_id
+        return resolved
+
+    async def _shared_get(self, external_merchant_id: str, plataforma: str) -> Optional[str]:
+        """Consulta o backend compartilhado (se houver) e guarda localmente o que achar."""
+        backend = get_state_backend()
+        if not backend.shared:
+            return None
+        restaurante_id = await backend.get(_shared_key(plataforma, external_merchant_id))
+        if restaurante_id is not None:
+            LOOKUPS.inc(result="shared_hit")
+            self.put_local(external_merchant_id, plataforma, restaurante_id)
+        return restaurante_id
+
+    async def _remember(self, external_merchant_id: str, plataforma: str, restaurante_id: Optional[str]) -> None:
+        """Guarda o resultado do banco: cache negativo ou mapeamento local + compartilhado."""
+        if restaurante_id is None:
+            self.put_missing(external_merchant_id, plataforma)
+            return
+        self.put_local(external_merchant_id, plataforma, restaurante_id)
+        backend = get_state_backend()
+        if backend.shared:
+            await backend.set(_shared_key(plataforma, external_merchant_id), restaurante_id, MERCHANT_INDEX_SHARED_TTL_SECONDS)
+
+    def __len__(self) -> int:
+        return len(self._mapping)
+
+
+def _shared_key(plataforma: str, external_merchant_id: str) -> str:
+    return f"merchant:{plataforma}:{external_merchant_id}"
+
+
+merchant_index = MerchantIndex()
+on_invalidation("merchant", lambda key: merchant_index.put_local(key[0], key[1], key[2]))
+
+registry.callback_gauge(
+    "merchant_index_entries",
+    "Mapeamentos merchantId -> restaurante_id em memória.",
+    lambda: {(): len(merchant_index)},
+)
+
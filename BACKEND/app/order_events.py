@@ -0,0 +1,122 @@
+# app/order_events.py
+"""
+Pub/sub em memória dos eventos de pedidos para o stream em tempo real (SSE) do monitor.
+
+- Cada evento é serializado UMA vez no formato SSE e os mesmos bytes vão para todos os
+  dashboards conectados ao restaurante.
+- Cada conexão tem um buffer limitado; um cliente lento que o enche é desconectado (em vez
+  de segurar memória ou atrasar os demais) e, ao reconectar com Last-Event-ID, recupera o
+  que perdeu do histórico recente do restaurante.
+- O histórico guarda os últimos ORDER_STREAM_HISTORY eventos por restaurante.
+
+Os eventos vivem apenas neste processo: com várias réplicas, cada uma entrega o que ela
+mesma produziu.
+"""
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+from .metrics import registry
+
+ORDER_STREAM_BUFFER_SIZE = int(os.getenv("ORDER_STREAM_BUFFER_SIZE", "100"))
+ORDER_STREAM_HISTORY = int(os.getenv("ORDER_STREAM_HISTORY", "200"))
+ORDER_STREAM_HEARTBEAT_SECONDS = float(os.getenv("ORDER_STREAM_HEARTBEAT_SECONDS", "15"))
+
+HEARTBEAT_FRAME = b": ping\n\n"
+
+EVENTS_PUBLISHED = registry.counter(
+    "order_stream_events_total",
+    "Eventos de pedidos publicados no stream por tipo.",
+    labelnames=("event",),
+)
+SLOW_SUBSCRIBERS = registry.counter(
+    "order_stream_slow_subscribers_total",
+    "Conexões do stream derrubadas por buffer cheio (cliente lento).",
+)
+
+
+def encode_sse(event_id: int, event: str, data: Dict[str, Any]) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+
+class Subscription:
+    def __init__(self, restaurante_id: str, buffer_size: int):
+        self.restaurante_id = restaurante_id
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=buffer_size)
+        self.overflowed = False
+
+    def push(self, frame: bytes) -> bool:
+        """Entrega sem esperar; retorna False (e marca a conexão para encerrar) se o buffer encheu."""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.overflowed = True
+            return False
+
+    async def next_frame(self, timeout: float) -> Optional[bytes]:
+        """Próximo frame, o heartbeat se nada chegar em `timeout` ou None se a conexão deve fechar."""
+        if self.overflowed and self.queue.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return HEARTBEAT_FRAME
+
+
+class OrderEventBroker:
+    def __init__(self, buffer_size: int = ORDER_STREAM_BUFFER_SIZE, history_size: int = ORDER_STREAM_HISTORY):
+        self.buffer_size = buffer_size
+        self.history_size = history_size
+        # IDs crescentes também entre reinícios do processo (base = relógio em microssegundos),
+        # para que um Last-Event-ID antigo não esconda eventos novos
+        self._ids = itertools.count(time.time_ns() // 1000)
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._history: Dict[str, Deque[Tuple[int, bytes]]] = defaultdict(lambda: deque(maxlen=self.history_size))
+
+    def publish(self, restaurante_id: str, event: str, data: Dict[str, Any]) -> int:
+        event_id = next(self._ids)
+        frame = encode_sse(event_id, event, {"restaurante_id": restaurante_id, **data})
+        self._history[restaurante_id].append((event_id, frame))
+        EVENTS_PUBLISHED.inc(event=event)
+
+        for subscription in list(self._subscribers.get(restaurante_id, ())):
+            if not subscription.push(frame):
+                SLOW_SUBSCRIBERS.inc()
+                # Para de receber; o stream termina ao esvaziar o buffer e o cliente reconecta
+                self._subscribers[restaurante_id].discard(subscription)
+        return event_id
+
+    def subscribe(self, restaurante_id: str, last_event_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(restaurante_id, self.buffer_size)
+        if last_event_id is not None:
+            # Reenvia o que o cliente perdeu (limitado ao histórico e ao tamanho do buffer)
+            missed = [frame for event_id, frame in self._history.get(restaurante_id, ()) if event_id > last_event_id]
+            for frame in missed[-self.buffer_size:]:
+                subscription.push(frame)
+        self._subscribers[restaurante_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.restaurante_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.restaurante_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+order_event_broker = OrderEventBroker()
+
+registry.callback_gauge(
+    "order_stream_subscribers",
+    "Conexões abertas no stream de pedidos.",
+    lambda: {(): order_event_broker.subscriber_count()},
+)
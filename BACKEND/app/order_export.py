@@ -0,0 +1,222 @@
+# app/order_export.py
+"""
+Exportação do histórico de pedidos em streaming (CSV ou Parquet).
+
+O histórico de um restaurante pode ter centenas de milhares de pedidos: em vez de montar o
+arquivo em memória, as linhas são lidas em páginas de ORDER_EXPORT_PAGE_SIZE pela chave `id`
+(PedidosRepository.export_page, sem OFFSET) e cada página vira um pedaço da resposta
+(transfer-encoding chunked). Em memória fica no máximo uma página.
+
+- CSV: cabeçalho + linhas, colunas normalizadas (sem o payload JSONB);
+- Parquet: um row group por página, codificado numa thread (asyncio.to_thread) para não
+  segurar o event loop; depende do pacote opcional 'pyarrow'. Datas que não são ISO 8601
+  viram nulo no arquivo e são contadas em order_export_invalid_timestamps_total.
+"""
+import asyncio
+import csv
+import io
+import logging
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from .metrics import registry
+from .repositories import PedidosRepository
+
+try:  # Parquet depende do pacote opcional 'pyarrow'
+    import pyarrow
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+ORDER_EXPORT_PAGE_SIZE = int(os.getenv("ORDER_EXPORT_PAGE_SIZE", "1000"))
+
+EXPORT_COLUMNS = (
+    "id", "ifood_order_id", "plataforma", "status", "display_id",
+    "order_type", "order_created_at", "total", "updated_at",
+)
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+EXPORTED_ROWS = registry.counter(
+    "order_export_rows_total",
+    "Pedidos exportados por formato (csv, parquet).",
+    labelnames=("format",),
+)
+EXPORTS = registry.counter(
+    "order_exports_total",
+    "Exportações de pedidos por formato e resultado (success, failure).",
+    labelnames=("format", "result"),
+)
+
+INVALID_TIMESTAMPS = registry.counter(
+    "order_export_invalid_timestamps_total",
+    "Datas de pedidos que não são ISO 8601 e saíram nulas no Parquet, por coluna.",
+    labelnames=("column",),
+)
+
+
+def format_available(export_format: str) -> bool:
+    return export_format == "csv" or (export_format == "parquet" and pyarrow is not None)
+
+
+async def _pages(
+    pedidos: PedidosRepository,
+    restaurante_id: str,
+    since_iso: str,
+    until_iso: str,
+    first_page: List[Dict[str, Any]],
+    page_size: int,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    page = first_page
+    while page:
+        yield page
+        if len(page) < page_size:
+            return
+        page = await pedidos.export_page(restaurante_id, since_iso, until_iso, after_id=page[-1]["id"], limit=page_size)
+
+
+# -----------------------------------------------------------
+# CSV
+# -----------------------------------------------------------
+def _csv_chunk(rows: List[Dict[str, Any]], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(["" if row.get(column) is None else row[column] for column in EXPORT_COLUMNS])
+    return buffer.getvalue().encode("utf-8")
+
+
+# -----------------------------------------------------------
+# PARQUET
+# -----------------------------------------------------------
+class _ChunkSink(io.RawIOBase):
+    """Destino do ParquetWriter que só acumula os bytes escritos até o próximo `drain`."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _parquet_schema():
+    timestamp = pyarrow.timestamp("us", tz="UTC")
+    return pyarrow.schema([
+        ("id", pyarrow.int64()),
+        ("ifood_order_id", pyarrow.string()),
+        ("plataforma", pyarrow.string()),
+        ("status", pyarrow.string()),
+        ("display_id", pyarrow.string()),
+        ("order_type", pyarrow.string()),
+        ("order_created_at", timestamp),
+        ("total", pyarrow.float64()),
+        ("updated_at", timestamp),
+    ])
+
+
+def _timestamp(row: Dict[str, Any], column: str) -> Optional[datetime]:
+    value = row.get(column)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        INVALID_TIMESTAMPS.inc(column=column)
+        logger.warning("Data inválida na exportação de pedidos", extra={
+            "pedido_id": row.get("id"), "column": column, "value": str(value),
+        })
+        return None
+
+
+def _parquet_table(rows: List[Dict[str, Any]], schema):
+    columns = {column: [row.get(column) for row in rows] for column in EXPORT_COLUMNS}
+    for column in ("order_created_at", "updated_at"):
+        columns[column] = [_timestamp(row, column) for row in rows]
+    columns["total"] = [float(value) if value is not None else None for value in columns["total"]]
+    return pyarrow.table(columns, schema=schema)
+
+
+def _parquet_chunk(writer, sink: _ChunkSink, rows: List[Dict[str, Any]], schema) -> bytes:
+    """Converte e grava uma página (roda numa thread: é CPU, não I/O)."""
+    writer.write_table(_parquet_table(rows, schema))
+    return sink.drain()
+
+
+# -----------------------------------------------------------
+# STREAM
+# -----------------------------------------------------------
+async def stream_orders(
+    pedidos: PedidosRepository,
+    restaurante_id: str,
+    since_iso: str,
+    until_iso: str,
+    export_format: str,
+    page_size: int = ORDER_EXPORT_PAGE_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    Lê a primeira página já na chamada (erros do banco viram erro HTTP antes de a resposta
+    começar) e devolve o iterador dos pedaços do arquivo. Um erro no meio do stream só pode
+    encerrá-lo: o arquivo fica truncado e a falha vai para o log e para as métricas.
+    """
+    first_page = await pedidos.export_page(restaurante_id, since_iso, until_iso, limit=page_size)
+
+    async def chunks() -> AsyncIterator[bytes]:
+        exported = 0
+        writer = sink = None
+        try:
+            if export_format == "parquet":
+                sink = _ChunkSink()
+                schema = _parquet_schema()
+                writer = pyarrow_parquet.ParquetWriter(sink, schema)
+            else:
+                yield _csv_chunk([], header=True)
+
+            async for page in _pages(pedidos, restaurante_id, since_iso, until_iso, first_page, page_size):
+                if writer is not None:
+                    chunk = await asyncio.to_thread(_parquet_chunk, writer, sink, page, schema)
+                else:
+                    chunk = _csv_chunk(page)
+                exported += len(page)
+                EXPORTED_ROWS.inc(len(page), format=export_format)
+                if chunk:
+                    yield chunk
+
+            if writer is not None:
+                await asyncio.to_thread(writer.close)
+                writer = None
+                yield sink.drain()
+        except Exception as e:
+            EXPORTS.inc(format=export_format, result="failure")
+            logger.error("Exportação de pedidos interrompida", extra={
+                "restaurante_id": restaurante_id, "format": export_format, "rows": exported, "error": str(e),
+            })
+            raise
+        finally:
+            if writer is not None:
+                writer.close()
+        EXPORTS.inc(format=export_format, result="success")
+        logger.info("Pedidos exportados", extra={"restaurante_id": restaurante_id, "format": export_format, "rows": exported})
+
+    return chunks()
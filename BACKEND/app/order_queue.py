@@ -0,0 +1,434 @@
+# app/order_queue.py
+"""
+Fila de trabalho durável (SQLite) e pool de workers assíncronos para o processamento de
+pedidos (ORDER_PLACED: buscar detalhes + confirmar no iFood).
+
+- O webhook apenas grava o job e responde; um restart do processo não perde pedidos.
+- Jobs do mesmo restaurante (partition_key) nunca rodam em paralelo e são pegos na ordem
+  de chegada (um job em backoff segura os mais novos da sua partição).
+- Falhas transitórias (httpx.HTTPStatusError / erros de rede / do Supabase) voltam para a fila com
+  backoff exponencial; esgotadas as tentativas, o job vai para a dead-letter (status 'dead').
+- Jobs 'running' têm um lease: se o processo morrer, outro worker reassume após o prazo.
+  Enquanto o handler roda, o worker renova o lease (heartbeat a cada lease/3); cada claim
+  grava um lease_token e só quem ainda o detém conclui, reagenda ou manda o job para a
+  dead-letter.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+import httpx
+
+from .metrics import registry
+from .repositories import RepositoryError
+from .tracing import bind
+
+logger = logging.getLogger(__name__)
+
+ORDER_QUEUE_PATH = os.getenv("ORDER_QUEUE_PATH", "order_queue.sqlite3")
+ORDER_QUEUE_WORKERS = int(os.getenv("ORDER_QUEUE_WORKERS", "8"))
+ORDER_QUEUE_MAX_ATTEMPTS = int(os.getenv("ORDER_QUEUE_MAX_ATTEMPTS", "6"))
+ORDER_QUEUE_BACKOFF_BASE_SECONDS = float(os.getenv("ORDER_QUEUE_BACKOFF_BASE_SECONDS", "2"))
+ORDER_QUEUE_BACKOFF_MAX_SECONDS = float(os.getenv("ORDER_QUEUE_BACKOFF_MAX_SECONDS", "300"))
+ORDER_QUEUE_LEASE_SECONDS = float(os.getenv("ORDER_QUEUE_LEASE_SECONDS", "120"))
+ORDER_QUEUE_IDLE_POLL_SECONDS = float(os.getenv("ORDER_QUEUE_IDLE_POLL_SECONDS", "1"))
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+RETRYABLE_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+    httpx.HTTPStatusError, httpx.TransportError, asyncio.TimeoutError, ConnectionError,
+)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Erros do iFood/rede, falhas transitórias do Supabase (RepositoryError.retryable) e
+    HTTPException 5xx (ex.: falha na renovação do token) são transitórios. O webhook já foi
+    confirmado ao iFood, que não reentrega: só erro permanente pode ir para a dead-letter.
+    """
+    if isinstance(exc, RETRYABLE_EXCEPTIONS):
+        return True
+    if isinstance(exc, RepositoryError):
+        return exc.retryable
+    return getattr(exc, "status_code", 0) >= 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    partition_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    locked_until REAL,
+    lease_token TEXT,
+    created_at REAL NOT NULL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs (status, available_at, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_partition ON jobs (partition_key, status);
+"""
+
+JOBS_ENQUEUED = registry.counter(
+    "order_queue_jobs_enqueued_total",
+    "Jobs gravados na fila durável, por tipo.",
+    labelnames=("kind",),
+)
+LEASES_LOST = registry.counter(
+    "order_queue_leases_lost_total",
+    "Jobs cujo lease expirou e foi reassumido por outro worker durante a execução, por tipo.",
+    labelnames=("kind",),
+)
+JOBS_FINISHED = registry.counter(
+    "order_queue_jobs_finished_total",
+    "Execuções de jobs por tipo e resultado (done, retry, dead).",
+    labelnames=("kind", "result"),
+)
+JOB_RUN_SECONDS = registry.histogram(
+    "order_queue_job_run_seconds",
+    "Duração de cada execução de job, por tipo.",
+    labelnames=("kind",),
+)
+JOB_LATENCY_SECONDS = registry.histogram(
+    "order_queue_job_latency_seconds",
+    "Tempo entre o enfileiramento e a conclusão com sucesso do job, por tipo.",
+    labelnames=("kind",),
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+
+class OrderQueue:
+    def __init__(
+        self,
+        path: str = ORDER_QUEUE_PATH,
+        workers: int = ORDER_QUEUE_WORKERS,
+        max_attempts: int = ORDER_QUEUE_MAX_ATTEMPTS,
+        backoff_base_seconds: float = ORDER_QUEUE_BACKOFF_BASE_SECONDS,
+        backoff_max_seconds: float = ORDER_QUEUE_BACKOFF_MAX_SECONDS,
+        lease_seconds: float = ORDER_QUEUE_LEASE_SECONDS,
+    ):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.lease_seconds = lease_seconds
+        self._handlers: Dict[str, JobHandler] = {}
+        # Uma única thread dona da conexão SQLite: serializa o acesso sem travar o event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="order-queue")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._depth: Dict[str, int] = {}
+
+    # -------------------------------------------------------
+    # ACESSO AO SQLITE (sempre na thread do executor)
+    # -------------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            # Arquivos criados antes do lease_token
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_token" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_token TEXT")
+            self._conn = conn
+        return self._conn
+
+    async def _db(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: fn(self._connect()))
+
+    def _insert_jobs(self, conn: sqlite3.Connection, rows: List[Tuple[str, str, str]], delay: float) -> List[int]:
+        now = time.time()
+        ids = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for kind, partition_key, payload in rows:
+                cursor = conn.execute(
+                    "INSERT INTO jobs (kind, partition_key, payload, available_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (kind, partition_key, payload, now + delay, now),
+                )
+                ids.append(cursor.lastrowid)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ids
+
+    def _claim(self, conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+        """
+        Pega o job pronto mais antigo cuja partição (restaurante) não tem job em execução nem
+        job mais antigo ainda pendente (ex.: esperando o backoff de uma nova tentativa): um
+        CANCELLED nunca passa na frente do PLACED do mesmo restaurante. Cada claim recebe um
+        lease_token novo, que identifica o dono do job enquanto ele roda.
+        """
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                """
+                SELECT * FROM jobs j
+                WHERE ((j.status = 'pending' AND j.available_at <= :now)
+                    OR (j.status = 'running' AND j.locked_until < :now))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM jobs r
+                      WHERE r.partition_key = j.partition_key
+                        AND r.id != j.id
+                        AND ((r.status = 'running' AND r.locked_until >= :now)
+                             OR (r.id < j.id AND r.status IN ('pending', 'running')))
+                  )
+                ORDER BY j.id
+                LIMIT 1
+                """,
+                {"now": now},
+            ).fetchone()
+            job = None
+            if row is not None:
+                job = {**dict(row), "lease_token": uuid.uuid4().hex}
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', locked_until = ?, lease_token = ? WHERE id = ?",
+                    (now + self.lease_seconds, job["lease_token"], job["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return job
+
+    @staticmethod
+    def _update_leased(conn: sqlite3.Connection, assignments: str, params: Tuple[Any, ...], job: Dict[str, Any]) -> bool:
+        """UPDATE só se o job ainda pertence a este claim (False: o lease foi reassumido)."""
+        return conn.execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ? AND lease_token = ?",
+            (*params, job["id"], job["lease_token"]),
+        ).rowcount > 0
+
+    def _renew_lease(self, conn: sqlite3.Connection, job: Dict[str, Any]) -> bool:
+        return self._update_leased(conn, "locked_until = ?", (time.time() + self.lease_seconds,), job)
+
+    def _delete_leased(self, conn: sqlite3.Connection, job: Dict[str, Any]) -> bool:
+        return conn.execute(
+            "DELETE FROM jobs WHERE id = ? AND lease_token = ?", (job["id"], job["lease_token"])
+        ).rowcount > 0
+
+    def _count_by_status(self, conn: sqlite3.Connection) -> Dict[str, int]:
+        return {row["status"]: row["total"] for row in conn.execute(
+            "SELECT status, COUNT(*) AS total FROM jobs GROUP BY status"
+        )}
+
+    # -------------------------------------------------------
+    # API PÚBLICA
+    # -------------------------------------------------------
+    def register_handler(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def enqueue(self, kind: str, partition_key: str, payload: Dict[str, Any], delay_seconds: float = 0.0) -> int:
+        ids = await self.enqueue_many(kind, [(partition_key, payload)], delay_seconds)
+        return ids[0]
+
+    async def enqueue_many(self, kind: str, items: List[Tuple[str, Dict[str, Any]]], delay_seconds: float = 0.0) -> List[int]:
+        """Grava vários jobs numa única transação."""
+        rows = [(kind, partition_key, json.dumps(payload)) for partition_key, payload in items]
+        ids = await self._db(lambda conn: self._insert_jobs(conn, rows, delay_seconds))
+        JOBS_ENQUEUED.inc(len(ids), kind=kind)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return ids
+
+    async def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = await self._db(lambda conn: conn.execute(
+            "SELECT id, kind, partition_key, payload, attempts, created_at, last_error FROM jobs "
+            "WHERE status = 'dead' ORDER BY id DESC LIMIT ?",
+            (limit,),
+        ).fetchall())
+        return [{**dict(row), "payload": json.loads(row["payload"])} for row in rows]
+
+    async def retry_dead(self, job_id: int) -> bool:
+        """Devolve um job da dead-letter para a fila (zerando as tentativas)."""
+        updated = await self._db(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, available_at = ?, locked_until = NULL, lease_token = NULL "
+            "WHERE id = ? AND status = 'dead'",
+            (time.time(), job_id),
+        ).rowcount)
+        if updated and self._wakeup is not None:
+            self._wakeup.set()
+        return bool(updated)
+
+    @property
+    def depth(self) -> Dict[str, int]:
+        return dict(self._depth)
+
+    # -------------------------------------------------------
+    # WORKERS
+    # -------------------------------------------------------
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"order-queue-worker-{index}")
+            for index in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._monitor(), name="order-queue-monitor"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await asyncio.get_running_loop().run_in_executor(self._executor, conn.close)
+        self._executor.shutdown(wait=False)
+
+    async def _monitor(self) -> None:
+        while True:
+            try:
+                self._depth = await self._db(self._count_by_status)
+            except Exception as e:
+                logger.error("Erro ao medir a fila de pedidos", extra={"error": str(e)})
+            await asyncio.sleep(5)
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                row = await self._db(self._claim)
+            except Exception as e:
+                logger.error("Erro ao buscar job na fila de pedidos", extra={"error": str(e)})
+                row = None
+
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=ORDER_QUEUE_IDLE_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Logs emitidos durante o job (handlers incluídos) saem com job_id e job_kind
+            with bind(job_id=row["id"], job_kind=row["kind"]):
+                await self._run_job(row)
+
+    async def _heartbeat(self, job: Dict[str, Any]) -> None:
+        """Renova o lease enquanto o handler roda; para se outro worker já o reassumiu."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self._db(lambda conn: self._renew_lease(conn, job))
+            except Exception as e:
+                logger.error("Erro ao renovar o lease do job", extra={"error": str(e)})
+                continue
+            if not renewed:
+                logger.warning("Lease do job reassumido por outro worker durante a execução")
+                return
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        kind = job["kind"]
+        attempts = job["attempts"] + 1
+        handler = self._handlers.get(kind)
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(self._heartbeat(job), name=f"order-queue-lease-{job['id']}")
+        try:
+            if handler is None:
+                raise LookupError(f"Nenhum handler registrado para jobs do tipo '{kind}'.")
+            await handler(json.loads(job["payload"]))
+        except asyncio.CancelledError:
+            # Shutdown no meio do job: devolve para a fila em vez de esperar o lease expirar
+            await self._db(lambda conn: self._update_leased(
+                conn, "status = 'pending', locked_until = NULL, lease_token = NULL", (), job
+            ))
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {getattr(e, 'detail', None) or str(e)}"
+            if is_retryable(e) and attempts < self.max_attempts:
+                delay = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** (attempts - 1)))
+                delay += random.uniform(0, delay / 2)
+                updated = await self._db(lambda conn: self._update_leased(
+                    conn,
+                    "status = 'pending', attempts = ?, available_at = ?, locked_until = NULL, lease_token = NULL, last_error = ?",
+                    (attempts, time.time() + delay, error),
+                    job,
+                ))
+                result = "retry"
+            else:
+                updated = await self._db(lambda conn: self._update_leased(
+                    conn,
+                    "status = 'dead', attempts = ?, locked_until = NULL, lease_token = NULL, last_error = ?",
+                    (attempts, error),
+                    job,
+                ))
+                result = "dead"
+            if not updated:
+                self._lease_lost(kind)
+                return
+            JOBS_FINISHED.inc(kind=kind, result=result)
+            if result == "retry":
+                logger.warning("Job falhou; nova tentativa agendada", extra={"attempts": attempts, "retry_in_seconds": round(delay, 1), "error": error})
+            else:
+                logger.error("Job enviado para a dead-letter", extra={"attempts": attempts, "error": error})
+            return
+        finally:
+            heartbeat.cancel()
+            JOB_RUN_SECONDS.observe(time.perf_counter() - started, kind=kind)
+
+        if not await self._db(lambda conn: self._delete_leased(conn, job)):
+            self._lease_lost(kind)
+            return
+        JOBS_FINISHED.inc(kind=kind, result="done")
+        JOB_LATENCY_SECONDS.observe(time.time() - job["created_at"], kind=kind)
+
+    def _lease_lost(self, kind: str) -> None:
+        # O job foi reassumido (ex.: o event loop ficou parado além do lease): o resultado
+        # desta execução é descartado e quem detém o lease decide o destino do job
+        LEASES_LOST.inc(kind=kind)
+        logger.error("Lease do job perdido durante a execução; resultado descartado")
+
+
+_queue: Optional[OrderQueue] = None
+
+registry.callback_gauge(
+    "order_queue_depth",
+    "Jobs na fila durável por status (pending, running, dead).",
+    lambda: {(status,): total for status, total in (_queue.depth if _queue else {}).items()},
+    labelnames=("status",),
+)
+
+
+def start_order_queue(handlers: Dict[str, JobHandler]) -> OrderQueue:
+    """Abre a fila e sobe o pool de workers. Chamado no startup (lifespan) da aplicação."""
+    queue = get_order_queue()
+    for kind, handler in handlers.items():
+        queue.register_handler(kind, handler)
+    queue.start()
+    return queue
+
+
+async def stop_order_queue() -> None:
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
+
+
+def get_order_queue() -> OrderQueue:
+    # Sem lifespan (scripts, shell) a fila ainda aceita jobs; eles serão processados no próximo startup.
+    global _queue
+    if _queue is None:
+        _queue = OrderQueue()
+    return _queue
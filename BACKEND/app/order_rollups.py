@@ -0,0 +1,191 @@
+# app/order_rollups.py
+"""
+Agregados por hora dos pedidos (volume, cancelamentos e latência de confirmação).
+
+Os relatórios não leem a tabela pedidos: cada transição aplicada pela máquina de estados
+(order_state.py, eventos do webhook e do polling) soma 1 na célula
+(restaurante, plataforma, hora da transição, status de destino). Os incrementos ficam em
+memória e são gravados em lote a cada ORDER_ROLLUP_FLUSH_INTERVAL_SECONDS pela função SQL
+incrementar_pedidos_rollup (sql/006), que soma em vez de sobrescrever, então várias réplicas
+gravam na mesma linha sem se perderem.
+
+Cada lote leva um id (lote_id) e um lote que falhou é reenviado com o mesmo id e os mesmos
+incrementos; a função ignora um id já aplicado. Um timeout depois do commit no banco não
+conta o lote duas vezes.
+
+- volume: transições para 'pending' (pedido recebido); cancelamentos: para 'cancelled';
+- latência de confirmação: segundos entre 'pending' e 'confirmed' do mesmo pedido, como soma +
+  amostras na célula 'confirmed' (média = soma / amostras). Só conta pedidos recebidos por
+  este processo desde o startup (até ORDER_ROLLUP_TRACKED_ORDERS aguardando confirmação).
+- os relatórios enxergam os incrementos depois da próxima descarga (alguns segundos).
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import registry
+from .order_state import ORDER_STATUS_CONFIRMED, ORDER_STATUS_PENDING
+from .platforms import platform_of
+from .repositories import PedidosRollupRepository, RepositoryError, get_pedidos_rollup_repository
+
+logger = logging.getLogger(__name__)
+
+ORDER_ROLLUP_FLUSH_INTERVAL_SECONDS = float(os.getenv("ORDER_ROLLUP_FLUSH_INTERVAL_SECONDS", "5"))
+ORDER_ROLLUP_TRACKED_ORDERS = int(os.getenv("ORDER_ROLLUP_TRACKED_ORDERS", "50000"))
+
+# (restaurante_id, plataforma, hora ISO, status)
+RollupCell = Tuple[str, str, str, str]
+
+FLUSHES = registry.counter(
+    "order_rollup_flushes_total",
+    "Gravações em lote dos agregados por hora por resultado (success, failure, dropped).",
+    labelnames=("result",),
+)
+FLUSH_CELLS = registry.histogram(
+    "order_rollup_flush_cells",
+    "Células (restaurante, plataforma, hora, status) incrementadas por gravação.",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+
+
+def hour_bucket(moment: datetime) -> str:
+    """Início da hora (UTC) em ISO 8601: a chave `hora` da tabela."""
+    return moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0).isoformat()
+
+
+class OrderRollups:
+    def __init__(
+        self,
+        rollups: PedidosRollupRepository,
+        flush_interval_seconds: float = ORDER_ROLLUP_FLUSH_INTERVAL_SECONDS,
+        tracked_orders: int = ORDER_ROLLUP_TRACKED_ORDERS,
+    ):
+        self._rollups = rollups
+        self.flush_interval_seconds = flush_interval_seconds
+        self.tracked_orders = tracked_orders
+        # célula -> [pedidos, soma dos segundos de confirmação, amostras]
+        self._deltas: Dict[RollupCell, List[float]] = {}
+        # Lote que falhou: (lote_id, incrementos), reenviado como está na próxima descarga
+        self._retry: Optional[Tuple[str, Dict[RollupCell, List[float]]]] = None
+        # (restaurante_id, order_id) -> instante (monotônico) em que o pedido ficou pending
+        self._placed_at: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, restaurante_id: str, order_id: str, previous_status: Optional[str], new_status: str) -> None:
+        """Listener da máquina de estados: acumula a transição na célula da hora atual."""
+        cell = (restaurante_id, platform_of(order_id), hour_bucket(datetime.now(timezone.utc)), new_status)
+        delta = self._deltas.get(cell)
+        if delta is None:
+            delta = self._deltas[cell] = [0, 0.0, 0]
+        delta[0] += 1
+
+        key = (restaurante_id, order_id)
+        if new_status == ORDER_STATUS_PENDING:
+            self._placed_at[key] = time.monotonic()
+            while len(self._placed_at) > self.tracked_orders:
+                self._placed_at.popitem(last=False)
+            return
+        placed_at = self._placed_at.pop(key, None)
+        if placed_at is not None and new_status == ORDER_STATUS_CONFIRMED:
+            delta[1] += time.monotonic() - placed_at
+            delta[2] += 1
+
+    def _rows(self, deltas: Dict[RollupCell, List[float]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "restaurante_id": restaurante_id,
+                "plataforma": plataforma,
+                "hora": hora,
+                "status": order_status,
+                "pedidos": int(count),
+                "confirmacao_segundos_soma": round(seconds, 3),
+                "confirmacao_amostras": int(samples),
+            }
+            for (restaurante_id, plataforma, hora, order_status), (count, seconds, samples) in deltas.items()
+        ]
+
+    async def flush(self, reason: str = "interval") -> None:
+        async with self._flush_lock:
+            while self._retry is not None or self._deltas:
+                if self._retry is None:
+                    self._retry, self._deltas = (str(uuid.uuid4()), self._deltas), {}
+                batch_id, deltas = self._retry
+                try:
+                    await self._rollups.increment(batch_id, self._rows(deltas))
+                except Exception as e:
+                    extra = {"batch_id": batch_id, "cells": len(deltas), "reason": reason, "error": str(e)}
+                    if isinstance(e, RepositoryError) and not e.retryable:
+                        # Erro permanente (dados inválidos): reenviar não adianta
+                        self._retry = None
+                        FLUSHES.inc(result="dropped")
+                        logger.error("Agregados de pedidos descartados", extra=extra)
+                        continue
+                    # O lote pode ter sido aplicado (timeout depois do commit): o reenvio usa o
+                    # mesmo lote_id e os incrementos que chegarem até lá vão no lote seguinte
+                    FLUSHES.inc(result="failure")
+                    logger.error("Erro ao gravar os agregados de pedidos", extra=extra)
+                    return
+                self._retry = None
+                FLUSHES.inc(result="success")
+                FLUSH_CELLS.observe(len(deltas))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="order-rollups")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush("shutdown")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            await self.flush()
+
+    def __len__(self) -> int:
+        return len(self._deltas) + (len(self._retry[1]) if self._retry is not None else 0)
+
+
+_order_rollups: Optional[OrderRollups] = None
+
+registry.callback_gauge(
+    "order_rollup_pending_cells",
+    "Células de agregados aguardando a próxima gravação.",
+    lambda: {(): len(_order_rollups) if _order_rollups is not None else 0},
+)
+
+
+def get_order_rollups() -> OrderRollups:
+    global _order_rollups
+    if _order_rollups is None:
+        _order_rollups = OrderRollups(get_pedidos_rollup_repository())
+    return _order_rollups
+
+
+def record_order_transition(restaurante_id: str, order_id: str, previous_status: Optional[str], new_status: str) -> None:
+    """Listener da máquina de estados (registrado no lifespan)."""
+    get_order_rollups().record(restaurante_id, order_id, previous_status, new_status)
+
+
+def start_order_rollups() -> None:
+    """Inicia a gravação periódica dos agregados. Chamado no startup (lifespan) da aplicação."""
+    get_order_rollups().start()
+
+
+async def stop_order_rollups() -> None:
+    global _order_rollups
+    if _order_rollups is not None:
+        await _order_rollups.stop()
+        _order_rollups = None
@@ -0,0 +1,222 @@
+# app/order_state.py
+"""
+Ciclo de vida dos pedidos (máquina de estados) com contadores por status em memória.
+
+Cada código de evento do iFood (webhook ou polling) vira uma transição de status. Os pedidos
+ativos (não terminais) ficam num dicionário compacto por restaurante e os contadores por
+status são mantidos de forma incremental, então ler os contadores do monitor é O(1) e uma
+transição não precisa ler o pedido de volta do banco. As transições são gravadas de forma
+assíncrona, em lote, na coluna `status` da tabela pedidos.
+
+- Status (vocabulário do front-end): pending -> confirmed -> preparing -> shipped -> delivered;
+  cancelled a partir de qualquer status ativo.
+- Eventos fora de ordem: avançar pula etapas; um evento que voltaria o status é ignorado.
+- Contadores de status ativos refletem o conjunto quente (aquecido do banco no startup);
+  os de status terminais (delivered, cancelled) contam transições desde o startup.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import registry
+from .repositories import PedidosRepository
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATE_ACTIVE_TTL_SECONDS = float(os.getenv("ORDER_STATE_ACTIVE_TTL_SECONDS", str(24 * 3600)))
+ORDER_STATE_SWEEP_INTERVAL_SECONDS = float(os.getenv("ORDER_STATE_SWEEP_INTERVAL_SECONDS", "600"))
+# Quantos pedidos finalizados lembrar, para ignorar eventos atrasados que chegam depois do fim
+ORDER_STATE_FINISHED_MEMORY = int(os.getenv("ORDER_STATE_FINISHED_MEMORY", "50000"))
+
+ORDER_STATUS_PENDING = "pending"
+ORDER_STATUS_CONFIRMED = "confirmed"
+ORDER_STATUS_PREPARING = "preparing"
+ORDER_STATUS_SHIPPED = "shipped"
+ORDER_STATUS_DELIVERED = "delivered"
+ORDER_STATUS_CANCELLED = "cancelled"
+
+# Ordem do ciclo de vida; o índice é o que fica guardado no conjunto quente
+ORDER_STATUSES: Tuple[str, ...] = (
+    ORDER_STATUS_PENDING,
+    ORDER_STATUS_CONFIRMED,
+    ORDER_STATUS_PREPARING,
+    ORDER_STATUS_SHIPPED,
+    ORDER_STATUS_DELIVERED,
+    ORDER_STATUS_CANCELLED,
+)
+_STATUS_INDEX = {order_status: index for index, order_status in enumerate(ORDER_STATUSES)}
+_DELIVERED = _STATUS_INDEX[ORDER_STATUS_DELIVERED]
+_CANCELLED = _STATUS_INDEX[ORDER_STATUS_CANCELLED]
+TERMINAL_STATUSES = (ORDER_STATUS_DELIVERED, ORDER_STATUS_CANCELLED)
+ACTIVE_STATUSES = tuple(s for s in ORDER_STATUSES if s not in TERMINAL_STATUSES)
+
+# Códigos de evento (formato do webhook; o polling é convertido em event_poller.py) -> status
+EVENT_CODE_TO_STATUS = {
+    "ORDER_PLACED": ORDER_STATUS_PENDING,
+    "ORDER_CONFIRMED": ORDER_STATUS_CONFIRMED,
+    "ORDER_PREPARATION_STARTED": ORDER_STATUS_PREPARING,
+    "ORDER_READY_TO_PICKUP": ORDER_STATUS_PREPARING,
+    "ORDER_DISPATCHED": ORDER_STATUS_SHIPPED,
+    "ORDER_CONCLUDED": ORDER_STATUS_DELIVERED,
+    "ORDER_CANCELED": ORDER_STATUS_CANCELLED,
+    "ORDER_CANCELLED": ORDER_STATUS_CANCELLED,
+}
+
+# (restaurante_id, order_id, status_anterior, status_novo)
+TransitionListener = Callable[[str, str, Optional[str], str], None]
+
+TRANSITIONS = registry.counter(
+    "order_state_transitions_total",
+    "Eventos aplicados à máquina de estados por resultado (applied, ignored, unknown_code).",
+    labelnames=("result",),
+)
+
+
+class OrderStateMachine:
+    def __init__(self, active_ttl_seconds: float = ORDER_STATE_ACTIVE_TTL_SECONDS):
+        self.active_ttl_seconds = active_ttl_seconds
+        # restaurante_id -> {order_id: (índice do status, instante monotônico da última transição)}
+        self._active: Dict[str, Dict[str, Tuple[int, float]]] = defaultdict(dict)
+        # restaurante_id -> contagem por índice de status
+        self._counts: Dict[str, List[int]] = defaultdict(lambda: [0] * len(ORDER_STATUSES))
+        # (restaurante_id, order_id) dos pedidos que já chegaram a um status terminal (LRU)
+        self._finished: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._listeners: List[TransitionListener] = []
+        self._sweep_task: Optional[asyncio.Task] = None
+
+    def add_listener(self, listener: TransitionListener) -> None:
+        """Chamado a cada transição aplicada (gravação no banco, stream SSE...)."""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def apply(self, restaurante_id: str, order_id: str, code: str) -> Optional[str]:
+        """Aplica o evento; retorna o novo status ou None se o evento não muda nada."""
+        target_status = EVENT_CODE_TO_STATUS.get(code)
+        if target_status is None:
+            TRANSITIONS.inc(result="unknown_code")
+            return None
+        return self.transition(restaurante_id, order_id, target_status)
+
+    def transition(self, restaurante_id: str, order_id: str, target_status: str) -> Optional[str]:
+        target = _STATUS_INDEX[target_status]
+        orders = self._active[restaurante_id]
+        counts = self._counts[restaurante_id]
+        current = orders.get(order_id)
+
+        if current is None and (restaurante_id, order_id) in self._finished:
+            TRANSITIONS.inc(result="ignored")
+            return None
+        if current is not None:
+            current_index = current[0]
+            # Cancelamento vale de qualquer status ativo; fora isso, só avança
+            if target == current_index or (target < current_index and target != _CANCELLED):
+                TRANSITIONS.inc(result="ignored")
+                return None
+            counts[current_index] -= 1
+        previous_status = ORDER_STATUSES[current[0]] if current is not None else None
+
+        counts[target] += 1
+        if target in (_DELIVERED, _CANCELLED):
+            orders.pop(order_id, None)
+            self._finished[(restaurante_id, order_id)] = None
+            while len(self._finished) > ORDER_STATE_FINISHED_MEMORY:
+                self._finished.popitem(last=False)
+        else:
+            orders[order_id] = (target, time.monotonic())
+
+        TRANSITIONS.inc(result="applied")
+        for listener in self._listeners:
+            try:
+                listener(restaurante_id, order_id, previous_status, target_status)
+            except Exception:
+                logger.exception("Erro ao notificar a transição do pedido", extra={"order_id": order_id})
+        return target_status
+
+    def status_of(self, restaurante_id: str, order_id: str) -> Optional[str]:
+        """Status de um pedido ativo (None se terminal ou desconhecido)."""
+        current = self._active.get(restaurante_id, {}).get(order_id)
+        return ORDER_STATUSES[current[0]] if current is not None else None
+
+    def reached(self, restaurante_id: str, order_id: str, order_status: str) -> bool:
+        """Se o pedido já está em `order_status` ou adiante (encerrado conta como adiante)."""
+        if (restaurante_id, order_id) in self._finished:
+            return True
+        current = self._active.get(restaurante_id, {}).get(order_id)
+        return current is not None and current[0] >= _STATUS_INDEX[order_status]
+
+    def counters(self, restaurante_id: str) -> Dict[str, int]:
+        counts = self._counts.get(restaurante_id)
+        if counts is None:
+            return {order_status: 0 for order_status in ORDER_STATUSES}
+        return dict(zip(ORDER_STATUSES, counts))
+
+    def warm(self, rows: List[Dict[str, Any]]) -> int:
+        """Carrega pedidos ativos (restaurante_id, ifood_order_id, status) vindos do banco."""
+        loaded = 0
+        for row in rows:
+            index = _STATUS_INDEX.get(row.get("status"))
+            if index is None or ORDER_STATUSES[index] in TERMINAL_STATUSES:
+                continue
+            # Eventos aplicados antes do aquecimento valem mais que a leitura do banco: um pedido
+            # já ativo ou encerrado aqui não é recarregado (senão voltaria a contar nos agregados)
+            key = (row["restaurante_id"], row["ifood_order_id"])
+            orders = self._active[key[0]]
+            if key[1] in orders or key in self._finished:
+                continue
+            orders[row["ifood_order_id"]] = (index, time.monotonic())
+            self._counts[row["restaurante_id"]][index] += 1
+            loaded += 1
+        return loaded
+
+    def sweep(self) -> int:
+        """Tira do conjunto quente pedidos ativos sem evento há mais de active_ttl_seconds."""
+        cutoff = time.monotonic() - self.active_ttl_seconds
+        removed = 0
+        for restaurante_id, orders in self._active.items():
+            counts = self._counts[restaurante_id]
+            for order_id in [order_id for order_id, (_, since) in orders.items() if since < cutoff]:
+                counts[orders.pop(order_id)[0]] -= 1
+                removed += 1
+        return removed
+
+    def start(self) -> None:
+        if self._sweep_task is None:
+            self._sweep_task = asyncio.create_task(self._sweep_loop(), name="order-state-sweep")
+
+    async def stop(self) -> None:
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            try:
+                await self._sweep_task
+            except asyncio.CancelledError:
+                pass
+            self._sweep_task = None
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(ORDER_STATE_SWEEP_INTERVAL_SECONDS)
+            removed = self.sweep()
+            if removed:
+                logger.info("Pedidos parados saíram do conjunto ativo", extra={"removed": removed, "ttl_seconds": self.active_ttl_seconds})
+
+    def active_count(self) -> int:
+        return sum(len(orders) for orders in self._active.values())
+
+
+order_state = OrderStateMachine()
+
+registry.callback_gauge(
+    "order_state_active_orders",
+    "Pedidos ativos (não terminais) no conjunto quente em memória.",
+    lambda: {(): order_state.active_count()},
+)
+
+
+async def warm_order_state(pedidos: PedidosRepository) -> int:
+    """Aquece o conjunto quente com os pedidos ativos recentes (etapa do warmup.py)."""
+    since = datetime.now(timezone.utc) - timedelta(seconds=order_state.active_ttl_seconds)
+    return order_state.warm(await pedidos.list_active(ACTIVE_STATUSES, since.isoformat()))
@@ -0,0 +1,234 @@
+# app/order_writer.py
+"""
+Gravação em lote (write-behind) da tabela pedidos.
+
+Os workers da fila não gravam cada pedido num upsert próprio: entregam as linhas a um buffer
+que é descarregado num único upsert quando junta ORDER_WRITE_BATCH_SIZE pedidos ou a cada
+ORDER_WRITE_FLUSH_INTERVAL_SECONDS, o que vier primeiro. `write()` só retorna depois que o
+lote com as linhas foi gravado (group commit): o worker continua confirmando o pedido no
+iFood apenas com ele já salvo, e uma falha no upsert chega a ele (e vira nova tentativa).
+
+Há dois buffers: um com o pedido completo (payload da plataforma) e outro só com as mudanças de
+status vindas da máquina de estados (order_state.py), gravadas sem espera (`submit`). Como
+cada upsert só atualiza as colunas que envia, gravar o payload nunca desfaz um status.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .metrics import registry
+from .platforms import get_platform, platform_of
+from .repositories import PedidosRepository, get_pedidos_repository
+
+logger = logging.getLogger(__name__)
+
+ORDER_WRITE_BATCH_SIZE = int(os.getenv("ORDER_WRITE_BATCH_SIZE", "200"))
+ORDER_WRITE_FLUSH_INTERVAL_SECONDS = float(os.getenv("ORDER_WRITE_FLUSH_INTERVAL_SECONDS", "0.2"))
+
+BATCH_ROWS = registry.histogram(
+    "order_writer_batch_rows",
+    "Linhas gravadas por upsert em lote, por buffer (orders, status).",
+    labelnames=("writer",),
+    buckets=(1, 5, 10, 25, 50, 100, 200, 500),
+)
+FLUSH_SECONDS = registry.histogram(
+    "order_writer_flush_seconds",
+    "Duração de cada upsert em lote na tabela pedidos, por buffer.",
+    labelnames=("writer",),
+)
+FLUSHES = registry.counter(
+    "order_writer_flushes_total",
+    "Descargas dos buffers de pedidos por motivo (size, interval, shutdown) e resultado.",
+    labelnames=("writer", "reason", "result"),
+)
+
+
+def order_row(restaurante_id: str, plataforma: str, order_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Monta a linha de pedidos: colunas normalizadas para o monitor (extraídas pelo adaptador da
+    plataforma) + payload completo em `data`. O status não vai aqui: é responsabilidade da
+    máquina de estados (ver status_row).
+    """
+    return {
+        "restaurante_id": restaurante_id,
+        "plataforma": plataforma,
+        **get_platform(plataforma).order_columns(order_data),
+        "data": order_data,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def status_row(restaurante_id: str, order_id: str, order_status: str) -> Dict[str, Any]:
+    """
+    Linha só com o status (transição da máquina de estados). Leva a plataforma (prefixo da
+    chave do pedido): se a transição chegar antes do pedido completo, a linha inserida não
+    fica com o default 'ifood' da coluna.
+    """
+    return {
+        "restaurante_id": restaurante_id,
+        "plataforma": platform_of(order_id),
+        "ifood_order_id": order_id,
+        "status": order_status,
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class OrderWriter:
+    def __init__(
+        self,
+        pedidos: PedidosRepository,
+        name: str = "orders",
+        batch_size: int = ORDER_WRITE_BATCH_SIZE,
+        flush_interval_seconds: float = ORDER_WRITE_FLUSH_INTERVAL_SECONDS,
+        requeue_on_failure: bool = False,
+    ):
+        self._pedidos = pedidos
+        self.name = name
+        # Sem ninguém esperando (submit), um lote que falhou volta ao buffer para a próxima descarga
+        self.requeue_on_failure = requeue_on_failure
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        # ifood_order_id -> linha; escritas repetidas do mesmo pedido no mesmo lote viram uma só
+        self._buffer: Dict[str, Dict[str, Any]] = {}
+        self._waiters: List[asyncio.Future] = []
+        self._first_write_at: Optional[float] = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def _add(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            self._buffer[row["ifood_order_id"]] = row
+        if self._first_write_at is None:
+            # Primeira linha do lote: o loop de descarga passa a contar o intervalo
+            self._first_write_at = time.monotonic()
+            self._wakeup.set()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def write(self, rows: List[Dict[str, Any]]) -> None:
+        """Enfileira as linhas e espera o upsert do lote em que elas entrarem."""
+        if not rows:
+            return
+        self._add(rows)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self._task is None:
+            # Sem o loop de descarga (uso fora do lifespan): grava na hora
+            await self.flush("size")
+        await waiter
+
+    def submit(self, rows: List[Dict[str, Any]]) -> None:
+        """Enfileira as linhas sem esperar a gravação."""
+        if not rows:
+            return
+        self._add(rows)
+        if self._task is None:
+            asyncio.get_running_loop().create_task(self.flush("size"))
+
+    async def flush(self, reason: str) -> None:
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            rows, waiters = list(self._buffer.values()), self._waiters
+            self._buffer, self._waiters, self._first_write_at = {}, [], None
+
+            started = time.perf_counter()
+            try:
+                await self._pedidos.upsert_many(rows)
+            except Exception as e:
+                FLUSHES.inc(writer=self.name, reason=reason, result="failure")
+                logger.error("Erro ao gravar lote em pedidos", extra={"writer": self.name, "rows": len(rows), "error": str(e)})
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                if self.requeue_on_failure and reason != "shutdown":
+                    # Só volta o que não foi substituído por uma escrita mais nova nesse meio-tempo
+                    self._add([row for row in rows if row["ifood_order_id"] not in self._buffer])
+                return
+            finally:
+                FLUSH_SECONDS.observe(time.perf_counter() - started, writer=self.name)
+
+            FLUSHES.inc(writer=self.name, reason=reason, result="success")
+            BATCH_ROWS.observe(len(rows), writer=self.name)
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="order-writer")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Não deixa ninguém esperando por um lote que não será mais descarregado
+        await self.flush("shutdown")
+
+    def _seconds_until_due(self) -> Optional[float]:
+        if self._first_write_at is None:
+            return None
+        return max(0.0, self._first_write_at + self.flush_interval_seconds - time.monotonic())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._seconds_until_due())
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if len(self._buffer) >= self.batch_size:
+                await self.flush("size")
+            elif self._buffer and self._seconds_until_due() == 0:
+                await self.flush("interval")
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+
+_writers: Dict[str, OrderWriter] = {}
+
+registry.callback_gauge(
+    "order_writer_buffered_rows",
+    "Linhas aguardando nos buffers de gravação de pedidos.",
+    lambda: {(name,): len(writer) for name, writer in _writers.items()},
+    labelnames=("writer",),
+)
+
+
+def get_order_writer() -> OrderWriter:
+    """Buffer dos pedidos completos (payload do iFood)."""
+    if "orders" not in _writers:
+        _writers["orders"] = OrderWriter(get_pedidos_repository(), name="orders")
+    return _writers["orders"]
+
+
+def get_status_writer() -> OrderWriter:
+    """Buffer das transições de status."""
+    if "status" not in _writers:
+        _writers["status"] = OrderWriter(get_pedidos_repository(), name="status", requeue_on_failure=True)
+    return _writers["status"]
+
+
+def persist_order_transition(restaurante_id: str, order_id: str, previous_status: Optional[str], new_status: str) -> None:
+    """Listener da máquina de estados: grava a transição em lote, sem esperar."""
+    get_status_writer().submit([status_row(restaurante_id, order_id, new_status)])
+
+
+def start_order_writer() -> None:
+    """Inicia a descarga periódica dos buffers. Chamado no startup (lifespan) da aplicação."""
+    get_order_writer().start()
+    get_status_writer().start()
+
+
+async def stop_order_writer() -> None:
+    for name in list(_writers):
+        await _writers.pop(name).stop()
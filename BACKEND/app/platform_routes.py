@@ -0,0 +1,151 @@
+# app/platform_routes.py
+"""
+Rotas comuns aos marketplaces (Rappi, 99Food; o iFood também é aceito aqui). Cada rota
+recebe o nome da plataforma e delega o que é específico ao adaptador (app/platforms); o
+processamento é o mesmo do iFood: fila durável, índice de merchants, deduplicação, máquina
+de estados e gravação em lote (ver routes.py).
+"""
+import logging
+import time
+from datetime import datetime, timezone
+
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+
+from .order_queue import OrderQueue, get_order_queue
+from .platforms import get_platform
+from .repositories import IntegracoesRepository, get_integracoes_repository
+from .merchant_index import merchant_index
+from .routes import WEBHOOK_RAW_JOB, TESTE_RESTAURANTE_UUID
+from .token_cache import token_cache
+from .token_refresher import get_token_refresher
+from .webhook_intake import WebhookRejected, decode_body, observe_ack
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/platforms",
+    tags=["Marketplaces"]
+)
+
+
+# -----------------------------------------------------------
+# /{plataforma}/connect (AUTORIZA UMA LOJA POR CLIENT CREDENTIALS)
+# -----------------------------------------------------------
+@router.post("/{plataforma}/connect", summary="Autoriza uma loja de plataforma com client credentials (Rappi, 99Food)")
+async def connect_platform_store(
+    plataforma: str,
+    restaurante_id: str = Query(..., description=f"ID Mestre (UUID) do restaurante. Ex: {TESTE_RESTAURANTE_UUID}"),
+    external_merchant_id: str = Query(..., description="ID da loja na plataforma"),
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository)
+):
+    """
+    Obtém o token da plataforma para a loja e cria/atualiza o registro em
+    'restaurante_integracoes' (o iFood usa o fluxo /ifood/usercode + /ifood/token).
+    """
+    adapter = get_platform(plataforma)
+    if not adapter.supports_client_credentials:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{plataforma} não autoriza lojas por client credentials.",
+        )
+    try:
+        grant = await adapter.authorize(external_merchant_id)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Erro na API da plataforma {plataforma} (Status {e.response.status_code}): {e.response.text}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao autorizar a loja na plataforma {plataforma}: {str(e)}"
+        )
+
+    data = {
+        **grant.as_record(),
+        "external_merchant_id": external_merchant_id,
+        "is_authorized": True,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        existing = await integracoes.get(restaurante_id, plataforma, columns="id")
+        if existing:
+            saved_rows = await integracoes.update_by_id(existing["id"], data)
+        else:
+            saved_rows = await integracoes.insert({**data, "restaurante_id": restaurante_id, "plataforma": plataforma})
+        if not saved_rows:
+            raise Exception("Inserção/Atualização no Supabase falhou sem erro detalhado.")
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro fatal ao inserir/atualizar integração: {str(e).strip()}"
+        )
+
+    # Mesmo caminho do /ifood/token: cache, índice do webhook e renovação proativa
+    token_cache.invalidate((restaurante_id, plataforma))
+    merchant_index.put(external_merchant_id, plataforma, restaurante_id)
+    refresher = get_token_refresher()
+    if refresher is not None:
+        refresher.schedule(restaurante_id, plataforma, saved_rows[0])
+
+    return {
+        "message": f"✅ Loja da plataforma {plataforma} autorizada e mapeada ao seu restaurante ID.",
+        "restaurante_id": restaurante_id,
+        "external_merchant_id": external_merchant_id,
+    }
+
+
+# -----------------------------------------------------------
+# /{plataforma}/webhook (RECEBE EVENTOS EM TEMPO REAL)
+# -----------------------------------------------------------
+@router.post("/{plataforma}/webhook", status_code=status.HTTP_200_OK, summary="Recebe Webhooks de um marketplace (ACK imediato; processamento na fila)")
+async def platform_webhook_receiver(
+    plataforma: str,
+    request: Request,
+    order_queue: OrderQueue = Depends(get_order_queue)
+):
+    """
+    Mesmo contrato do /ifood/webhook: assinatura conferida sobre o corpo bruto, corpo gravado
+    na fila durável (partição pela loja) e resposta imediata. A tradução para o formato do
+    iFood é refeita pelo worker (webhook_raw_job_handler) com o adaptador da plataforma.
+    """
+    adapter = get_platform(plataforma)
+    started = time.perf_counter()
+    result = "accepted"
+    try:
+        body = await request.body()
+        # 1. ASSINATURA + TRADUÇÃO (sem banco)
+        try:
+            text = decode_body(body)
+            adapter.verify_webhook(body, request.headers)
+            external_merchant_id = adapter.webhook_merchant_id(body)
+        except WebhookRejected as e:
+            result = e.reason
+            logger.warning("Webhook recusado", extra={"plataforma": plataforma, "reason": e.reason})
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+        if not external_merchant_id:
+            result = "no_merchant"
+            logger.warning("Webhook recebido sem ID da loja", extra={"plataforma": plataforma})
+            return {"message": "Webhook recebido, mas sem ID externo para mapeamento."}
+
+        # 2. GRAVA O CORPO BRUTO NA FILA DURÁVEL (partição por loja: eventos da mesma loja em ordem)
+        try:
+            await order_queue.enqueue(
+                WEBHOOK_RAW_JOB,
+                f"{plataforma}:{external_merchant_id}",
+                {"plataforma": plataforma, "body": text}
+            )
+        except Exception as e:
+            result = "enqueue_failed"
+            # Sem o job gravado a plataforma precisa reentregar: não confirma o recebimento
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Falha ao enfileirar o evento de {plataforma}: {str(e)}"
+            )
+
+        # 3. RESPOSTA RÁPIDA OBRIGATÓRIA
+        return {"message": f"Webhook de {plataforma} recebido e roteado para processamento."}
+    finally:
+        observe_ack(time.perf_counter() - started, result)
@@ -0,0 +1,56 @@
+# app/platforms/__init__.py
+"""
+Registro dos adaptadores de marketplace. Um adaptador por plataforma, criado uma vez no
+import: todos compartilham o pool HTTP (ifood_http), o cache de tokens, o índice de merchants
+e a fila durável; cada um só traduz a API da sua plataforma.
+
+Para adicionar um marketplace: implemente PlatformAdapter e chame register_platform().
+"""
+from typing import Dict, List
+
+from fastapi import HTTPException
+
+from ..ifood_http import get_platform_rate_limiter
+from .base import PlatformAdapter, PlatformApiError, TokenGrant
+from .ifood import IfoodAdapter
+from .rappi import RappiAdapter
+from .ninety_nine import NinetyNineAdapter
+
+_platforms: Dict[str, PlatformAdapter] = {}
+
+
+def register_platform(adapter: PlatformAdapter) -> None:
+    _platforms[adapter.name] = adapter
+    # Limite global próprio, lido das variáveis <env_prefix>_RATE_LIMIT_PER_SECOND/_BURST
+    get_platform_rate_limiter(adapter.name, adapter.env_prefix)
+
+
+def get_platform(name: str) -> PlatformAdapter:
+    """Adaptador da plataforma; 404 para uma plataforma desconhecida (vem de rota/registro)."""
+    adapter = _platforms.get(name)
+    if adapter is None:
+        raise HTTPException(status_code=404, detail=f"Plataforma '{name}' não suportada.")
+    return adapter
+
+
+def uses_refresh_token(name: str) -> bool:
+    """Se a integração precisa de refresh_token para renovar (plataforma desconhecida: sim)."""
+    adapter = _platforms.get(name)
+    return adapter is None or adapter.uses_refresh_token
+
+
+def platform_names() -> List[str]:
+    return list(_platforms)
+
+
+def platform_of(order_key: str) -> str:
+    """Plataforma de uma chave de pedido ("<plataforma>:<ID>"; só o ID nativo no iFood)."""
+    prefix, separator, _ = order_key.partition(":")
+    return prefix if separator and prefix in _platforms else ifood.name
+
+
+ifood = IfoodAdapter()
+register_platform(ifood)
+register_platform(RappiAdapter())
+register_platform(NinetyNineAdapter())
+
@@ -0,0 +1,114 @@
+# app/platforms/base.py
+"""
+Interface comum dos marketplaces (iFood, Rappi, 99Food).
+
+Tudo que muda de uma plataforma para outra fica no adaptador: autenticação/renovação do
+token, GET e confirmação do pedido, verificação e tradução do webhook e as colunas
+normalizadas da tabela pedidos. O resto do pipeline (pool HTTP, cache de tokens, índice de
+merchants, deduplicação, fila durável, máquina de estados, gravação em lote) é um só e
+recebe o nome da plataforma.
+
+Os eventos de todas as plataformas são traduzidos para o formato do webhook do iFood
+({id, code, correlationId, metadata: {merchantId}}), com os códigos do iFood (ORDER_PLACED,
+ORDER_CONFIRMED, ORDER_CANCELED...). O `id` é a chave do pedido no sistema (ver `order_key`):
+o ID nativo no iFood e "<plataforma>:<ID nativo>" nas outras, porque a coluna
+pedidos.ifood_order_id é única entre todas as plataformas.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional
+
+
+class PlatformApiError(Exception):
+    """Erro de negócio devolvido pela plataforma com HTTP 200 (ex.: errno da 99Food)."""
+
+    def __init__(self, platform: str, code: Any, message: str):
+        super().__init__(f"{platform}: erro {code} ({message})")
+        self.platform = platform
+        self.code = code
+        self.message = message
+
+
+@dataclass
+class TokenGrant:
+    """Resultado de uma autenticação/renovação, no formato das colunas de restaurante_integracoes."""
+    access_token: str
+    refresh_token: str
+    expires_in: int
+
+    def as_record(self) -> Dict[str, Any]:
+        return {
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            "token_expires_in": self.expires_in,
+        }
+
+
+class PlatformAdapter(ABC):
+    # Valor da coluna `plataforma` (restaurante_integracoes, pedidos, webhook_eventos)
+    name: str = ""
+    # Prefixo das variáveis de ambiente da plataforma (ex.: RAPPI_RATE_LIMIT_PER_SECOND)
+    env_prefix: str = ""
+    # Plataformas sem refresh token (client credentials) autenticam de novo a cada renovação
+    uses_refresh_token: bool = True
+    # Lojas autorizadas por POST /platforms/{plataforma}/connect (implementa `authorize`)
+    supports_client_credentials: bool = False
+
+    # -------------------------------------------------------
+    # AUTENTICAÇÃO
+    # -------------------------------------------------------
+    @abstractmethod
+    async def refresh_token(self, record: Dict[str, Any]) -> TokenGrant:
+        """Renova o token do registro de restaurante_integracoes (levanta httpx.HTTPStatusError)."""
+
+    async def authorize(self, external_merchant_id: str) -> TokenGrant:
+        """Primeira autenticação de uma loja (só com supports_client_credentials)."""
+        raise NotImplementedError(f"{self.name} não autoriza lojas por client credentials.")
+
+    # -------------------------------------------------------
+    # PEDIDOS
+    # -------------------------------------------------------
+    # `merchant_key` (o restaurante_id) é a chave do limite de taxa por merchant (ifood_http)
+    @abstractmethod
+    async def fetch_order(self, access_token: str, order_id: str, merchant_key: Optional[str] = None) -> Dict[str, Any]:
+        """Detalhes completos do pedido (ID nativo da plataforma)."""
+
+    @abstractmethod
+    async def confirm_order(self, access_token: str, order_id: str, merchant_key: Optional[str] = None) -> None:
+        """Confirma (aceita) o pedido na plataforma (ID nativo)."""
+
+    @abstractmethod
+    def order_columns(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Colunas normalizadas da tabela pedidos (ifood_order_id, display_id, order_type, order_created_at, total)."""
+
+    def order_key(self, order_id: str) -> str:
+        """ID nativo -> chave do pedido no sistema."""
+        return f"{self.name}:{order_id}"
+
+    def native_order_id(self, order_key: str) -> str:
+        """Chave do pedido no sistema -> ID nativo (para as chamadas à API da plataforma)."""
+        prefix = f"{self.name}:"
+        return order_key[len(prefix):] if order_key.startswith(prefix) else order_key
+
+    # -------------------------------------------------------
+    # WEBHOOK
+    # -------------------------------------------------------
+    @abstractmethod
+    def verify_webhook(self, body: bytes, headers: Mapping[str, str]) -> None:
+        """Confere a assinatura do corpo bruto; levanta webhook_intake.WebhookRejected."""
+
+    @abstractmethod
+    def parse_webhook(self, body: bytes) -> List[Dict[str, Any]]:
+        """
+        Traduz o corpo do webhook para eventos no formato do iFood. Chamado no ACK (só precisa
+        do merchantId para particionar) e de novo no worker; levanta WebhookRejected se ilegível.
+        Eventos que a plataforma entrega com o pedido completo levam o pedido em metadata["order"].
+        """
+
+    def webhook_merchant_id(self, body: bytes) -> Optional[str]:
+        """merchantId do primeiro evento do corpo (partição da fila no ACK)."""
+        for event in self.parse_webhook(body):
+            merchant_id = event.get("metadata", {}).get("merchantId")
+            if merchant_id:
+                return merchant_id
+        return None
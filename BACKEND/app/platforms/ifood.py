@@ -0,0 +1,102 @@
+# app/platforms/ifood.py
+"""
+Adaptador do iFood (API Merchant v1.0). O fluxo de autorização (device code) e as rotas de
+status/cardápio continuam em routes.py, que usa as URLs daqui.
+"""
+from typing import Any, Dict, List, Mapping, Optional
+
+from ..ifood_http import ifood_request, IFOOD_API_BASE_URL
+from ..webhook_intake import verify_signature, parse_event, load_event
+from .base import PlatformAdapter, TokenGrant
+
+# URLs da API do iFood
+IFOOD_DEVICE_CODE_URL = f"{IFOOD_API_BASE_URL}/authentication/v1.0/oauth/userCode"
+IFOOD_TOKEN_URL = f"{IFOOD_API_BASE_URL}/authentication/v1.0/oauth/token"
+IFOOD_MERCHANT_BASE_URL = f"{IFOOD_API_BASE_URL}/merchant/v1.0"
+IFOOD_ORDER_BASE_URL = f"{IFOOD_MERCHANT_BASE_URL}/orders/v1.0" # Nova URL Base para Pedidos
+
+# ID FIXO da sua aplicação
+IFOOD_CLIENT_ID = "0b5c7a22-b607-4a3a-ae75-b32881ebc3ef"
+
+
+class IfoodAdapter(PlatformAdapter):
+    name = "ifood"
+    env_prefix = "IFOOD"
+
+    async def request_token(self, data: Dict[str, str], grant_type: str) -> Dict[str, Any]:
+        """Chamada ao endpoint /oauth/token (troca do código de autorização ou renovação)."""
+        data["clientId"] = IFOOD_CLIENT_ID
+        data["grantType"] = grant_type
+
+        response = await ifood_request(
+            "POST",
+            IFOOD_TOKEN_URL,
+            endpoint="token",
+            headers={"accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"},
+            data=data
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def refresh_token(self, record: Dict[str, Any]) -> TokenGrant:
+        # O refresh token do iFood é rotacionado a cada uso
+        tokens = await self.request_token({"refreshToken": record["refresh_token"]}, "refreshToken")
+        return TokenGrant(tokens["accessToken"], tokens["refreshToken"], tokens["expiresIn"])
+
+    async def fetch_order(self, access_token: str, order_id: str, merchant_key: Optional[str] = None) -> Dict[str, Any]:
+        """Busca os detalhes completos do pedido (GET /orders/{orderId})."""
+        response = await ifood_request(
+            "GET",
+            f"{IFOOD_ORDER_BASE_URL}/orders/{order_id}",
+            endpoint="order_get",
+            merchant_key=merchant_key,
+            headers={
+                "accept": "application/json",
+                "Authorization": f"Bearer {access_token}"
+            }
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def order_action(self, access_token: str, order_id: str, action: str, merchant_key: Optional[str] = None) -> None:
+        """
+        Executa ações na API de Pedidos do iFood (POST /orders/{orderId}/confirm, /cancel...).
+        A confirmação/cancelamento é um POST sem corpo; o iFood responde 202 Accepted.
+        """
+        response = await ifood_request(
+            "POST",
+            f"{IFOOD_ORDER_BASE_URL}/orders/{order_id}/{action.lower()}",
+            endpoint="order_action",
+            merchant_key=merchant_key,
+            headers={
+                "accept": "application/json",
+                "Authorization": f"Bearer {access_token}"
+            }
+        )
+        response.raise_for_status()
+
+    async def confirm_order(self, access_token: str, order_id: str, merchant_key: Optional[str] = None) -> None:
+        await self.order_action(access_token, order_id, "confirm", merchant_key)
+
+    def order_columns(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "ifood_order_id": order_data.get("id"),
+            "display_id": order_data.get("displayId"),
+            "order_type": order_data.get("orderType"),
+            "order_created_at": order_data.get("createdAt"),
+            "total": (order_data.get("total") or {}).get("orderAmount"),
+        }
+
+    def order_key(self, order_id: str) -> str:
+        # Os pedidos do iFood mantêm o ID nativo (linhas gravadas antes dos outros marketplaces)
+        return order_id
+
+    def native_order_id(self, order_key: str) -> str:
+        return order_key
+
+    def verify_webhook(self, body: bytes, headers: Mapping[str, str]) -> None:
+        verify_signature(body, headers.get("x-ifood-signature"))
+
+    def parse_webhook(self, body: bytes) -> List[Dict[str, Any]]:
+        parse_event(body)
+        return [load_event(body)]
@@ -0,0 +1,114 @@
+# app/platforms/ninety_nine.py
+"""
+Adaptador da 99Food (plataforma aberta da DiDi Food).
+
+- Autenticação por loja: FOOD99_APP_ID/FOOD99_APP_SECRET + o ID da loja (external_merchant_id)
+  geram um auth_token com validade; não há refresh token, a renovação autentica de novo.
+- As respostas vêm no envelope {errno, errmsg, data}; errno diferente de 0 é falha.
+- Webhook: HMAC-SHA256 (hex) do corpo com FOOD99_WEBHOOK_SECRET no cabeçalho
+  X-99Food-Signature; sem o segredo configurado não há verificação.
+
+URLs e formatos seguem a documentação pública da 99Food; valide no sandbox antes de ativar.
+"""
+import os
+import time
+from typing import Any, Dict, List, Mapping, Optional
+
+from ..ifood_http import ifood_request
+from ..webhook_intake import WebhookRejected, verify_signature, load_event
+from .base import PlatformAdapter, PlatformApiError, TokenGrant
+
+FOOD99_API_BASE_URL = os.getenv("FOOD99_API_BASE_URL", "https://openapi.didi-food.com")
+FOOD99_APP_ID = os.getenv("FOOD99_APP_ID", "")
+FOOD99_APP_SECRET = os.getenv("FOOD99_APP_SECRET", "")
+FOOD99_WEBHOOK_SECRET = os.getenv("FOOD99_WEBHOOK_SECRET", "")
+
+FOOD99_TOKEN_URL = f"{FOOD99_API_BASE_URL}/v1/auth/authtoken/get"
+FOOD99_ORDER_DETAIL_URL = f"{FOOD99_API_BASE_URL}/v1/order/order/detail"
+FOOD99_ORDER_CONFIRM_URL = f"{FOOD99_API_BASE_URL}/v1/order/order/confirm"
+
+# Tipos de evento da 99Food -> códigos do iFood usados pela máquina de estados
+FOOD99_EVENT_CODES = {
+    "orderNew": "ORDER_PLACED",
+    "orderConfirm": "ORDER_CONFIRMED",
+    "orderCancel": "ORDER_CANCELED",
+    "orderDelivering": "ORDER_DISPATCHED",
+    "orderFinish": "ORDER_CONCLUDED",
+}
+
+
+class NinetyNineAdapter(PlatformAdapter):
+    name = "99food"
+    env_prefix = "FOOD99"
+    uses_refresh_token = False
+    supports_client_credentials = True
+
+    def _unwrap(self, response_json: Dict[str, Any]) -> Dict[str, Any]:
+        if response_json.get("errno", 0) != 0:
+            raise PlatformApiError(self.name, response_json.get("errno"), response_json.get("errmsg", ""))
+        return response_json.get("data") or {}
+
+    async def authorize(self, external_merchant_id: str) -> TokenGrant:
+        response = await ifood_request(
+            "POST",
+            FOOD99_TOKEN_URL,
+            endpoint="token",
+            platform=self.name,
+            json={"app_id": FOOD99_APP_ID, "app_secret": FOOD99_APP_SECRET, "app_shop_id": external_merchant_id},
+        )
+        response.raise_for_status()
+        data = self._unwrap(response.json())
+        # A validade vem como instante (epoch, segundos)
+        expires_in = max(0, int(data.get("token_expiration_time", 0)) - int(time.time()))
+        return TokenGrant(data["auth_token"], "", expires_in)
+
+    async def refresh_token(self, record: Dict[str, Any]) -> TokenGrant:
+        return await self.authorize(record["external_merchant_id"])
+
+    async def fetch_order(self, access_token: str, order_id: str, merchant_key: Optional[str] = None) -> Dict[str, Any]:
+        response = await ifood_request(
+            "GET", FOOD99_ORDER_DETAIL_URL, endpoint="order_get", platform=self.name, merchant_key=merchant_key,
+            params={"auth_token": access_token, "order_id": order_id},
+        )
+        response.raise_for_status()
+        return self._unwrap(response.json())
+
+    async def confirm_order(self, access_token: str, order_id: str, merchant_key: Optional[str] = None) -> None:
+        response = await ifood_request(
+            "POST", FOOD99_ORDER_CONFIRM_URL, endpoint="order_action", platform=self.name, merchant_key=merchant_key,
+            json={"auth_token": access_token, "order_id": order_id},
+        )
+        response.raise_for_status()
+        self._unwrap(response.json())
+
+    def order_columns(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        order_id = order_data.get("order_id")
+        price = order_data.get("price") or {}
+        return {
+            "ifood_order_id": self.order_key(str(order_id)) if order_id is not None else None,
+            "display_id": order_data.get("order_index") or (str(order_id) if order_id is not None else None),
+            "order_type": order_data.get("delivery_type"),
+            "order_created_at": order_data.get("create_time"),
+            "total": price.get("order_price"),
+        }
+
+    def verify_webhook(self, body: bytes, headers: Mapping[str, str]) -> None:
+        verify_signature(body, headers.get("x-99food-signature"), secret=FOOD99_WEBHOOK_SECRET, header="X-99Food-Signature")
+
+    def parse_webhook(self, body: bytes) -> List[Dict[str, Any]]:
+        try:
+            event: Any = load_event(body)
+        except ValueError:
+            raise WebhookRejected(400, "malformed", "Corpo do webhook não é um JSON válido.")
+        data = event.get("data") if isinstance(event, dict) else None
+        if not isinstance(data, dict) or not isinstance(event.get("type"), str) or data.get("order_id") is None:
+            raise WebhookRejected(400, "malformed", "Webhook da 99Food sem 'type' ou 'data.order_id'.")
+
+        order_id = str(data["order_id"])
+        merchant_id = event.get("app_shop_id") or data.get("app_shop_id")
+        return [{
+            "id": self.order_key(order_id),
+            "code": FOOD99_EVENT_CODES.get(event["type"], event["type"]),
+            "correlationId": str(event.get("msg_id") or f"{event['type']}:{order_id}"),
+            "metadata": {"merchantId": str(merchant_id) if merchant_id is not None else None, "event": event["type"]},
+        }]
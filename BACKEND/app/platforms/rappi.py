@@ -0,0 +1,167 @@
+# app/platforms/rappi.py
+"""
+Adaptador da Rappi (API pública de integração de restaurantes, v2).
+
+- Autenticação por client credentials (RAPPI_CLIENT_ID/RAPPI_CLIENT_SECRET): um único token
+  vale para todas as lojas da aplicação, então fica em memória e é compartilhado pelos
+  registros de todas as lojas (uma renovação por expiração, não uma por loja).
+- O webhook NEW_ORDER já traz o pedido completo (vai em metadata["order"]); o GET do pedido
+  só é usado em reprocessamentos sem o corpo original.
+- Assinatura: cabeçalho Rappi-Signature "t=<timestamp>,sign=<HMAC-SHA256 de '<t>.<corpo>'>"
+  com RAPPI_WEBHOOK_SECRET; sem o segredo configurado não há verificação.
+
+URLs e formatos seguem a documentação pública da Rappi; valide no sandbox antes de ativar.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+from typing import Any, Dict, List, Mapping, Optional
+
+from ..ifood_http import ifood_request
+from ..webhook_intake import WebhookRejected, load_event
+from .base import PlatformAdapter, TokenGrant
+
+RAPPI_API_BASE_URL = os.getenv("RAPPI_API_BASE_URL", "https://microservices.dev.rappi.com")
+RAPPI_AUTH_URL = os.getenv("RAPPI_AUTH_URL", "https://rests-integrations-dev.auth0.com/oauth/token")
+RAPPI_AUTH_AUDIENCE = os.getenv("RAPPI_AUTH_AUDIENCE", "https://int-public-api-v2/api")
+RAPPI_CLIENT_ID = os.getenv("RAPPI_CLIENT_ID", "")
+RAPPI_CLIENT_SECRET = os.getenv("RAPPI_CLIENT_SECRET", "")
+RAPPI_WEBHOOK_SECRET = os.getenv("RAPPI_WEBHOOK_SECRET", "")
+# O token da aplicação é reaproveitado até faltar esta margem para vencer. Precisa ser maior
+# que as margens de renovação dos registros (token_refresher/warmup), senão a loja recebe um
+# token que já nasce "a renovar"
+RAPPI_TOKEN_REUSE_MARGIN_SECONDS = float(os.getenv("RAPPI_TOKEN_REUSE_MARGIN_SECONDS", "600"))
+# Tempo de preparo (minutos) informado ao aceitar o pedido
+RAPPI_COOKING_TIME_MINUTES = int(os.getenv("RAPPI_COOKING_TIME_MINUTES", "15"))
+
+RAPPI_ORDERS_URL = f"{RAPPI_API_BASE_URL}/api/v2/restaurants-integrations-public-api/orders"
+
+# Eventos da Rappi -> códigos do iFood usados pela máquina de estados
+RAPPI_EVENT_CODES = {
+    "NEW_ORDER": "ORDER_PLACED",
+    "ORDER_EVENT_CANCEL": "ORDER_CANCELED",
+    "ORDER_EVENT_READY_FOR_PICKUP": "ORDER_READY_TO_PICKUP",
+    "ORDER_EVENT_PICKED_UP": "ORDER_DISPATCHED",
+    "ORDER_EVENT_DELIVERED": "ORDER_CONCLUDED",
+}
+
+
+class RappiAdapter(PlatformAdapter):
+    name = "rappi"
+    env_prefix = "RAPPI"
+    uses_refresh_token = False
+    supports_client_credentials = True
+
+    def __init__(self):
+        self._access_token: Optional[str] = None
+        # Instante (monotônico) em que o token da aplicação vence
+        self._token_expires_at = 0.0
+        self._token_lock = asyncio.Lock()
+
+    async def _client_token(self) -> TokenGrant:
+        """
+        Token da aplicação, renovado uma vez para todas as lojas (single-flight). A validade
+        devolvida é a que resta ao token, não a original: a loja que renova com o token em
+        cache não o grava como válido por mais uma validade inteira.
+        """
+        async with self._token_lock:
+            remaining = self._token_expires_at - time.monotonic()
+            if self._access_token is not None and remaining > RAPPI_TOKEN_REUSE_MARGIN_SECONDS:
+                return TokenGrant(self._access_token, "", int(remaining))
+            response = await ifood_request(
+                "POST",
+                RAPPI_AUTH_URL,
+                endpoint="token",
+                platform=self.name,
+                json={
+                    "client_id": RAPPI_CLIENT_ID,
+                    "client_secret": RAPPI_CLIENT_SECRET,
+                    "audience": RAPPI_AUTH_AUDIENCE,
+                    "grant_type": "client_credentials",
+                },
+            )
+            response.raise_for_status()
+            tokens = response.json()
+            expires_in = int(tokens.get("expires_in", 3600))
+            self._access_token = tokens["access_token"]
+            self._token_expires_at = time.monotonic() + expires_in
+            return TokenGrant(self._access_token, "", expires_in)
+
+    async def authorize(self, external_merchant_id: str) -> TokenGrant:
+        return await self._client_token()
+
+    async def refresh_token(self, record: Dict[str, Any]) -> TokenGrant:
+        return await self._client_token()
+
+    def _headers(self, access_token: str) -> Dict[str, str]:
+        return {"accept": "application/json", "x-authorization": f"Bearer {access_token}"}
+
+    async def fetch_order(self, access_token: str, order_id: str, merchant_key: Optional[str] = None) -> Dict[str, Any]:
+        response = await ifood_request(
+            "GET", f"{RAPPI_ORDERS_URL}/{order_id}", endpoint="order_get", platform=self.name, merchant_key=merchant_key,
+            headers=self._headers(access_token),
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def confirm_order(self, access_token: str, order_id: str, merchant_key: Optional[str] = None) -> None:
+        # Aceitar = "take" com o tempo de preparo
+        response = await ifood_request(
+            "PUT", f"{RAPPI_ORDERS_URL}/{order_id}/take/{RAPPI_COOKING_TIME_MINUTES}",
+            endpoint="order_action", platform=self.name, merchant_key=merchant_key,
+            headers=self._headers(access_token),
+        )
+        response.raise_for_status()
+
+    def order_columns(self, order_data: Dict[str, Any]) -> Dict[str, Any]:
+        detail = order_data.get("order_detail") or {}
+        order_id = detail.get("order_id")
+        return {
+            "ifood_order_id": self.order_key(str(order_id)) if order_id is not None else None,
+            "display_id": str(order_id) if order_id is not None else None,
+            "order_type": detail.get("delivery_method"),
+            "order_created_at": detail.get("created_at"),
+            "total": (detail.get("totals") or {}).get("total_order"),
+        }
+
+    def verify_webhook(self, body: bytes, headers: Mapping[str, str]) -> None:
+        if not RAPPI_WEBHOOK_SECRET:
+            return
+        signature = headers.get("rappi-signature")
+        if not signature:
+            raise WebhookRejected(401, "missing_signature", "Webhook sem o cabeçalho Rappi-Signature.")
+        parts = dict(part.split("=", 1) for part in signature.split(",") if "=" in part)
+        signed = parts.get("t", "").encode() + b"." + body
+        expected = hmac.new(RAPPI_WEBHOOK_SECRET.encode(), signed, hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(expected, parts.get("sign", "").strip().lower()):
+            raise WebhookRejected(401, "invalid_signature", "Assinatura do webhook inválida.")
+
+    def parse_webhook(self, body: bytes) -> List[Dict[str, Any]]:
+        try:
+            event: Any = load_event(body)
+        except ValueError:
+            raise WebhookRejected(400, "malformed", "Corpo do webhook não é um JSON válido.")
+        if not isinstance(event, dict):
+            raise WebhookRejected(400, "malformed", "Webhook da Rappi não é um objeto JSON.")
+
+        # NEW_ORDER traz o pedido (order_detail + store); os demais eventos, order_id + store_id
+        detail = event.get("order_detail") if isinstance(event.get("order_detail"), dict) else {}
+        store = event.get("store") if isinstance(event.get("store"), dict) else {}
+        rappi_event = event.get("event") or ("NEW_ORDER" if detail else None)
+        order_id = detail.get("order_id") or event.get("order_id")
+        merchant_id = store.get("internal_id") or event.get("store_id")
+        if not rappi_event or order_id is None:
+            raise WebhookRejected(400, "malformed", "Webhook da Rappi sem evento ou order_id.")
+
+        metadata: Dict[str, Any] = {"merchantId": str(merchant_id) if merchant_id is not None else None, "event": rappi_event}
+        if detail:
+            metadata["order"] = event
+        return [{
+            "id": self.order_key(str(order_id)),
+            "code": RAPPI_EVENT_CODES.get(rappi_event, rappi_event),
+            # A Rappi não manda ID de evento: a reentrega do mesmo evento gera a mesma chave
+            "correlationId": f"{rappi_event}:{order_id}",
+            "metadata": metadata,
+        }]
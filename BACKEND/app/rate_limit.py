@@ -0,0 +1,102 @@
+# app/rate_limit.py
+"""
+Limitador de taxa (token bucket) para chamadas ao iFood.
+
+`acquire()` espera até haver uma ficha disponível; os que esperam são atendidos na ordem de
+chegada. Usado para que rajadas (ex.: status de uma rede inteira de lojas) não estourem o
+limite de requisições da API do iFood. Um bucket pode ser pausado (ex.: Retry-After de um
+429) e `KeyedRateLimiter` mantém um bucket por chave (por merchant).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos de espera."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, burst: float):
+        self.rate_per_second = rate_per_second
+        self.capacity = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if now > self._updated_at:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+            self._updated_at = now
+
+    def try_acquire(self) -> bool:
+        """Consome uma ficha se houver, sem esperar."""
+        if self.blocked_for > 0:
+            return False
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    async def acquire(self) -> None:
+        # O lock mantém a fila em ordem: só o primeiro da fila dorme esperando a próxima ficha
+        async with self._lock:
+            while not self.try_acquire():
+                await asyncio.sleep(self.blocked_for or (1 - self._tokens) / self.rate_per_second)
+
+    def pause(self, seconds: float) -> None:
+        """Nenhuma ficha é entregue pelos próximos `seconds` (ex.: Retry-After de um 429)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        # Recomeça vazio ao fim da pausa (a pausa não acumula fichas)
+        self._tokens = 0
+        self._updated_at = self._blocked_until
+
+    @property
+    def blocked_for(self) -> float:
+        return max(0.0, self._blocked_until - time.monotonic())
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+class KeyedRateLimiter:
+    """Um TokenBucket por chave, criado sob demanda; guarda no máximo `max_keys` (LRU)."""
+
+    def __init__(self, rate_per_second: float, burst: float, max_keys: int = 10000):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate_per_second, self.burst)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self) -> int:
+        return len(self._buckets)
@@ -0,0 +1,222 @@
+# app/report_routes.py
+"""
+Relatórios de pedidos por restaurante: volume por hora, taxa de cancelamento e latência de
+confirmação (lidos só dos agregados por hora, ver order_rollups.py) e exportação do
+histórico em CSV/Parquet por streaming (order_export.py).
+"""
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from .order_export import EXPORT_FORMATS, format_available, stream_orders
+from .order_rollups import hour_bucket
+from .order_state import ORDER_STATUS_CANCELLED, ORDER_STATUS_CONFIRMED, ORDER_STATUS_PENDING
+from .repositories import (
+    PedidosRepository,
+    PedidosRollupRepository,
+    get_pedidos_repository,
+    get_pedidos_rollup_repository,
+)
+from .routes import TESTE_RESTAURANTE_UUID
+
+REPORT_DEFAULT_RANGE_HOURS = int(os.getenv("REPORT_DEFAULT_RANGE_HOURS", "24"))
+# Limita a janela dos relatórios por hora (linhas de agregados lidas por requisição)
+REPORT_MAX_RANGE_DAYS = int(os.getenv("REPORT_MAX_RANGE_DAYS", "93"))
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["Relatórios"]
+)
+
+
+# -----------------------------------------------------------
+# MODELOS
+# -----------------------------------------------------------
+class OrderRollupTotals(BaseModel):
+    placed: int = 0
+    cancelled: int = 0
+    cancellation_rate: Optional[float] = None
+    avg_confirmation_seconds: Optional[float] = None
+    # Transições por status de destino (pending, confirmed, ..., cancelled)
+    transitions: Dict[str, int] = {}
+
+class OrderRollupBucket(OrderRollupTotals):
+    hour: str
+    plataforma: str
+
+class OrderHourlyReport(BaseModel):
+    restaurante_id: str
+    since: str
+    until: str
+    buckets: List[OrderRollupBucket]
+
+class OrderSummaryReport(OrderRollupTotals):
+    restaurante_id: str
+    since: str
+    until: str
+    by_platform: Dict[str, OrderRollupTotals]
+
+
+# -----------------------------------------------------------
+# AGREGAÇÃO DAS LINHAS DE ROLLUP
+# -----------------------------------------------------------
+class _Accumulator:
+    __slots__ = ("transitions", "confirmation_seconds", "confirmation_samples")
+
+    def __init__(self):
+        self.transitions: Dict[str, int] = defaultdict(int)
+        self.confirmation_seconds = 0.0
+        self.confirmation_samples = 0
+
+    def add(self, row: Dict) -> None:
+        self.transitions[row["status"]] += row.get("pedidos") or 0
+        if row["status"] == ORDER_STATUS_CONFIRMED:
+            self.confirmation_seconds += row.get("confirmacao_segundos_soma") or 0.0
+            self.confirmation_samples += row.get("confirmacao_amostras") or 0
+
+    def totals(self) -> Dict:
+        placed = self.transitions.get(ORDER_STATUS_PENDING, 0)
+        cancelled = self.transitions.get(ORDER_STATUS_CANCELLED, 0)
+        return {
+            "placed": placed,
+            "cancelled": cancelled,
+            "cancellation_rate": round(cancelled / placed, 4) if placed else None,
+            "avg_confirmation_seconds": (
+                round(self.confirmation_seconds / self.confirmation_samples, 3) if self.confirmation_samples else None
+            ),
+            "transitions": dict(self.transitions),
+        }
+
+
+def _report_range(since: Optional[datetime], until: Optional[datetime]) -> Tuple[str, str]:
+    """Janela [since, until) alinhada às horas; padrão: últimas REPORT_DEFAULT_RANGE_HOURS horas."""
+    until = until or datetime.now(timezone.utc) + timedelta(hours=1)
+    since = since or until - timedelta(hours=REPORT_DEFAULT_RANGE_HOURS + 1)
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="'since' precisa ser anterior a 'until'.")
+    if until - since > timedelta(days=REPORT_MAX_RANGE_DAYS):
+        raise HTTPException(status_code=400, detail=f"Janela máxima do relatório: {REPORT_MAX_RANGE_DAYS} dias.")
+    return hour_bucket(since), hour_bucket(until)
+
+
+async def _rollup_rows(
+    rollups: PedidosRollupRepository,
+    restaurante_id: str,
+    since_iso: str,
+    until_iso: str,
+    plataforma: Optional[str] = None,
+) -> List[Dict]:
+    try:
+        return await rollups.list_range(restaurante_id, since_iso, until_iso, plataforma)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao consultar os agregados de pedidos: {str(e)}"
+        )
+
+
+# -----------------------------------------------------------
+# /orders/hourly E /orders/summary (SÓ AGREGADOS)
+# -----------------------------------------------------------
+@router.get("/orders/hourly", response_model=OrderHourlyReport, summary="Pedidos por hora e plataforma: volume, cancelamentos e latência de confirmação")
+async def orders_hourly_report(
+    restaurante_id: str = Query(..., description=f"ID Mestre (UUID) do restaurante. Ex: {TESTE_RESTAURANTE_UUID}"),
+    since: Optional[datetime] = Query(None, description="Início da janela (ISO 8601, UTC se sem fuso)"),
+    until: Optional[datetime] = Query(None, description="Fim da janela (exclusivo)"),
+    plataforma: Optional[str] = Query(None, description="Filtra uma plataforma (ifood, rappi, 99food)"),
+    rollups: PedidosRollupRepository = Depends(get_pedidos_rollup_repository)
+):
+    """
+    Uma linha por (hora, plataforma) com atividade na janela. As contagens são de transições
+    na hora (ex.: um pedido recebido às 11h e cancelado às 12h conta em horas diferentes).
+    """
+    since_iso, until_iso = _report_range(since, until)
+    buckets: Dict[Tuple[str, str], _Accumulator] = defaultdict(_Accumulator)
+    for row in await _rollup_rows(rollups, restaurante_id, since_iso, until_iso, plataforma):
+        buckets[(hour_bucket(datetime.fromisoformat(row["hora"])), row["plataforma"])].add(row)
+
+    return OrderHourlyReport(
+        restaurante_id=restaurante_id,
+        since=since_iso,
+        until=until_iso,
+        buckets=[
+            OrderRollupBucket(hour=hour, plataforma=plataforma_name, **accumulator.totals())
+            for (hour, plataforma_name), accumulator in sorted(buckets.items())
+        ],
+    )
+
+
+@router.get("/orders/summary", response_model=OrderSummaryReport, summary="Totais da janela: volume, taxa de cancelamento e latência média de confirmação")
+async def orders_summary_report(
+    restaurante_id: str = Query(..., description=f"ID Mestre (UUID) do restaurante. Ex: {TESTE_RESTAURANTE_UUID}"),
+    since: Optional[datetime] = Query(None, description="Início da janela (ISO 8601, UTC se sem fuso)"),
+    until: Optional[datetime] = Query(None, description="Fim da janela (exclusivo)"),
+    rollups: PedidosRollupRepository = Depends(get_pedidos_rollup_repository)
+):
+    since_iso, until_iso = _report_range(since, until)
+    total = _Accumulator()
+    by_platform: Dict[str, _Accumulator] = defaultdict(_Accumulator)
+    for row in await _rollup_rows(rollups, restaurante_id, since_iso, until_iso):
+        total.add(row)
+        by_platform[row["plataforma"]].add(row)
+
+    return OrderSummaryReport(
+        restaurante_id=restaurante_id,
+        since=since_iso,
+        until=until_iso,
+        by_platform={name: OrderRollupTotals(**accumulator.totals()) for name, accumulator in sorted(by_platform.items())},
+        **total.totals(),
+    )
+
+
+# -----------------------------------------------------------
+# /orders/export (HISTÓRICO EM STREAMING)
+# -----------------------------------------------------------
+@router.get("/orders/export", summary="Exporta o histórico de pedidos em CSV ou Parquet (streaming, sem carregar tudo em memória)")
+async def export_orders(
+    restaurante_id: str = Query(..., description=f"ID Mestre (UUID) do restaurante. Ex: {TESTE_RESTAURANTE_UUID}"),
+    since: datetime = Query(..., description="Pedidos criados a partir de (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Pedidos criados antes de (padrão: agora)"),
+    export_format: str = Query("csv", alias="format", pattern="^(csv|parquet)$"),
+    pedidos: PedidosRepository = Depends(get_pedidos_repository)
+):
+    """
+    Colunas normalizadas da tabela pedidos (sem o payload JSONB), em ordem de gravação.
+    O arquivo é enviado em pedaços conforme as páginas são lidas do banco.
+    """
+    if not format_available(export_format):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"Formato {export_format} indisponível: instale o pacote opcional 'pyarrow'."
+        )
+    until = until or datetime.now(timezone.utc)
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="'since' precisa ser anterior a 'until'.")
+
+    try:
+        chunks = await stream_orders(pedidos, restaurante_id, since.isoformat(), until.isoformat(), export_format)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao ler os pedidos para exportação: {str(e)}"
+        )
+
+    filename = f"pedidos-{restaurante_id}-{since:%Y%m%d}-{until:%Y%m%d}.{export_format}"
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,359 @@
+# app/repositories.py
+"""
+Camada de acesso a dados assíncrona sobre o Supabase.
+
+O cliente oficial (supabase-py / postgrest) é síncrono: cada `.execute()` dentro de um
+handler `async def` trava o event loop durante toda a ida ao banco. Os repositórios abaixo
+executam as queries num pool de threads dedicado, de modo que a concorrência dos handlers
+acompanha o I/O em andamento em vez de serializar no loop.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
+
+from .metrics import registry
+from .supabase_client import close_client, get_client
+
+if TYPE_CHECKING:  # o supabase-py só é importado quando o cliente é criado (supabase_client.py)
+    from supabase import Client
+
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "16"))
+
+T = TypeVar("T")
+R = TypeVar("R", bound="BaseRepository")
+
+QUERY_SECONDS = registry.histogram(
+    "supabase_query_seconds",
+    "Latência das queries ao Supabase por tabela e operação.",
+    labelnames=("table", "operation"),
+)
+QUERY_ERRORS = registry.counter(
+    "supabase_query_errors_total",
+    "Queries ao Supabase que falharam, por tabela e operação.",
+    labelnames=("table", "operation"),
+)
+
+
+# Classes de SQLSTATE que não melhoram com nova tentativa: dados inválidos (22), violação de
+# restrição (23) e erro de sintaxe/permissão/objeto inexistente (42)
+PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+
+
+class RepositoryError(Exception):
+    """
+    Falha numa query ao Supabase (postgrest APIError, erro de rede, timeout). `retryable` diz se
+    vale tentar de novo: a fila de pedidos usa isso para não mandar uma falha transitória do
+    banco direto para a dead-letter.
+    """
+
+    def __init__(self, table: str, operation: str, cause: Exception):
+        code = getattr(cause, "code", None)
+        self.table = table
+        self.operation = operation
+        self.code = code
+        self.retryable = not (isinstance(code, str) and code[:2] in PERMANENT_SQLSTATE_CLASSES)
+        super().__init__(f"{table}.{operation}: {type(cause).__name__}: {cause}")
+
+
+class BaseRepository:
+    table_name: str = ""
+
+    def __init__(self, client: "Client", executor: ThreadPoolExecutor):
+        self._client = client
+        self._executor = executor
+
+    def _table(self):
+        return self._client.table(self.table_name)
+
+    async def _run(self, operation: str, fn: Callable[[], T]) -> T:
+        """Executa a chamada síncrona do postgrest no pool de threads, medindo a latência."""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, fn)
+        except Exception as e:
+            QUERY_ERRORS.inc(table=self.table_name, operation=operation)
+            raise RepositoryError(self.table_name, operation, e) from e
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - started, table=self.table_name, operation=operation)
+
+
+class IntegracoesRepository(BaseRepository):
+    """Acesso à tabela restaurante_integracoes."""
+    table_name = "restaurante_integracoes"
+
+    async def get(self, restaurante_id: str, plataforma: str, columns: str = "*") -> Optional[Dict[str, Any]]:
+        response = await self._run("select", lambda: self._table().select(columns).eq(
+            "restaurante_id", restaurante_id
+        ).eq("plataforma", plataforma).limit(1).execute())
+        return response.data[0] if response.data else None
+
+    async def get_many(self, restaurante_ids: List[str], plataforma: str) -> List[Dict[str, Any]]:
+        """Busca as integrações de vários restaurantes numa única query."""
+        if not restaurante_ids:
+            return []
+        response = await self._run("select", lambda: self._table().select("*").in_(
+            "restaurante_id", list(restaurante_ids)
+        ).eq("plataforma", plataforma).execute())
+        return response.data or []
+
+    async def get_by_user_code(self, user_code: str) -> Optional[Dict[str, Any]]:
+        response = await self._run("select", lambda: self._table().select("*").eq(
+            "user_code", user_code
+        ).limit(1).execute())
+        return response.data[0] if response.data else None
+
+    async def find_restaurante_id(self, external_merchant_id: str, plataforma: str) -> Optional[str]:
+        response = await self._run("select", lambda: self._table().select("restaurante_id").eq(
+            "external_merchant_id", external_merchant_id
+        ).eq("plataforma", plataforma).limit(1).execute())
+        return response.data[0]["restaurante_id"] if response.data else None
+
+    async def find_restaurante_ids(self, external_merchant_ids: List[str], plataforma: str) -> Dict[str, str]:
+        """Resolve vários merchants numa única query: {external_merchant_id: restaurante_id}."""
+        if not external_merchant_ids:
+            return {}
+        response = await self._run("select", lambda: self._table().select(
+            "restaurante_id, external_merchant_id"
+        ).in_("external_merchant_id", list(external_merchant_ids)).eq("plataforma", plataforma).execute())
+        return {row["external_merchant_id"]: row["restaurante_id"] for row in response.data or []}
+
+    async def list_authorized(self, plataforma: Optional[str] = None) -> List[Dict[str, Any]]:
+        def query():
+            builder = self._table().select("*").eq("is_authorized", True)
+            if plataforma:
+                builder = builder.eq("plataforma", plataforma)
+            return builder.execute()
+
+        response = await self._run("select", query)
+        return response.data or []
+
+    async def update(self, restaurante_id: str, plataforma: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        response = await self._run("update", lambda: self._table().update(data).eq(
+            "restaurante_id", restaurante_id
+        ).eq("plataforma", plataforma).execute())
+        return response.data or []
+
+    async def update_by_id(self, integration_id: Any, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        response = await self._run("update", lambda: self._table().update(data).eq(
+            "id", integration_id
+        ).execute())
+        return response.data or []
+
+    async def insert(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        response = await self._run("insert", lambda: self._table().insert(data).execute())
+        return response.data or []
+
+
+class WebhookEventosRepository(BaseRepository):
+    """Acesso à tabela webhook_eventos (chaves de eventos já recebidos, para deduplicação)."""
+    table_name = "webhook_eventos"
+
+    async def try_insert(self, row: Dict[str, Any]) -> bool:
+        """Grava a chave do evento; retorna False se ela já existia (evento duplicado)."""
+        response = await self._run("upsert", lambda: self._table().upsert(
+            row, on_conflict="event_key", ignore_duplicates=True
+        ).execute())
+        return bool(response.data)
+
+    async def try_insert_many(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """Grava várias chaves num único upsert; retorna as chaves que eram inéditas."""
+        if not rows:
+            return []
+        response = await self._run("upsert", lambda: self._table().upsert(
+            rows, on_conflict="event_key", ignore_duplicates=True
+        ).execute())
+        return [row["event_key"] for row in response.data or []]
+
+    async def delete(self, event_key: str) -> None:
+        await self._run("delete", lambda: self._table().delete().eq("event_key", event_key).execute())
+
+    async def delete_older_than(self, cutoff_iso: str) -> None:
+        await self._run("delete", lambda: self._table().delete().lt("received_at", cutoff_iso).execute())
+
+
+class PedidosRepository(BaseRepository):
+    """Acesso à tabela pedidos (pedidos recebidos das plataformas)."""
+    table_name = "pedidos"
+    # Colunas normalizadas (sql/003): o suficiente para as listas do monitor, sem o JSONB
+    summary_columns = "ifood_order_id, plataforma, status, display_id, order_type, order_created_at, total, updated_at"
+
+    async def upsert_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Grava (ou atualiza) vários pedidos num único comando, chaveado pelo ID do pedido no iFood."""
+        if not rows:
+            return []
+        response = await self._run("upsert", lambda: self._table().upsert(
+            rows, on_conflict="ifood_order_id"
+        ).execute())
+        return response.data or []
+
+    async def list_recent(
+        self,
+        restaurante_id: str,
+        status: Optional[str] = None,
+        limit: int = 50,
+        include_payload: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Pedidos mais recentes do restaurante (opcionalmente de um status), pelos índices da 003."""
+        columns = "*" if include_payload else self.summary_columns
+
+        def query():
+            builder = self._table().select(columns).eq("restaurante_id", restaurante_id)
+            if status:
+                builder = builder.eq("status", status)
+            return builder.order("order_created_at", desc=True).limit(limit).execute()
+
+        response = await self._run("select", query)
+        return response.data or []
+
+    async def list_active(self, statuses: Sequence[str], since_iso: str, limit: int = 10000) -> List[Dict[str, Any]]:
+        """Pedidos em andamento criados desde `since_iso` (aquecimento da máquina de estados)."""
+        response = await self._run("select", lambda: self._table().select(
+            "restaurante_id, ifood_order_id, status"
+        ).in_("status", list(statuses)).gte("order_created_at", since_iso).limit(limit).execute())
+        return response.data or []
+
+    async def export_page(
+        self,
+        restaurante_id: str,
+        since_iso: str,
+        until_iso: str,
+        after_id: int = 0,
+        limit: int = 1000,
+    ) -> List[Dict[str, Any]]:
+        """
+        Uma página do histórico do restaurante (pedidos criados em [since, until)), pela chave
+        `id` (índice da 006): cada página custa o mesmo, sem OFFSET.
+        """
+        response = await self._run("select", lambda: self._table().select(
+            f"id, {self.summary_columns}"
+        ).eq("restaurante_id", restaurante_id).gt("id", after_id).gte(
+            "order_created_at", since_iso
+        ).lt("order_created_at", until_iso).order("id").limit(limit).execute())
+        return response.data or []
+
+
+class PedidosRollupRepository(BaseRepository):
+    """Acesso à tabela pedidos_rollup_hora (agregados por hora, ver app/order_rollups.py)."""
+    table_name = "pedidos_rollup_hora"
+    increment_function = "incrementar_pedidos_rollup"
+
+    async def increment(self, batch_id: str, rows: List[Dict[str, Any]]) -> None:
+        """
+        Soma os incrementos às linhas existentes (função SQL da 006, um único comando). Um
+        batch_id já aplicado é ignorado: reenviar o mesmo lote depois de um erro é seguro.
+        """
+        if not rows:
+            return
+        params = {"lote_id": batch_id, "linhas": rows}
+        await self._run("rpc", lambda: self._client.rpc(self.increment_function, params).execute())
+
+    async def list_range(
+        self,
+        restaurante_id: str,
+        since_iso: str,
+        until_iso: str,
+        plataforma: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Linhas do restaurante com hora em [since, until), em ordem de hora."""
+        def query():
+            builder = self._table().select(
+                "plataforma, hora, status, pedidos, confirmacao_segundos_soma, confirmacao_amostras"
+            ).eq("restaurante_id", restaurante_id).gte("hora", since_iso).lt("hora", until_iso)
+            if plataforma:
+                builder = builder.eq("plataforma", plataforma)
+            return builder.order("hora").execute()
+
+        response = await self._run("select", query)
+        return response.data or []
+
+
+class CardapioItensRepository(BaseRepository):
+    """Acesso à tabela cardapio_itens (cardápio normalizado, ver app/menu_store.py)."""
+    table_name = "cardapio_itens"
+    columns = "item_id, name, category, status, price"
+
+    async def list_items(self, restaurante_id: str, plataforma: str) -> List[Dict[str, Any]]:
+        """Todos os itens do cardápio do restaurante (snapshot para o diff da sincronização)."""
+        response = await self._run("select", lambda: self._table().select(self.columns).eq(
+            "restaurante_id", restaurante_id
+        ).eq("plataforma", plataforma).execute())
+        return response.data or []
+
+    async def upsert_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Grava (ou atualiza) os itens alterados num único comando, chaveado por item_key."""
+        if not rows:
+            return []
+        response = await self._run("upsert", lambda: self._table().upsert(
+            rows, on_conflict="item_key"
+        ).execute())
+        return response.data or []
+
+    async def delete_many(self, item_keys: List[str]) -> None:
+        """Apaga os itens que saíram do cardápio num único comando."""
+        if not item_keys:
+            return
+        await self._run("delete", lambda: self._table().delete().in_("item_key", list(item_keys)).execute())
+
+
+# -----------------------------------------------------------
+# CICLO DE VIDA (um único cliente + pool de threads por processo)
+# -----------------------------------------------------------
+REPOSITORY_CLASSES: Tuple[Type[BaseRepository], ...] = (
+    IntegracoesRepository,
+    WebhookEventosRepository,
+    PedidosRepository,
+    CardapioItensRepository,
+    PedidosRollupRepository,
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_repositories: Dict[Type[BaseRepository], BaseRepository] = {}
+
+
+def init_repositories(client: Optional["Client"] = None) -> None:
+    """Cria o pool de threads e os repositórios. Chamado no startup (lifespan) da aplicação."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_WORKERS, thread_name_prefix="supabase")
+    client = client or get_client()
+    for repository_class in REPOSITORY_CLASSES:
+        _repositories[repository_class] = repository_class(client, _executor)
+
+
+def close_repositories() -> None:
+    global _executor
+    _repositories.clear()
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+    close_client()
+
+
+def _get_repository(repository_class: Type[R]) -> R:
+    # Fallback para uso fora do lifespan (scripts, shell): inicializa sob demanda.
+    if repository_class not in _repositories:
+        init_repositories()
+    return _repositories[repository_class]
+
+
+def get_integracoes_repository() -> IntegracoesRepository:
+    return _get_repository(IntegracoesRepository)
+
+
+def get_webhook_eventos_repository() -> WebhookEventosRepository:
+    return _get_repository(WebhookEventosRepository)
+
+
+def get_pedidos_repository() -> PedidosRepository:
+    return _get_repository(PedidosRepository)
+
+
+def get_cardapio_itens_repository() -> CardapioItensRepository:
+    return _get_repository(CardapioItensRepository)
+
+
+def get_pedidos_rollup_repository() -> PedidosRollupRepository:
+    return _get_repository(PedidosRollupRepository)
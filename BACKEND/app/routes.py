@@ -1,23 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
-from pydantic import BaseModel
-from supabase import Client
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Header
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+import asyncio
+import logging
+import time
 import httpx
-from typing import Any, Dict, List
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timedelta, timezone
 
-# Importação do cliente Supabase.
-from .supabase_client import get_client 
+# Camada de acesso a dados (Supabase, assíncrona)
+from .repositories import (
+    CardapioItensRepository,
+    IntegracoesRepository,
+    PedidosRepository,
+    get_cardapio_itens_repository,
+    get_integracoes_repository,
+    get_pedidos_repository,
+)
+from .circuit_breaker import CircuitOpenError
+from .ifood_http import ifood_request
+from .token_cache import token_cache, token_expiration, CACHE_REQUESTS, TOKEN_REFRESHES
+from .shared_state import LockUnavailable, get_state_backend
+from .token_refresher import get_token_refresher
+from .merchant_index import merchant_index
+from .menu_cache import menu_cache, MenuEntry, MENU_REQUESTS
+from .menu_store import menu_store, MenuSnapshot, LOOKUPS as MENU_STORE_LOOKUPS, MENU_STORE_MAX_RESULTS
+from .status_cache import merchant_status_cache
+from .order_writer import OrderWriter, get_order_writer, order_row
+from .order_state import ORDER_STATUS_CONFIRMED, order_state
+from .rate_limit import TokenBucket
+from .order_events import order_event_broker, ORDER_STREAM_HEARTBEAT_SECONDS
+from .order_queue import OrderQueue, get_order_queue
+from .webhook_dedup import WebhookDeduplicator, get_webhook_deduplicator, event_key
+from .webhook_intake import WebhookRejected, decode_body, verify_signature, parse_event, parse_batch, load_event, observe_ack
+from .tracing import bind, stage
+from .platforms import PlatformAdapter, get_platform, ifood, uses_refresh_token
+from .platforms.ifood import IFOOD_DEVICE_CODE_URL, IFOOD_MERCHANT_BASE_URL
+
+logger = logging.getLogger(__name__)
 
-# URLs da API do iFood
-IFOOD_DEVICE_CODE_URL = "https://merchant-api.ifood.com.br/authentication/v1.0/oauth/userCode"
-IFOOD_TOKEN_URL = "https://merchant-api.ifood.com.br/authentication/v1.0/oauth/token"
-IFOOD_MERCHANT_BASE_URL = "https://merchant-api.ifood.com.br/merchant/v1.0"
-IFOOD_ORDER_BASE_URL = f"{IFOOD_MERCHANT_BASE_URL}/orders/v1.0" # Nova URL Base para Pedidos
+# URLs da API do iFood (autenticação e pedidos ficam no adaptador: app/platforms/ifood.py)
 IFOOD_MENU_URL_SUFFIX = "/merchants/v1/menus" # URL de exemplo para o menu
 
-# IDs FIXOS da sua aplicação
-IFOOD_CLIENT_ID = "0b5c7a22-b607-4a3a-ae75-b32881ebc3ef" 
-PLATFORM_NAME = "ifood" 
+# Plataforma destas rotas (os outros marketplaces entram por app/platform_routes.py)
+PLATFORM_NAME = ifood.name
+
+# Máximo de GETs/confirmações simultâneos ao processar um lote de pedidos do mesmo restaurante
+ORDER_BATCH_CONCURRENCY = 10
+# Pedidos por job de lote: 2 chamadas por pedido a 10/s por merchant dá ~10s por job, bem
+# abaixo do lease da fila (ORDER_QUEUE_LEASE_SECONDS) mesmo com pausas de Retry-After
+ORDER_BATCH_MAX_ORDERS = 50
+
+# Consulta de status em lote (redes com muitas lojas): chamadas simultâneas, taxa e tamanho do lote
+MERCHANT_STATUS_BULK_CONCURRENCY = 10
+MERCHANT_STATUS_BULK_RATE_PER_SECOND = 20
+MERCHANT_STATUS_BULK_MAX_IDS = 200
+
+# Margem (segundos) antes da expiração em que o token já é considerado vencido e renovado
+TOKEN_REFRESH_MARGIN_SECONDS = 30
 
 # UUID de teste fornecido pelo usuário, que DEVE existir na tabela 'restaurantes'
 TESTE_RESTAURANTE_UUID = "27f6bb79-e566-4534-8c88-b2e3d3f32ff5" 
@@ -40,17 +81,48 @@ class IntegrationIdentifierRequest(BaseModel):
 class IfoodMerchantStatusResponse(BaseModel):
     status: str 
 
+class MerchantStatusBulkRequest(BaseModel):
+    restaurante_ids: List[str] = Field(..., min_length=1, max_length=MERCHANT_STATUS_BULK_MAX_IDS)
+
+class MerchantStatusBulkItem(BaseModel):
+    restaurante_id: str
+    ok: bool
+    status: Optional[IfoodMerchantStatusResponse] = None
+    error: Optional[str] = None
+    error_status_code: Optional[int] = None
+    elapsed_ms: float
+
+class MerchantStatusBulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    elapsed_ms: float
+    results: List[MerchantStatusBulkItem]
+
 # Novo modelo para demonstrar a resposta da API de Menu (Simplificado)
 class IfoodMenuItem(BaseModel):
     itemId: str
     name: str
     price: float
     status: str
+    category: Optional[str] = None
     
 class IfoodMenuResponse(BaseModel):
     merchantId: str
     categories: List[str]
     items: List[IfoodMenuItem]
+
+class MenuItemsResponse(BaseModel):
+    restaurante_id: str
+    count: int
+    items: List[IfoodMenuItem]
+
+class MenuSyncResponse(BaseModel):
+    restaurante_id: str
+    added: int
+    updated: int
+    removed: int
+    unchanged: int
+    skipped: bool
     
 
 class IfoodWebhookPayload(BaseModel):
@@ -88,179 +160,435 @@ router = APIRouter(
 
 async def _call_token_api(data: Dict[str, str], grant_type: str) -> IfoodTokenResponse:
     """Função centralizada para fazer chamadas ao endpoint /oauth/token (Troca/Renovação)."""
-    data["clientId"] = IFOOD_CLIENT_ID
-    data["grantType"] = grant_type
-    
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.post(
-            IFOOD_TOKEN_URL,
-            headers={"accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"},
-            data=data
-        )
-        response.raise_for_status()
-        return IfoodTokenResponse(**response.json())
+    return IfoodTokenResponse(**await ifood.request_token(data, grant_type))
 
 async def get_valid_integration_record(
     restaurante_id: str, 
     plataforma: str,
-    supabase: Client
+    integracoes: IntegracoesRepository,
+    refresh_margin_seconds: float = TOKEN_REFRESH_MARGIN_SECONDS
 ) -> Dict[str, Any]:
     """
     Busca o registro de integração (restaurante_integracoes), checa a validade e renova se necessário.
     Retorna o registro (com tokens atualizados) ou falha.
+
+    O registro fica em cache em memória até perto da expiração do token. Se várias requisições
+    do mesmo restaurante chegarem com o token vencendo, apenas uma renova; as demais aguardam
+    o lock e reaproveitam o resultado (o refresh token do iFood é rotacionado a cada uso).
+    A renovação em si é do adaptador da plataforma (app/platforms).
     """
-    
-    # 1. BUSCAR REGISTRO
-    fetch_response = supabase.table("restaurante_integracoes").select("*").eq(
-        "restaurante_id", restaurante_id
-    ).eq("plataforma", plataforma).limit(1).execute()
-    
-    if not fetch_response.data:
-        raise HTTPException(status_code=404, detail=f"Integração com {plataforma} não encontrada para o restaurante ID.")
+    adapter = get_platform(plataforma)
+    cache_key = (restaurante_id, plataforma)
 
-    record = fetch_response.data[0]
-    access_token = record.get("access_token")
-    refresh_token = record.get("refresh_token")
-    created_at_iso = record.get("created_at") 
-    
-    if not record.get("is_authorized") or not access_token or not refresh_token:
-        raise HTTPException(status_code=401, detail="Integração não autorizada ou tokens ausentes. Reautorização necessária.")
+    # 0. CACHE EM MEMÓRIA (caminho quente: nenhuma ida ao Supabase)
+    cached_record = token_cache.get(cache_key, refresh_margin_seconds)
+    if cached_record is not None:
+        CACHE_REQUESTS.inc(result="hit")
+        return cached_record
 
-    # 2. CHECAR EXPIRAÇÃO
-    try:
-        # Pega a data da última atualização do token.
-        token_created_time = datetime.fromisoformat(created_at_iso.replace('Z', '+00:00'))
-    except ValueError:
-         token_created_time = datetime.now(timezone.utc) 
-        
-    expires_in_seconds = record.get("token_expires_in", 600)
-    expiration_time = token_created_time + timedelta(seconds=expires_in_seconds)
-    
-    # Renovação com margem de 30 segundos
-    if expiration_time < datetime.now(timezone.utc) + timedelta(seconds=30):
-        # 3. RENOVAR SE EXPIRADO
+    async with token_cache.lock(cache_key):
+        # Outra requisição pode ter renovado enquanto esperávamos o lock
+        cached_record = token_cache.get(cache_key, refresh_margin_seconds)
+        if cached_record is not None:
+            CACHE_REQUESTS.inc(result="coalesced")
+            return cached_record
+
+        # Entre processos (workers/réplicas): só um renova; os demais leem o registro
+        # que ele deixou no backend compartilhado. Sem o lock, não renova
         try:
-            print(f"Token para restaurante {restaurante_id} no {plataforma} expirado ou prestes a expirar. Renovando...")
-            
-            # Chama a API do iFood para renovação
-            new_tokens = await _call_token_api(
-                data={"refreshToken": refresh_token},
-                grant_type="refreshToken"
-            )
-            
-            # 4. ATUALIZAR BANCO COM NOVOS TOKENS
-            update_data = {
-                "access_token": new_tokens.accessToken,
-                "refresh_token": new_tokens.refreshToken,
-                "token_expires_in": new_tokens.expiresIn,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            update_response = supabase.table("restaurante_integracoes").update(update_data).eq(
-                "restaurante_id", restaurante_id
-            ).eq("plataforma", plataforma).execute()
-            
-            if not update_response.data:
-                 raise Exception("Falha na atualização do token renovado no Supabase.")
-
-            # Retorna o registro atualizado
-            record.update(update_data) 
-            
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Falha na renovação do token de {plataforma}. Reautorização necessária: {str(e)}"
-            )
+            async with get_state_backend().lock(f"token:{restaurante_id}:{plataforma}"):
+                shared_record = await token_cache.get_shared(cache_key, refresh_margin_seconds)
+                if shared_record is not None:
+                    CACHE_REQUESTS.inc(result="shared_hit")
+                    return shared_record
+
+                CACHE_REQUESTS.inc(result="miss")
+
+                # 1. BUSCAR REGISTRO
+                record = await integracoes.get(restaurante_id, plataforma)
+        
+                if not record:
+                    raise HTTPException(status_code=404, detail=f"Integração com {plataforma} não encontrada para o restaurante ID.")
+
+                access_token = record.get("access_token")
+                refresh_token = record.get("refresh_token")
+        
+                if not record.get("is_authorized") or not access_token or (adapter.uses_refresh_token and not refresh_token):
+                    raise HTTPException(status_code=401, detail="Integração não autorizada ou tokens ausentes. Reautorização necessária.")
+
+                # 2. CHECAR EXPIRAÇÃO
+                expiration_time = token_expiration(record)
+        
+                # Renovação com margem de segurança (padrão: 30 segundos)
+                if expiration_time < datetime.now(timezone.utc) + timedelta(seconds=refresh_margin_seconds):
+                    # 3. RENOVAR SE EXPIRADO
+                    try:
+                        logger.info("Token expirado ou prestes a expirar; renovando", extra={"restaurante_id": restaurante_id, "plataforma": plataforma})
+
+                        with stage("token_refresh"):
+                            # Chama a API da plataforma para renovação
+                            new_tokens = await adapter.refresh_token(record)
+
+                            # 4. ATUALIZAR BANCO COM NOVOS TOKENS
+                            update_data = {
+                                **new_tokens.as_record(),
+                                "created_at": datetime.now(timezone.utc).isoformat()
+                            }
+                            if not adapter.uses_refresh_token:
+                                del update_data["refresh_token"]
+
+                            updated_rows = await integracoes.update(restaurante_id, plataforma, update_data)
+
+                            if not updated_rows:
+                                raise Exception("Falha na atualização do token renovado no Supabase.")
+
+                        # Retorna o registro atualizado
+                        record.update(update_data) 
+                        TOKEN_REFRESHES.inc(result="success")
+                
+                    except Exception as e:
+                        TOKEN_REFRESHES.inc(result="failure")
+                        raise HTTPException(
+                            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            detail=f"Falha na renovação do token de {plataforma}. Reautorização necessária: {str(e)}"
+                        )
+
+                await token_cache.put_shared(cache_key, record)
+        except LockUnavailable as e:
+            # Outra réplica pode estar renovando (ou o backend caiu): quem chamou tenta de novo
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Renovação do token de {plataforma} indisponível: {e}")
 
     # 5. RETORNA O REGISTRO COMPLETO E VÁLIDO
-    return record
+    return dict(record)
+
+
+async def refresh_integration_tokens(
+    restaurante_id: str,
+    plataforma: str,
+    refresh_margin_seconds: float
+) -> Dict[str, Any]:
+    """Usada pelo TokenRefresher: renova o token se ele expira dentro da margem informada."""
+    return await get_valid_integration_record(
+        restaurante_id, plataforma, get_integracoes_repository(), refresh_margin_seconds=refresh_margin_seconds
+    )
+
 
+async def list_authorized_integrations() -> List[Dict[str, Any]]:
+    """Usada pelo TokenRefresher: todos os registros autorizados de restaurante_integracoes."""
+    return await get_integracoes_repository().list_authorized()
 
-async def _call_ifood_order_action(access_token: str, order_id: str, action: str):
+
+async def _persist_orders(
+    restaurante_id_mestre: str,
+    orders: List[Dict[str, Any]],
+    order_writer: OrderWriter,
+    plataforma: str = PLATFORM_NAME
+) -> None:
     """
-    Executa ações na API de Pedidos do iFood (Ex: Confirmação, Rejeição, etc.).
-    Ação deve ser 'confirm' ou 'cancel'.
+    Grava os pedidos na tabela 'pedidos' (colunas normalizadas + payload completo) pelo buffer
+    em lote; retorna só depois que o upsert do lote foi concluído. O status é gravado à parte,
+    pela máquina de estados (order_state.py).
     """
-    
-    # Mapeia a ação para o sufixo da URL do iFood
-    # iFood usa POST /orders/{orderId}/confirm ou /orders/{orderId}/cancel
-    action_url_suffix = action.lower() 
-    
-    order_action_url = f"{IFOOD_ORDER_BASE_URL}/orders/{order_id}/{action_url_suffix}"
-
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        # A confirmação/cancelamento é geralmente um POST sem corpo (body)
-        response = await client.post(
-            order_action_url,
-            headers={
-                "accept": "application/json",
-                "Authorization": f"Bearer {access_token}"
-            }
-        )
-        # O iFood retorna 202 Accepted em caso de sucesso
-        response.raise_for_status() 
-        return response
+    await order_writer.write([
+        order_row(restaurante_id_mestre, plataforma, order_data)
+        for order_data in orders
+    ])
+
+
+def _publish_order_event(restaurante_id_mestre: str, payload: IfoodWebhookPayload, plataforma: str = PLATFORM_NAME) -> None:
+    """Avisa os dashboards conectados (stream SSE) que um evento novo chegou da plataforma."""
+    order_event_broker.publish(restaurante_id_mestre, "order_event", {
+        "plataforma": plataforma,
+        "code": payload.code,
+        "order_id": payload.id,
+        "correlation_id": payload.correlationId,
+    })
+
+
+def publish_order_transition(restaurante_id_mestre: str, order_id: str, previous_status: Optional[str], new_status: str) -> None:
+    """Listener da máquina de estados: avisa os dashboards da mudança de status (stream SSE)."""
+    order_event_broker.publish(restaurante_id_mestre, "order_status", {
+        "order_id": order_id,
+        "previous_status": previous_status,
+        "status": new_status,
+    })
+
+
+def _publish_order_confirmed(restaurante_id_mestre: str, order_data: Dict[str, Any], adapter: PlatformAdapter = ifood) -> None:
+    """Avisa os dashboards que o pedido foi gravado e confirmado (resumo, não o pedido inteiro)."""
+    columns = adapter.order_columns(order_data)
+    order_event_broker.publish(restaurante_id_mestre, "order_confirmed", {
+        "plataforma": adapter.name,
+        "order_id": columns["ifood_order_id"],
+        "display_id": columns["display_id"],
+        "order_type": columns["order_type"],
+        "created_at": columns["order_created_at"],
+        "total": columns["total"],
+    })
+
+
+async def _fetch_order(adapter: PlatformAdapter, access_token: str, payload: IfoodWebhookPayload, restaurante_id: str) -> Dict[str, Any]:
+    """Pedido completo: o que veio no próprio evento (Rappi) ou o GET na API da plataforma."""
+    order_data = payload.metadata.get("order")
+    if order_data is not None:
+        return order_data
+    return await adapter.fetch_order(access_token, adapter.native_order_id(payload.id), restaurante_id)
 
 
 async def _handle_order_placed_webhook(
     restaurante_id_mestre: str, 
     webhook_payload: IfoodWebhookPayload, 
-    supabase: Client
+    integracoes: IntegracoesRepository,
+    order_writer: OrderWriter,
+    plataforma: str = PLATFORM_NAME
 ):
     """
     Lógica de processamento pesado para o evento ORDER_PLACED. 
-    Esta função deve ser executada em BackgroundTasks.
+    Executada pelos workers da fila durável (order_queue): os erros são logados e relançados
+    para que a fila decida entre nova tentativa (com backoff) e dead-letter.
     """
-    order_id = webhook_payload.id # O ID do pedido no iFood (ID do evento é o ID do pedido neste caso)
+    adapter = get_platform(plataforma)
+    order_id = webhook_payload.id # Chave do pedido (ID do evento é o ID do pedido neste caso)
+
+    # Job repetido (nova tentativa, lease reassumido): o pedido já foi confirmado ou encerrado
+    if order_state.reached(restaurante_id_mestre, order_id, ORDER_STATUS_CONFIRMED):
+        logger.info("Pedido já confirmado; job ignorado")
+        return
 
     try:
         # 1. Obter registro de integração (garante token válido, renova se preciso)
-        integration_record = await get_valid_integration_record(
-            restaurante_id_mestre, PLATFORM_NAME, supabase
-        )
+        with stage("token"):
+            integration_record = await get_valid_integration_record(
+                restaurante_id_mestre, plataforma, integracoes
+            )
         access_token = integration_record.get("access_token")
-        
+
         # 2. BUSCAR DETALHES COMPLETOS DO PEDIDO (GET /orders/{orderId})
-        get_order_url = f"{IFOOD_ORDER_BASE_URL}/orders/{order_id}"
-        
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            order_details_response = await client.get(
-                get_order_url,
-                headers={
-                    "accept": "application/json",
-                    "Authorization": f"Bearer {access_token}"
-                }
-            )
-            order_details_response.raise_for_status()
-            
-            order_data = order_details_response.json()
-            print(f"✅ DETALHES DO PEDIDO {order_id} BUSCADOS COM SUCESSO. Preparando para confirmar...")
-            
-            # --------------------------------------------------------------------------------
-            # >>> LÓGICA CHAVE: INSERIR `order_data` NO SEU SISTEMA (ERP, Banco de dados, etc.)
-            # Você deve usar o `restaurante_id_mestre` para associar este pedido ao seu cliente interno.
-            # Exemplo (NÃO IMPLEMENTADO): supabase.table("pedidos").insert({"restaurante_id": restaurante_id_mestre, "ifood_order_id": order_id, "data": order_data, ...}).execute()
-            # --------------------------------------------------------------------------------
-            
-            
-        # 3. CONFIRMAR O PEDIDO (POST /orders/{orderId}/confirm)
-        # Após salvar o pedido no seu sistema, confirme com o iFood.
-        await _call_ifood_order_action(access_token, order_id, "confirm")
-        print(f"✅ PEDIDO {order_id} CONFIRMADO COM SUCESSO no iFood. Pronto para produção.")
-
-        # --------------------------------------------------------------------------------
-        # >>> AQUI: Atualizar o status do pedido no seu banco para 'Confirmado'
-        # --------------------------------------------------------------------------------
+        with stage("order_get"):
+            order_data = await _fetch_order(adapter, access_token, webhook_payload, restaurante_id_mestre)
+        logger.info("Detalhes do pedido buscados; confirmando")
+
+        # 3. INSERIR `order_data` NO SEU SISTEMA, associado ao `restaurante_id_mestre`
+        with stage("persist"):
+            await _persist_orders(restaurante_id_mestre, [order_data], order_writer, plataforma)
+
+        # 4. CONFIRMAR O PEDIDO (POST /orders/{orderId}/confirm)
+        # Após salvar o pedido no seu sistema, confirme com a plataforma.
+        with stage("confirm"):
+            await adapter.confirm_order(access_token, adapter.native_order_id(order_id), restaurante_id_mestre)
+        logger.info("Pedido confirmado na plataforma")
+        _publish_order_confirmed(restaurante_id_mestre, order_data, adapter)
+
+        # 5. ATUALIZAR O STATUS DO PEDIDO PARA 'confirmed' (máquina de estados grava em lote)
+        order_state.apply(restaurante_id_mestre, order_id, "ORDER_CONFIRMED")
 
     except HTTPException as e:
-        print(f"❌ ERRO HTTP (WEBHOOK - Background): {e.detail}")
-        # Logar erro e notificar
+        logger.error("Erro ao processar pedido", extra={"status_code": e.status_code, "error": e.detail})
+        raise
     except httpx.HTTPStatusError as e:
-        print(f"❌ ERRO API IFOOD (Status {e.response.status_code}): Falha ao buscar ou confirmar pedido {order_id}. Erro: {e.response.text}")
-        # Logar erro para retentativa
-    except Exception as e:
-        print(f"❌ ERRO INESPERADO no processamento do webhook: {str(e)}")
-        # Logar erro fatal
+        logger.error("Erro da API da plataforma ao buscar ou confirmar pedido", extra={"status_code": e.response.status_code, "error": e.response.text})
+        raise
+    except Exception:
+        logger.exception("Erro inesperado no processamento do pedido")
+        raise
+
+
+async def _handle_order_placed_batch(
+    restaurante_id_mestre: str,
+    webhook_payloads: List[IfoodWebhookPayload],
+    integracoes: IntegracoesRepository,
+    order_writer: OrderWriter,
+    order_queue: OrderQueue,
+    plataforma: str = PLATFORM_NAME
+):
+    """
+    Processa um lote de ORDER_PLACED do mesmo restaurante: um único token, GETs concorrentes,
+    UM upsert em lote na tabela 'pedidos' e confirmações concorrentes. Pedidos que falharem
+    individualmente voltam para a fila como jobs unitários (com as regras de retry da fila).
+    Pedidos já confirmados (lote repetido depois de uma falha parcial) são pulados.
+    """
+    adapter = get_platform(plataforma)
+    webhook_payloads = [
+        p for p in webhook_payloads
+        if not order_state.reached(restaurante_id_mestre, p.id, ORDER_STATUS_CONFIRMED)
+    ]
+    if not webhook_payloads:
+        return
+
+    # 1. Um único registro/token para todo o lote (falha aqui = retry do lote inteiro)
+    with stage("token"):
+        integration_record = await get_valid_integration_record(
+            restaurante_id_mestre, plataforma, integracoes
+        )
+    access_token = integration_record.get("access_token")
+    semaphore = asyncio.Semaphore(ORDER_BATCH_CONCURRENCY)
+
+    async def fetch(payload: IfoodWebhookPayload) -> Dict[str, Any]:
+        async with semaphore:
+            return await _fetch_order(adapter, access_token, payload, restaurante_id_mestre)
+
+    async def confirm(payload: IfoodWebhookPayload) -> None:
+        async with semaphore:
+            await adapter.confirm_order(access_token, adapter.native_order_id(payload.id), restaurante_id_mestre)
+
+    # 2. BUSCAR DETALHES DE TODOS OS PEDIDOS EM PARALELO
+    with stage("order_get"):
+        fetch_results = await asyncio.gather(*(fetch(p) for p in webhook_payloads), return_exceptions=True)
+    fetched = [(p, r) for p, r in zip(webhook_payloads, fetch_results) if not isinstance(r, BaseException)]
+    failed = [(p, r) for p, r in zip(webhook_payloads, fetch_results) if isinstance(r, BaseException)]
+
+    # 3. UM ÚNICO UPSERT EM LOTE
+    if fetched:
+        with stage("persist"):
+            await _persist_orders(restaurante_id_mestre, [order_data for _, order_data in fetched], order_writer, plataforma)
+
+    # 4. CONFIRMAR TODOS NA PLATAFORMA
+    with stage("confirm"):
+        confirm_results = await asyncio.gather(*(confirm(p) for p, _ in fetched), return_exceptions=True)
+    failed.extend((p, r) for (p, _), r in zip(fetched, confirm_results) if isinstance(r, BaseException))
+    confirmed = [(p, order_data) for (p, order_data), r in zip(fetched, confirm_results) if not isinstance(r, BaseException)]
+    for payload, order_data in confirmed:
+        _publish_order_confirmed(restaurante_id_mestre, order_data, adapter)
+        order_state.apply(restaurante_id_mestre, payload.id, "ORDER_CONFIRMED")
+    logger.info("Lote de pedidos processado", extra={"orders": len(webhook_payloads), "confirmed": len(webhook_payloads) - len(failed)})
+
+    # 5. FALHAS INDIVIDUAIS VOLTAM PARA A FILA COMO JOBS UNITÁRIOS
+    if failed:
+        for payload, error in failed:
+            logger.warning("Pedido do lote falhou e será reprocessado individualmente", extra={"order_id": payload.id, "error": getattr(error, "detail", None) or str(error)})
+        await order_queue.enqueue_many(ORDER_PLACED_JOB, [
+            (restaurante_id_mestre, {"restaurante_id": restaurante_id_mestre, "plataforma": plataforma, "event": payload.model_dump()})
+            for payload, _ in failed
+        ])
+
+
+# Tipos de job na fila durável
+ORDER_PLACED_JOB = "order_placed"
+ORDER_PLACED_BATCH_JOB = "order_placed_batch"
+WEBHOOK_RAW_JOB = "webhook_raw"
+
+
+async def order_placed_job_handler(job_payload: Dict[str, Any]) -> None:
+    """Handler registrado na fila durável para jobs ORDER_PLACED (jobs antigos, sem plataforma, são do iFood)."""
+    payload = IfoodWebhookPayload(**job_payload["event"])
+    plataforma = job_payload.get("plataforma", PLATFORM_NAME)
+    with bind(restaurante_id=job_payload["restaurante_id"], plataforma=plataforma, order_id=payload.id, correlation_id=payload.correlationId):
+        await _handle_order_placed_webhook(
+            job_payload["restaurante_id"],
+            payload,
+            get_integracoes_repository(),
+            get_order_writer(),
+            plataforma
+        )
+
+
+async def order_placed_batch_job_handler(job_payload: Dict[str, Any]) -> None:
+    """Handler registrado na fila durável para lotes de ORDER_PLACED de um mesmo restaurante."""
+    plataforma = job_payload.get("plataforma", PLATFORM_NAME)
+    with bind(restaurante_id=job_payload["restaurante_id"], plataforma=plataforma):
+        await _handle_order_placed_batch(
+            job_payload["restaurante_id"],
+            [IfoodWebhookPayload(**event) for event in job_payload["events"]],
+            get_integracoes_repository(),
+            get_order_writer(),
+            get_order_queue(),
+            plataforma
+        )
+
+
+async def ingest_mapped_events(
+    mapped: List[Tuple[str, IfoodWebhookPayload]],
+    deduplicator: WebhookDeduplicator,
+    order_queue: OrderQueue,
+    plataforma: str = PLATFORM_NAME
+) -> Dict[str, Any]:
+    """
+    Caminho comum de ingestão em lote (webhook em lote e polling de eventos) para eventos já
+    mapeados ao restaurante: deduplica num único upsert, agrupa os ORDER_PLACED por restaurante
+    e grava UM job de lote por restaurante numa única transação da fila.
+    """
+    # 1. DEDUPLICAÇÃO EM LOTE
+    new_keys = await deduplicator.register_many([
+        {
+            "event_key": event_key(payload.code, payload.id, payload.correlationId),
+            "code": payload.code,
+            "restaurante_id": restaurante_id_mestre,
+            "plataforma": plataforma,
+        }
+        for restaurante_id_mestre, payload in mapped
+    ])
+
+    # 2. AGRUPA POR RESTAURANTE
+    orders_by_restaurant: Dict[str, List[IfoodWebhookPayload]] = defaultdict(list)
+    duplicates = 0
+    for restaurante_id_mestre, payload in mapped:
+        key = event_key(payload.code, payload.id, payload.correlationId)
+        if key not in new_keys:
+            duplicates += 1
+            continue
+        new_keys.discard(key)  # o mesmo evento repetido dentro do lote conta uma única vez
+        _publish_order_event(restaurante_id_mestre, payload, plataforma)
+        order_state.apply(restaurante_id_mestre, payload.id, payload.code)
+        if payload.code == "ORDER_PLACED":
+            orders_by_restaurant[restaurante_id_mestre].append(payload)
+        else:
+            logger.info("Evento recebido (lote)", extra={"code": payload.code, "order_id": payload.id, "restaurante_id": restaurante_id_mestre})
+
+    # 3. JOBS DE LOTE POR RESTAURANTE (até ORDER_BATCH_MAX_ORDERS pedidos cada; a partição
+    #    os executa em sequência), TODOS GRAVADOS NUMA ÚNICA TRANSAÇÃO
+    if orders_by_restaurant:
+        try:
+            await order_queue.enqueue_many(ORDER_PLACED_BATCH_JOB, [
+                (
+                    restaurante_id_mestre,
+                    {
+                        "restaurante_id": restaurante_id_mestre,
+                        "plataforma": plataforma,
+                        "events": [p.model_dump() for p in events[start:start + ORDER_BATCH_MAX_ORDERS]],
+                    },
+                )
+                for restaurante_id_mestre, events in orders_by_restaurant.items()
+                for start in range(0, len(events), ORDER_BATCH_MAX_ORDERS)
+            ])
+        except Exception:
+            # Sem os jobs gravados, libera as chaves para que a reentrega seja aceita
+            for events in orders_by_restaurant.values():
+                for payload in events:
+                    await deduplicator.forget(event_key(payload.code, payload.id, payload.correlationId))
+            raise
+
+    return {
+        "duplicates": duplicates,
+        "orders_enqueued": {restaurante_id: len(events) for restaurante_id, events in orders_by_restaurant.items()},
+    }
+
+
+async def ingest_polled_events(mapped: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Usada pelo EventPoller: entrega os eventos do polling ao mesmo caminho do webhook em lote.
+    Um evento inválido para o modelo é descartado (e contado em `invalid`) sem derrubar os
+    demais: o poller confirma a rodada inteira, senão o iFood reentregaria o lote para sempre.
+    """
+    payloads: List[Tuple[str, IfoodWebhookPayload]] = []
+    invalid = 0
+    for restaurante_id, event in mapped:
+        try:
+            payloads.append((restaurante_id, IfoodWebhookPayload(**event)))
+        except ValidationError as e:
+            invalid += 1
+            logger.warning("Evento do polling inválido descartado", extra={
+                "restaurante_id": restaurante_id, "correlation_id": event.get("correlationId"), "error": str(e),
+            })
+    result: Dict[str, Any] = {"duplicates": 0, "orders_enqueued": {}}
+    if payloads:
+        result = await ingest_mapped_events(payloads, get_webhook_deduplicator(), get_order_queue())
+    result["invalid"] = invalid
+    return result
+
+
+async def get_integration_record(restaurante_id: str) -> Dict[str, Any]:
+    """Usada pelo EventPoller: registro do iFood com token válido (cache + single-flight)."""
+    return await get_valid_integration_record(restaurante_id, PLATFORM_NAME, get_integracoes_repository())
 
 
 # -----------------------------------------------------------
@@ -270,44 +598,43 @@ async def _handle_order_placed_webhook(
 async def ifood_device_code_flow(
     request_payload: IfoodUsercodeRequest, 
     restaurante_id: str = Query(..., description=f"ID Mestre (UUID) do restaurante. DEVE existir na tabela restaurantes. Ex: {TESTE_RESTAURANTE_UUID}"),
-    supabase: Client = Depends(get_client)
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository)
 ):
     """
     Inicia o fluxo do iFood, obtém o userCode e cria/atualiza um registro na tabela 'restaurante_integracoes'
     mapeando ao seu 'restaurante_id' mestre.
     """
     
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            # 1. CHAMADA REAL PARA API DO IFOOD
-            response = await client.post(
-                IFOOD_DEVICE_CODE_URL,
-                headers={"accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"},
-                data={"clientId": request_payload.clientId}
-            )
-            
-            response.raise_for_status()
-            ifood_data = IfoodDeviceCodeResponse(**response.json())
+    try:
+        # 1. CHAMADA REAL PARA API DO IFOOD
+        response = await ifood_request(
+            "POST",
+            IFOOD_DEVICE_CODE_URL,
+            endpoint="device_code",
+            headers={"accept": "application/json", "Content-Type": "application/x-www-form-urlencoded"},
+            data={"clientId": request_payload.clientId}
+        )
+        
+        response.raise_for_status()
+        ifood_data = IfoodDeviceCodeResponse(**response.json())
 
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=e.response.status_code,
-                detail=f"Erro na API do iFood (Status {e.response.status_code}): {e.response.text}"
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Erro ao processar chamada à API do iFood: {str(e)}"
-            )
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Erro na API do iFood (Status {e.response.status_code}): {e.response.text}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao processar chamada à API do iFood: {str(e)}"
+        )
 
     # 2. Inserção/Atualização na tabela 'restaurante_integracoes'
     try:
         # Tenta buscar um registro existente primeiro
-        check_response = supabase.table("restaurante_integracoes").select("id").eq(
-            "restaurante_id", restaurante_id
-        ).eq("plataforma", PLATFORM_NAME).limit(1).execute()
+        existing = await integracoes.get(restaurante_id, PLATFORM_NAME, columns="id")
 
-        integration_id = check_response.data[0]['id'] if check_response.data else None
+        integration_id = existing['id'] if existing else None
         
         insert_update_data = {
             "user_code": ifood_data.userCode,
@@ -321,17 +648,21 @@ async def ifood_device_code_flow(
 
         if integration_id:
             # Atualiza o registro existente (USO COMUM)
-            response = supabase.table("restaurante_integracoes").update(insert_update_data).eq(
-                "id", integration_id
-            ).execute()
+            saved_rows = await integracoes.update_by_id(integration_id, insert_update_data)
         else:
             # Insere um novo registro (primeira integração)
             insert_update_data["restaurante_id"] = restaurante_id # Pega do Query Parameter (O UUID válido)
             insert_update_data["plataforma"] = PLATFORM_NAME
-            response = supabase.table("restaurante_integracoes").insert(insert_update_data).execute()
+            saved_rows = await integracoes.insert(insert_update_data)
 
 
-        if response.data:
+        # Os tokens antigos foram apagados: descarta qualquer cópia em cache
+        token_cache.invalidate((restaurante_id, PLATFORM_NAME))
+        refresher = get_token_refresher()
+        if refresher is not None:
+            refresher.unschedule(restaurante_id, PLATFORM_NAME)
+
+        if saved_rows:
             return {
                 "message": "✅ Fluxo Device Code iniciado e registro criado/atualizado para o seu restaurante ID.",
                 "restaurante_id": restaurante_id,
@@ -361,21 +692,18 @@ async def ifood_device_code_flow(
 @router.post("/token", summary="Passo 2: Troca o código de autorização por tokens e mapeia o ID externo")
 async def exchange_token_flow(
     request_payload: IfoodTokenRequest,
-    supabase: Client = Depends(get_client)
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository)
 ):
     """
     Troca o código de autorização e armazena o merchant_id do iFood na coluna external_merchant_id.
     """
     
     # 1. BUSCAR O REGISTRO DE INTEGRAÇÃO PELO user_code
-    fetch_response = supabase.table("restaurante_integracoes").select("*").eq(
-        "user_code", request_payload.user_code
-    ).limit(1).execute()
+    record = await integracoes.get_by_user_code(request_payload.user_code)
     
-    if not fetch_response.data:
+    if not record:
         raise HTTPException(status_code=404, detail="User code não encontrado ou expirado. Reautorize.")
 
-    record = fetch_response.data[0]
     auth_code_verifier = record.get("authorization_code_verifier")
     integration_id = record.get("id") 
     restaurante_id = record.get("restaurante_id") # SEU UUID MESTRE
@@ -408,11 +736,21 @@ async def exchange_token_flow(
             "created_at": datetime.now(timezone.utc).isoformat()
         }
 
-        update_response = supabase.table("restaurante_integracoes").update(update_data).eq(
-            "id", integration_id
-        ).execute()
+        updated_rows = await integracoes.update_by_id(integration_id, update_data)
+
+        # Novos tokens gravados: a próxima leitura recarrega o registro do banco
+        token_cache.invalidate((restaurante_id, PLATFORM_NAME))
+        if updated_rows:
+            # Mantém o índice do webhook coerente com o novo mapeamento
+            merchant_index.put(token_response_data.merchantId, PLATFORM_NAME, restaurante_id)
+            # O merchant pode ter mudado: o cardápio em cache não vale mais
+            menu_cache.invalidate((restaurante_id, PLATFORM_NAME))
+            merchant_status_cache.invalidate((restaurante_id, PLATFORM_NAME))
+        refresher = get_token_refresher()
+        if refresher is not None and updated_rows:
+            refresher.schedule(restaurante_id, PLATFORM_NAME, updated_rows[0])
 
-        if update_response.data:
+        if updated_rows:
             return {
                 "message": "✅ Tokens de acesso obtidos e ID externo mapeado com sucesso!",
                 "restaurante_id": restaurante_id,
@@ -431,39 +769,52 @@ async def exchange_token_flow(
 # -----------------------------------------------------------
 # ENDPOINT 3: /merchant/status (VERIFICA O STATUS DA LOJA)
 # -----------------------------------------------------------
+async def _fetch_merchant_status(restaurante_id: str, integracoes: IntegracoesRepository) -> IfoodMerchantStatusResponse:
+    """Busca o status da loja diretamente no iFood (sem cache)."""
+    # 1. GARANTE QUE O TOKEN ESTÁ VÁLIDO E PEGA O REGISTRO (RENONOVA SE PRECISO)
+    record = await get_valid_integration_record(restaurante_id, PLATFORM_NAME, integracoes)
+    
+    access_token = record.get("access_token")
+    merchant_id = record.get("external_merchant_id") # O ID externo do iFood
+
+    if not merchant_id:
+         raise HTTPException(status_code=400, detail="ID externo do iFood (merchant_id) ainda não foi mapeado para este restaurante. Complete o Passo 2.")
+    
+    # 2. CHAMA A API DO IFOOD
+    status_url = f"{IFOOD_MERCHANT_BASE_URL}/merchants/{merchant_id}/status"
+    
+    response = await ifood_request(
+        "GET",
+        status_url,
+        endpoint="merchant_status",
+        merchant_key=restaurante_id,
+        headers={
+            "accept": "application/json",
+            "Authorization": f"Bearer {access_token}"
+        }
+    )
+    
+    response.raise_for_status()
+    
+    return IfoodMerchantStatusResponse(**response.json())
+
+
 @router.get("/merchant/status", response_model=IfoodMerchantStatusResponse, summary="Verifica o Status Operacional da Loja")
 async def get_merchant_status(
     request_payload: IntegrationIdentifierRequest = Depends(),
-    supabase: Client = Depends(get_client)
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository)
 ):
-    """Busca o status operacional da loja do iFood, usando o UUID interno para obter o token e o ID externo."""
+    """
+    Busca o status operacional da loja do iFood, usando o UUID interno para obter o token e o ID externo.
+    Vários dashboards olhando a mesma loja compartilham a mesma consulta ao iFood (cache curto).
+    """
     restaurante_id = request_payload.restaurante_id
     
     try:
-        # 1. GARANTE QUE O TOKEN ESTÁ VÁLIDO E PEGA O REGISTRO (RENONOVA SE PRECISO)
-        record = await get_valid_integration_record(restaurante_id, PLATFORM_NAME, supabase)
-        
-        access_token = record.get("access_token")
-        merchant_id = record.get("external_merchant_id") # O ID externo do iFood
-
-        if not merchant_id:
-             raise HTTPException(status_code=400, detail="ID externo do iFood (merchant_id) ainda não foi mapeado para este restaurante. Complete o Passo 2.")
-        
-        # 2. CHAMA A API DO IFOOD
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            status_url = f"{IFOOD_MERCHANT_BASE_URL}/merchants/{merchant_id}/status"
-            
-            response = await client.get(
-                status_url,
-                headers={
-                    "accept": "application/json",
-                    "Authorization": f"Bearer {access_token}"
-                }
-            )
-            
-            response.raise_for_status()
-            
-            return IfoodMerchantStatusResponse(**response.json())
+        return await merchant_status_cache.get(
+            (restaurante_id, PLATFORM_NAME),
+            lambda: _fetch_merchant_status(restaurante_id, integracoes),
+        )
 
     except HTTPException as e:
         raise e
@@ -477,47 +828,174 @@ async def get_merchant_status(
 
 
 # -----------------------------------------------------------
-# ENDPOINT 4: /merchant/menu (EXEMPLO DE LEITURA OPERACIONAL)
+# ENDPOINT 3.1: /merchant/status/bulk (STATUS DE VÁRIAS LOJAS DE UMA VEZ)
 # -----------------------------------------------------------
-@router.get("/merchant/menu", response_model=IfoodMenuResponse, summary="Busca o Cardápio (Menu) Completo do Restaurante")
-async def get_merchant_menu(
-    request_payload: IntegrationIdentifierRequest = Depends(),
-    supabase: Client = Depends(get_client)
+# Limites compartilhados por todas as consultas em lote do processo
+merchant_status_bulk_semaphore = asyncio.Semaphore(MERCHANT_STATUS_BULK_CONCURRENCY)
+merchant_status_rate_limiter = TokenBucket(MERCHANT_STATUS_BULK_RATE_PER_SECOND, MERCHANT_STATUS_BULK_RATE_PER_SECOND)
+
+
+async def _fetch_merchant_status_limited(restaurante_id: str, integracoes: IntegracoesRepository) -> IfoodMerchantStatusResponse:
+    async with merchant_status_bulk_semaphore:
+        await merchant_status_rate_limiter.acquire()
+        return await _fetch_merchant_status(restaurante_id, integracoes)
+
+
+async def _bulk_status_item(restaurante_id: str, integracoes: IntegracoesRepository) -> MerchantStatusBulkItem:
+    started = time.perf_counter()
+    try:
+        # Passa pelo mesmo cache coalescido do endpoint unitário; só misses consomem a taxa
+        merchant_status = await merchant_status_cache.get(
+            (restaurante_id, PLATFORM_NAME),
+            lambda: _fetch_merchant_status_limited(restaurante_id, integracoes),
+        )
+        return MerchantStatusBulkItem(
+            restaurante_id=restaurante_id,
+            ok=True,
+            status=merchant_status,
+            elapsed_ms=(time.perf_counter() - started) * 1000,
+        )
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            error_status_code, error = e.status_code, str(e.detail)
+        elif isinstance(e, httpx.HTTPStatusError):
+            error_status_code, error = e.response.status_code, f"Erro na API de Status do iFood: {e.response.text}"
+        else:
+            error_status_code, error = 500, f"Erro inesperado: {str(e)}"
+        return MerchantStatusBulkItem(
+            restaurante_id=restaurante_id,
+            ok=False,
+            error=error,
+            error_status_code=error_status_code,
+            elapsed_ms=(time.perf_counter() - started) * 1000,
+        )
+
+
+@router.post("/merchant/status/bulk", response_model=MerchantStatusBulkResponse, summary="Verifica o Status de Várias Lojas de uma vez")
+async def get_merchant_status_bulk(
+    request_payload: MerchantStatusBulkRequest,
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository)
 ):
     """
-    Endpoint que demonstra como usar o Access Token válido para buscar dados do iFood (Ex: Cardápio).
+    Status de várias lojas numa chamada. As integrações são carregadas numa única query e as
+    consultas ao iFood rodam em paralelo (com limite de concorrência e de taxa). Falhas de uma
+    loja não derrubam o lote: cada item traz seu resultado ou erro e o tempo gasto.
     """
-    restaurante_id = request_payload.restaurante_id
-    
+    started = time.perf_counter()
+    restaurante_ids = list(dict.fromkeys(request_payload.restaurante_ids))
+
+    # 1. UMA QUERY PARA TODAS AS INTEGRAÇÕES; as válidas entram no cache de tokens, de modo que
+    #    get_valid_integration_record não volte ao banco para cada loja
     try:
+        records = await integracoes.get_many(restaurante_ids, PLATFORM_NAME)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar integrações: {str(e)}")
+    for record in records:
+        cache_key = (record["restaurante_id"], PLATFORM_NAME)
+        if (
+            record.get("is_authorized") and record.get("access_token")
+            and (not uses_refresh_token(PLATFORM_NAME) or record.get("refresh_token"))
+            and token_cache.get(cache_key, TOKEN_REFRESH_MARGIN_SECONDS) is None
+        ):
+            token_cache.put(cache_key, record)
+
+    # 2. FAN-OUT PARA O IFOOD
+    results = await asyncio.gather(*(
+        _bulk_status_item(restaurante_id, integracoes) for restaurante_id in restaurante_ids
+    ))
+    succeeded = sum(1 for item in results if item.ok)
+    return MerchantStatusBulkResponse(
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        elapsed_ms=(time.perf_counter() - started) * 1000,
+        results=results,
+    )
+
+
+# -----------------------------------------------------------
+# ENDPOINT 4: /merchant/menu (EXEMPLO DE LEITURA OPERACIONAL)
+# -----------------------------------------------------------
+async def _load_menu(restaurante_id: str, integracoes: IntegracoesRepository, revalidate: bool = False) -> MenuEntry:
+    """
+    Devolve o cardápio do cache; se vencido (ou ausente), revalida/busca no iFood.
+    Leituras simultâneas do mesmo restaurante esperam uma única chamada ao iFood.
+    Com `revalidate`, consulta o iFood mesmo com a entrada fresca (condicional: 304 se igual).
+    """
+    cache_key = (restaurante_id, PLATFORM_NAME)
+    entry = menu_cache.get(cache_key)
+    if entry is not None and entry.is_fresh() and not revalidate:
+        MENU_REQUESTS.inc(result="hit")
+        return entry
+
+    async with menu_cache.lock(cache_key):
+        # Outra requisição pode ter atualizado o cache enquanto esperávamos o lock
+        entry = menu_cache.get(cache_key)
+        if entry is not None and entry.is_fresh() and not revalidate:
+            MENU_REQUESTS.inc(result="hit")
+            return entry
+
         # 1. GARANTE QUE O TOKEN ESTÁ VÁLIDO E PEGA O REGISTRO
-        record = await get_valid_integration_record(restaurante_id, PLATFORM_NAME, supabase)
-        
+        record = await get_valid_integration_record(restaurante_id, PLATFORM_NAME, integracoes)
+
         access_token = record.get("access_token")
         merchant_id = record.get("external_merchant_id")
 
         if not merchant_id:
              raise HTTPException(status_code=400, detail="ID externo do iFood (merchant_id) ainda não foi mapeado para este restaurante. Complete o Passo 2.")
-        
-        # 2. CHAMA A API DO IFOOD
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            # URL de exemplo para o endpoint de Cardápio/Menu
-            menu_url = f"{IFOOD_MERCHANT_BASE_URL}/merchants/{merchant_id}/menus" 
-            
-            response = await client.get(
-                menu_url,
-                headers={
-                    "accept": "application/json",
-                    "Authorization": f"Bearer {access_token}"
-                }
-            )
-            
-            response.raise_for_status()
-            
-            # 3. Retorna a resposta (ou o modelo Pydantic correspondente)
-            # Para fins de teste em Sandbox, o iFood pode retornar dados mockados ou vazios.
-            return response.json() 
 
+        # 2. CHAMA A API DO IFOOD (condicional quando já temos uma versão em cache)
+        menu_url = f"{IFOOD_MERCHANT_BASE_URL}/merchants/{merchant_id}/menus"
+        headers = {
+            "accept": "application/json",
+            "Authorization": f"Bearer {access_token}"
+        }
+        if entry is not None:
+            headers.update(entry.conditional_headers())
+
+        try:
+            response = await ifood_request("GET", menu_url, endpoint="menu", merchant_key=restaurante_id, headers=headers)
+            if response.status_code >= 500:
+                response.raise_for_status()
+        except (httpx.TransportError, httpx.HTTPStatusError, CircuitOpenError) as e:
+            # iFood fora (rede, 5xx ou circuito aberto): a versão vencida é melhor que um erro;
+            # não é renovada, então a próxima leitura tenta de novo
+            if entry is None:
+                raise
+            logger.warning("API de Menu indisponível; servindo o cardápio vencido do cache", extra={"restaurante_id": restaurante_id, "error": getattr(e, "detail", None) or str(e)})
+            MENU_REQUESTS.inc(result="stale")
+            return entry
+
+        if response.status_code == status.HTTP_304_NOT_MODIFIED and entry is not None:
+            MENU_REQUESTS.inc(result="revalidated")
+            entry.renew(menu_cache.ttl_seconds)
+            return entry
+
+        response.raise_for_status()
+
+        # 3. Guarda os bytes como vieram do iFood (sem decodificar/re-serializar o JSON)
+        MENU_REQUESTS.inc(result="miss")
+        return menu_cache.put(
+            cache_key,
+            response.content,
+            upstream_etag=response.headers.get("etag"),
+            upstream_last_modified=response.headers.get("last-modified"),
+        )
+
+
+@router.get("/merchant/menu", response_model=IfoodMenuResponse, summary="Busca o Cardápio (Menu) Completo do Restaurante")
+async def get_merchant_menu(
+    request: Request,
+    request_payload: IntegrationIdentifierRequest = Depends(),
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository)
+):
+    """
+    Endpoint que demonstra como usar o Access Token válido para buscar dados do iFood (Ex: Cardápio).
+    A resposta vem do cache de cardápios (com ETag); o dashboard pode usar If-None-Match.
+    """
+    restaurante_id = request_payload.restaurante_id
+    
+    try:
+        entry = await _load_menu(restaurante_id, integracoes)
     except HTTPException as e:
         raise e
     except httpx.HTTPStatusError as e:
@@ -528,61 +1006,401 @@ async def get_merchant_menu(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro inesperado: {str(e)}")
 
+    headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if entry.etag in request.headers.get("if-none-match", ""):
+        MENU_REQUESTS.inc(result="not_modified")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Para fins de teste em Sandbox, o iFood pode retornar dados mockados ou vazios.
+    if entry.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(entry.gzip_body, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
+@router.delete("/merchant/menu/cache", status_code=status.HTTP_204_NO_CONTENT, summary="Descarta o cardápio em cache (ex.: após editar o cardápio no iFood)")
+async def invalidate_merchant_menu(request_payload: IntegrationIdentifierRequest = Depends()):
+    menu_cache.invalidate((request_payload.restaurante_id, request_payload.plataforma))
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+# -----------------------------------------------------------
+# ENDPOINT 4b: /merchant/menu/items (CARDÁPIO NORMALIZADO E INDEXADO)
+# -----------------------------------------------------------
+async def _menu_snapshot(
+    restaurante_id: str,
+    integracoes: IntegracoesRepository,
+    cardapio: CardapioItensRepository,
+) -> MenuSnapshot:
+    """
+    Snapshot normalizado do cardápio, sincronizado com a versão em cache do iFood. Com o
+    mesmo ETag da última sincronização não há parse nem gravação; se o iFood estiver fora,
+    serve o último snapshot conhecido.
+    """
+    key = (restaurante_id, PLATFORM_NAME)
+    try:
+        entry = await _load_menu(restaurante_id, integracoes)
+    except (httpx.HTTPError, CircuitOpenError) as e:
+        # CircuitOpenError é um HTTPException 503: é justamente quando o snapshot deve servir
+        snapshot, source = await menu_store.load(key, cardapio)
+        if not len(snapshot):
+            raise
+        logger.warning("API de Menu indisponível; servindo o último cardápio sincronizado", extra={"restaurante_id": restaurante_id, "error": getattr(e, "detail", None) or str(e)})
+        MENU_STORE_LOOKUPS.inc(kind="stale", source=source)
+        return snapshot
+
+    snapshot = menu_store.get(key)
+    if snapshot is None or snapshot.source_etag != entry.etag:
+        await menu_store.sync(key, entry.body, entry.etag, cardapio)
+    snapshot, _ = await menu_store.load(key, cardapio)
+    return snapshot
+
+
+def _menu_http_error(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(
+            status_code=e.response.status_code,
+            detail=f"Erro na API de Menu do iFood: {e.response.text}"
+        )
+    return HTTPException(status_code=500, detail=f"Erro inesperado: {str(e)}")
+
+
+@router.get("/merchant/menu/items", response_model=MenuItemsResponse, summary="Itens do cardápio normalizado (filtros por categoria, status e prefixo do nome)")
+async def list_menu_items(
+    request_payload: IntegrationIdentifierRequest = Depends(),
+    category: Optional[str] = Query(None, description="Nome exato da categoria"),
+    item_status: Optional[str] = Query(None, alias="status", description="Ex: AVAILABLE, UNAVAILABLE"),
+    q: Optional[str] = Query(None, min_length=1, description="Prefixo do nome do item (sem diferenciar maiúsculas)"),
+    limit: int = Query(100, ge=1, le=MENU_STORE_MAX_RESULTS),
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository),
+    cardapio: CardapioItensRepository = Depends(get_cardapio_itens_repository)
+):
+    """
+    Consulta os itens pelos índices em memória (sem percorrer o JSON do cardápio). Os
+    filtros são combinados (E); o resultado vem em ordem de nome.
+    """
+    try:
+        snapshot = await _menu_snapshot(request_payload.restaurante_id, integracoes, cardapio)
+    except Exception as e:
+        raise _menu_http_error(e)
+
+    MENU_STORE_LOOKUPS.inc(kind="filter", source="memory")
+    items = snapshot.find(category=category, status=item_status, name_prefix=q, limit=limit)
+    return MenuItemsResponse(
+        restaurante_id=request_payload.restaurante_id,
+        count=len(items),
+        items=[IfoodMenuItem(**item.as_dict()) for item in items],
+    )
+
+
+@router.get("/merchant/menu/items/{item_id}", response_model=IfoodMenuItem, summary="Um item do cardápio (preço e disponibilidade) pelo itemId")
+async def get_menu_item(
+    item_id: str,
+    request_payload: IntegrationIdentifierRequest = Depends(),
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository),
+    cardapio: CardapioItensRepository = Depends(get_cardapio_itens_repository)
+):
+    try:
+        snapshot = await _menu_snapshot(request_payload.restaurante_id, integracoes, cardapio)
+    except Exception as e:
+        raise _menu_http_error(e)
+
+    MENU_STORE_LOOKUPS.inc(kind="item", source="memory")
+    item = snapshot.items.get(item_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail=f"Item '{item_id}' não encontrado no cardápio.")
+    return IfoodMenuItem(**item.as_dict())
+
+
+@router.post("/merchant/menu/sync", response_model=MenuSyncResponse, summary="Sincroniza agora o cardápio normalizado com o iFood (grava só o que mudou)")
+async def sync_merchant_menu(
+    request_payload: IntegrationIdentifierRequest = Depends(),
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository),
+    cardapio: CardapioItensRepository = Depends(get_cardapio_itens_repository)
+):
+    """
+    Revalida o cardápio no iFood (requisição condicional) e aplica a diferença à tabela
+    cardapio_itens. Útil logo depois de editar o cardápio no portal do iFood.
+    """
+    restaurante_id = request_payload.restaurante_id
+    key = (restaurante_id, PLATFORM_NAME)
+    try:
+        entry = await _load_menu(restaurante_id, integracoes, revalidate=True)
+        result = await menu_store.sync(key, entry.body, entry.etag, cardapio)
+    except Exception as e:
+        raise _menu_http_error(e)
+    return MenuSyncResponse(restaurante_id=restaurante_id, **result.as_dict())
+
 
 # -----------------------------------------------------------
 # ENDPOINT 5: /webhook (RECEBE EVENTOS EM TEMPO REAL)
 # -----------------------------------------------------------
-@router.post("/webhook", status_code=status.HTTP_200_OK, summary="Recebe Webhooks da API do iFood e mapeia para o ID interno")
+@router.post("/webhook", status_code=status.HTTP_200_OK, summary="Recebe Webhooks da API do iFood (ACK imediato; processamento na fila)")
 async def ifood_webhook_receiver(
-    payload: IfoodWebhookPayload, 
-    background_tasks: BackgroundTasks, # Adicionado para processamento assíncrono
-    supabase: Client = Depends(get_client)
+    request: Request,
+    x_ifood_signature: Optional[str] = Header(None),
+    order_queue: OrderQueue = Depends(get_order_queue)
 ):
     """
-    Recebe eventos em tempo real do iFood. Mapeia o 'merchantId' (ID externo) para o 'restaurante_id' (UUID interno).
-    O processamento pesado (`ORDER_PLACED` e ações) é delegado a BackgroundTasks.
+    Recebe eventos em tempo real do iFood. Confere a assinatura sobre o corpo bruto, grava o
+    evento na fila durável e responde na hora; validação, mapeamento do 'merchantId' para o
+    'restaurante_id' (UUID interno) e deduplicação são feitos pelo worker (webhook_raw_job_handler).
     """
-    
-    # 1. EXTRAI O ID EXTERNO (iFood)
-    external_merchant_id = payload.metadata.get("merchantId") 
-    
-    if not external_merchant_id:
-        print("Webhook recebido sem Merchant ID na metadata.")
-        return {"message": "Webhook recebido, mas sem ID externo para mapeamento."}
-
-    # 2. BUSCA O SEU UUID MESTRE INTERNO (o seu 'restaurante_id')
-    fetch_response = supabase.table("restaurante_integracoes").select("restaurante_id").eq(
-        "external_merchant_id", external_merchant_id
-    ).eq("plataforma", PLATFORM_NAME).limit(1).execute()
-    
-    if not fetch_response.data:
-        print(f"Merchant ID {external_merchant_id} não mapeado para um restaurante interno.")
-        return {"message": "Webhook recebido, mas o ID externo não está mapeado."}
+    started = time.perf_counter()
+    result = "accepted"
+    try:
+        body = await request.body()
+        # 1. ASSINATURA + PARSE MÍNIMO (sem modelo Pydantic, sem banco)
+        try:
+            text = decode_body(body)
+            verify_signature(body, x_ifood_signature)
+            code, event_id, external_merchant_id = parse_event(body)
+        except WebhookRejected as e:
+            result = e.reason
+            logger.warning("Webhook recusado", extra={"reason": e.reason})
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+        if not external_merchant_id:
+            result = "no_merchant"
+            logger.warning("Webhook recebido sem merchantId na metadata", extra={"code": code, "order_id": event_id})
+            return {"message": "Webhook recebido, mas sem ID externo para mapeamento."}
+
+        # 2. GRAVA O CORPO BRUTO NA FILA DURÁVEL (partição por loja: eventos da mesma loja em ordem)
+        try:
+            await order_queue.enqueue(WEBHOOK_RAW_JOB, external_merchant_id, {"body": text})
+        except Exception as e:
+            result = "enqueue_failed"
+            # Sem o job gravado o iFood precisa reentregar: não confirma o recebimento
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Falha ao enfileirar o evento {code} ({event_id}): {str(e)}"
+            )
+
+        # 3. RESPOSTA RÁPIDA OBRIGATÓRIA
+        return {"message": f"Webhook {code} recebido e roteado para processamento."}
+    finally:
+        observe_ack(time.perf_counter() - started, result)
+
+
+async def _route_webhook_event(
+    payload: IfoodWebhookPayload,
+    integracoes: IntegracoesRepository,
+    order_queue: OrderQueue,
+    deduplicator: WebhookDeduplicator,
+    plataforma: str = PLATFORM_NAME
+) -> None:
+    """
+    Processa um evento recebido pelo /webhook (de qualquer plataforma, já no formato do iFood):
+    mapeia o 'merchantId' (ID externo) para o 'restaurante_id' (UUID interno), deduplica e
+    delega o ORDER_PLACED para a fila.
+    """
+    # 1. BUSCA O SEU UUID MESTRE INTERNO (o seu 'restaurante_id') no índice em memória
+    external_merchant_id = payload.metadata.get("merchantId")
+    restaurante_id_mestre = await merchant_index.resolve(external_merchant_id, plataforma, integracoes)
 
-    # O SEU UUID MESTRE! Este é o ID que você deve usar para processar o pedido.
-    restaurante_id_mestre = fetch_response.data[0]['restaurante_id'] 
+    if not restaurante_id_mestre:
+        logger.warning("merchantId não mapeado para um restaurante interno", extra={"merchant_id": external_merchant_id})
+        return
+
+    # 2. DEDUPLICAÇÃO: as plataformas reentregam eventos; cada um é processado uma única vez
+    dedup_key = event_key(payload.code, payload.id, payload.correlationId)
+    is_new_event = await deduplicator.register(
+        dedup_key, code=payload.code, restaurante_id=restaurante_id_mestre, plataforma=plataforma
+    )
+    if not is_new_event:
+        logger.info("Evento duplicado ignorado")
+        return
 
     # 3. LOGGING E PROCESSAMENTO DE EVENTOS
-    print(f"WEBHOOK RECEBIDO: {payload.code} -> Mapeado para SEU ID MESTRE (UUID): {restaurante_id_mestre}")
-    
+    logger.info("Webhook recebido", extra={"restaurante_id": restaurante_id_mestre})
+    _publish_order_event(restaurante_id_mestre, payload, plataforma)
+    # Transição de status em memória (contadores do monitor); a gravação no banco é em lote
+    order_state.apply(restaurante_id_mestre, payload.id, payload.code)
+
     if payload.code == "ORDER_PLACED":
-        # DELEGA O PROCESSAMENTO PESADO (Buscar + Confirmar) PARA TAREFAS EM SEGUNDO PLANO
-        background_tasks.add_task(
-            _handle_order_placed_webhook,
-            restaurante_id_mestre, 
-            payload, 
-            supabase
-        )
-        print(f"⏳ EVENTO ORDER_PLACED ({payload.id}) delegado para processamento em segundo plano.")
-        
+        # DELEGA O PROCESSAMENTO PESADO (Buscar + Confirmar) PARA A FILA DURÁVEL
+        # (partição por restaurante: pedidos da mesma loja são processados em ordem)
+        try:
+            await order_queue.enqueue(
+                ORDER_PLACED_JOB,
+                restaurante_id_mestre,
+                {"restaurante_id": restaurante_id_mestre, "plataforma": plataforma, "event": payload.model_dump()}
+            )
+        except Exception:
+            # Sem o job gravado, libera a chave para que a nova tentativa deste job seja aceita
+            await deduplicator.forget(dedup_key)
+            raise
+        logger.info("ORDER_PLACED delegado para processamento em segundo plano")
+
     elif payload.code == "ORDER_CONFIRMED":
-        # Exemplo de tratamento de outros eventos
-        # Normalmente usado para logar ou sincronizar o status no seu sistema
-        print(f"🔔 EVENTO: Pedido {payload.id} confirmado no iFood. Atualizar status no ERP.")
-    
+        # O status já foi atualizado pela máquina de estados acima
+        logger.info("Pedido confirmado na plataforma")
+
     elif payload.code == "ORDER_CANCELED":
-        print(f"❌ EVENTO: Pedido {payload.id} cancelado no iFood. Notificar o restaurante e estornar.")
+        logger.warning("Pedido cancelado na plataforma; notificar o restaurante e estornar")
+
+
+async def webhook_raw_job_handler(job_payload: Dict[str, Any]) -> None:
+    """
+    Handler registrado na fila durável para os eventos gravados pelos webhooks (corpo bruto).
+    Jobs sem 'plataforma' vêm do /ifood/webhook; os demais são traduzidos pelo adaptador.
+    """
+    plataforma = job_payload.get("plataforma", PLATFORM_NAME)
+    body = job_payload["body"]
+    # Corpo inválido para o modelo (ValidationError/WebhookRejected) não é transitório: vai para a dead-letter
+    if plataforma == PLATFORM_NAME:
+        events = [load_event(body)]
+    else:
+        events = get_platform(plataforma).parse_webhook(body.encode("utf-8"))
+    for event in events:
+        payload = IfoodWebhookPayload(**event)
+        with bind(plataforma=plataforma, code=payload.code, order_id=payload.id, correlation_id=payload.correlationId), stage("route"):
+            await _route_webhook_event(
+                payload,
+                get_integracoes_repository(),
+                get_order_queue(),
+                get_webhook_deduplicator(),
+                plataforma
+            )
+
+
+# -----------------------------------------------------------
+# ENDPOINT 6: /webhook/batch (RECEBE VÁRIOS EVENTOS DE UMA VEZ)
+# -----------------------------------------------------------
+@router.post("/webhook/batch", status_code=status.HTTP_200_OK, summary="Recebe um lote de eventos do iFood (replay de backlog, redes com muitas lojas)")
+async def ifood_webhook_batch_receiver(
+    request: Request,
+    x_ifood_signature: Optional[str] = Header(None),
+    integracoes: IntegracoesRepository = Depends(get_integracoes_repository),
+    order_queue: OrderQueue = Depends(get_order_queue),
+    deduplicator: WebhookDeduplicator = Depends(get_webhook_deduplicator)
+):
+    """
+    Versão em lote do /webhook: resolve todos os merchantIds de uma vez, deduplica o lote num
+    único upsert, agrupa os eventos por restaurante e grava UM job de lote por restaurante.
+    Como no /webhook, a assinatura (X-IFood-Signature) é conferida sobre o corpo bruto antes do parse.
+    """
+    # 0. ASSINATURA + PARSE DO LOTE
+    body = await request.body()
+    try:
+        decode_body(body)
+        verify_signature(body, x_ifood_signature)
+        events = parse_batch(body)
+    except WebhookRejected as e:
+        logger.warning("Lote de webhooks recusado", extra={"reason": e.reason})
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    try:
+        payloads = [IfoodWebhookPayload(**event) for event in events]
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    # 1. RESOLVE TODOS OS IDS EXTERNOS (uma única query para os desconhecidos)
+    merchant_ids = [p.metadata.get("merchantId") for p in payloads if p.metadata.get("merchantId")]
+    resolved = await merchant_index.resolve_many(merchant_ids, PLATFORM_NAME, integracoes)
+
+    unmapped = 0
+    mapped: List[Tuple[str, IfoodWebhookPayload]] = []
+    for payload in payloads:
+        restaurante_id_mestre = resolved.get(payload.metadata.get("merchantId"))
+        if not restaurante_id_mestre:
+            unmapped += 1
+            continue
+        mapped.append((restaurante_id_mestre, payload))
+
+    # 2. DEDUPLICA, AGRUPA POR RESTAURANTE E ENFILEIRA
+    try:
+        summary = await ingest_mapped_events(mapped, deduplicator, order_queue)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Falha ao enfileirar o lote de pedidos: {str(e)}"
+        )
+
+    return {"received": len(payloads), "unmapped": unmapped, **summary}
+
+
+# -----------------------------------------------------------
+# ENDPOINT 7: /queue/dead (DEAD-LETTER DA FILA DE PEDIDOS)
+# -----------------------------------------------------------
+@router.get("/queue/dead", summary="Lista os jobs de pedidos que esgotaram as tentativas (dead-letter)")
+async def list_dead_letter_jobs(
+    limit: int = Query(100, ge=1, le=1000),
+    order_queue: OrderQueue = Depends(get_order_queue)
+):
+    return await order_queue.dead_letters(limit)
+
+
+@router.post("/queue/dead/{job_id}/retry", summary="Devolve um job da dead-letter para a fila")
+async def retry_dead_letter_job(
+    job_id: int,
+    order_queue: OrderQueue = Depends(get_order_queue)
+):
+    if not await order_queue.retry_dead(job_id):
+        raise HTTPException(status_code=404, detail="Job não encontrado na dead-letter.")
+    return {"message": f"Job {job_id} devolvido para a fila."}
+
+
+# -----------------------------------------------------------
+# ENDPOINT 8: /orders (PEDIDOS GRAVADOS, PARA O MONITOR)
+# -----------------------------------------------------------
+@router.get("/orders", summary="Lista os pedidos gravados do restaurante (opcionalmente por status)")
+async def list_orders(
+    restaurante_id: str = Query(..., description=f"ID Mestre (UUID) do restaurante. Ex: {TESTE_RESTAURANTE_UUID}"),
+    order_status: Optional[str] = Query(None, alias="status", description="pending, confirmed, preparing, shipped, delivered ou cancelled"),
+    limit: int = Query(50, ge=1, le=500),
+    include_payload: bool = Query(False, description="Inclui o payload completo do iFood (mais lento)"),
+    pedidos: PedidosRepository = Depends(get_pedidos_repository)
+):
+    """Leitura rápida pelas colunas normalizadas; o JSON completo do iFood só quando pedido."""
+    try:
+        return await pedidos.list_recent(restaurante_id, order_status, limit, include_payload)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao buscar pedidos: {str(e)}")
+
+
+@router.get("/orders/counters", summary="Contagem de pedidos por status (em memória, sem consultar o banco)")
+async def get_order_counters(
+    restaurante_id: str = Query(..., description=f"ID Mestre (UUID) do restaurante. Ex: {TESTE_RESTAURANTE_UUID}")
+):
+    """
+    Contadores do monitor. Status ativos refletem os pedidos em andamento; delivered e
+    cancelled contam as transições desde o início do processo.
+    """
+    return {"restaurante_id": restaurante_id, "counters": order_state.counters(restaurante_id)}
+
+
+# -----------------------------------------------------------
+# ENDPOINT 9: /orders/stream (EVENTOS DE PEDIDOS EM TEMPO REAL, SSE)
+# -----------------------------------------------------------
+@router.get("/orders/stream", summary="Stream (Server-Sent Events) dos eventos de pedidos de um restaurante")
+async def stream_order_events(
+    restaurante_id: str = Query(..., description=f"ID Mestre (UUID) do restaurante. Ex: {TESTE_RESTAURANTE_UUID}"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Substitui o polling do monitor: o navegador (EventSource) recebe cada evento de pedido assim
+    que o webhook/polling o registra ou o worker confirma o pedido. Ao reconectar, o EventSource
+    envia Last-Event-ID e recebe os eventos recentes que perdeu.
+    """
+    resume_from = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscription = order_event_broker.subscribe(restaurante_id, resume_from)
+
+    async def frames():
+        # Se o cliente desconectar, o StreamingResponse cancela o gerador (e o finally limpa)
+        try:
+            # Orienta o EventSource a reconectar rápido se a conexão cair
+            yield b"retry: 2000\n\n"
+            while True:
+                frame = await subscription.next_frame(ORDER_STREAM_HEARTBEAT_SECONDS)
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            order_event_broker.unsubscribe(subscription)
 
-    # 4. RESPOSTA RÁPIDA OBRIGATÓRIA
-    # Retorna 200 OK imediatamente para o iFood.
-    return {"message": f"Webhook {payload.code} recebido e roteado para processamento."}
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
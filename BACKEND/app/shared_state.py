@@ -0,0 +1,436 @@
+# app/shared_state.py
+"""
+Estado compartilhado entre processos (workers do uvicorn, réplicas/pods).
+
+Os caches em memória (tokens, índice de merchants, LRU da deduplicação) continuam sendo o
+caminho quente de cada processo; este módulo acrescenta uma camada comum a todos eles:
+
+- chave/valor com TTL: registro de integração com token válido, mapeamento
+  merchantId -> restaurante_id e chaves de eventos já vistos;
+- lock distribuído: só UM processo renova o token de um restaurante (o refresh token do
+  iFood é rotacionado; duas renovações simultâneas invalidariam uma à outra);
+- pub/sub de invalidação: quando um processo troca tokens ou mapeamentos (Passo 2, nova
+  autorização), os demais descartam a cópia local.
+
+Backends (STATE_BACKEND_URL):
+- vazio (padrão): em memória, só o processo atual. Equivale ao comportamento de um worker
+  único; os locks são locks do asyncio.
+- redis://host:6379/0 (ou rediss://): qualquer servidor que fale o protocolo do Redis
+  (Redis, Valkey, KeyDB, Dragonfly). Depende do pacote opcional 'redis' (redis.asyncio).
+  Localmente: `docker run -p 6379:6379 redis:7`.
+
+Falhas do backend não derrubam requisições: leituras viram miss (cai no banco), gravações
+são ignoradas e a deduplicação aceita o evento (fail-open, a tabela webhook_eventos continua
+sendo a garantia). O lock é a exceção: sem ele duas réplicas renovariam o mesmo refresh
+token, então uma falha ou espera esgotada levanta LockUnavailable (a renovação falha e é
+tentada de novo) e, enquanto está com o lock, o processo estende a validade dele.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+import weakref
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set
+
+from .metrics import registry
+
+try:  # Backend compartilhado depende do pacote opcional 'redis'
+    import redis.asyncio as redis_asyncio
+    from redis.exceptions import LockError, RedisError
+except ImportError:
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKEND_URL = os.getenv("STATE_BACKEND_URL", "")
+STATE_KEY_PREFIX = os.getenv("STATE_KEY_PREFIX", "restaurante-api:")
+# Validade do lock (se o processo morrer segurando) e espera máxima para obtê-lo
+STATE_LOCK_TIMEOUT_SECONDS = float(os.getenv("STATE_LOCK_TIMEOUT_SECONDS", "30"))
+STATE_LOCK_WAIT_SECONDS = float(os.getenv("STATE_LOCK_WAIT_SECONDS", "35"))
+# Backend em memória: intervalo da limpeza das chaves vencidas e máximo de chaves guardadas
+STATE_MEMORY_SWEEP_SECONDS = float(os.getenv("STATE_MEMORY_SWEEP_SECONDS", "60"))
+STATE_MEMORY_MAX_KEYS = int(os.getenv("STATE_MEMORY_MAX_KEYS", "100000"))
+STATE_POOL_SIZE = int(os.getenv("STATE_POOL_SIZE", "50"))
+STATE_POOL_TIMEOUT_SECONDS = float(os.getenv("STATE_POOL_TIMEOUT_SECONDS", "5"))
+
+INVALIDATION_CHANNEL = "invalidate"
+# Identifica este processo nas mensagens de invalidação (não reaplica as próprias)
+INSTANCE_ID = uuid.uuid4().hex
+
+OPERATIONS = registry.counter(
+    "shared_state_operations_total",
+    "Operações no backend de estado compartilhado por tipo e resultado (ok, error).",
+    labelnames=("operation", "result"),
+)
+LOCK_WAIT_SECONDS = registry.histogram(
+    "shared_state_lock_wait_seconds",
+    "Espera para obter um lock distribuído (renovação de token).",
+)
+INVALIDATIONS = registry.counter(
+    "shared_state_invalidations_total",
+    "Mensagens de invalidação por cache e direção (sent, received).",
+    labelnames=("cache", "direction"),
+)
+LOCK_EXTENSIONS = registry.counter(
+    "shared_state_lock_extensions_total",
+    "Extensões da validade de locks distribuídos durante renovações longas, por resultado (ok, lost).",
+    labelnames=("result",),
+)
+
+
+class LockUnavailable(Exception):
+    """O lock distribuído não foi obtido (backend fora ou espera esgotada)."""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"Lock '{name}' indisponível: {reason}")
+        self.name = name
+
+
+# cache -> função que descarta a cópia local; recebe as partes da chave
+InvalidationHandler = Callable[[List[str]], None]
+_invalidation_handlers: Dict[str, InvalidationHandler] = {}
+
+
+class StateBackend(ABC):
+    name = ""
+    # False: só este processo enxerga os dados (os caches locais já bastam)
+    shared = False
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        """Valor (JSON) da chave ou None."""
+
+    @abstractmethod
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        pass
+
+    @abstractmethod
+    async def add_many(self, keys: Iterable[str], ttl_seconds: float) -> Set[str]:
+        """Grava as chaves que ainda não existem (SET NX) e retorna as que foram gravadas."""
+
+    async def add(self, key: str, ttl_seconds: float) -> bool:
+        return key in await self.add_many([key], ttl_seconds)
+
+    @abstractmethod
+    def lock(self, name: str) -> "AsyncIterator[None]":
+        """Context manager assíncrono: lock exclusivo entre todos os processos do backend."""
+
+    @abstractmethod
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    name = "memory"
+
+    def __init__(self, max_keys: int = STATE_MEMORY_MAX_KEYS, sweep_seconds: float = STATE_MEMORY_SWEEP_SECONDS):
+        self.max_keys = max_keys
+        self.sweep_seconds = sweep_seconds
+        # Em ordem de gravação: acima de max_keys saem as mais antigas
+        self._values: Dict[str, tuple] = {}
+        # Lock só vive enquanto alguém o segura (ou espera por ele)
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._next_sweep = time.monotonic() + sweep_seconds
+
+    def _alive(self, key: str) -> bool:
+        entry = self._values.get(key)
+        if entry is None:
+            return False
+        if entry[0] < time.monotonic():
+            del self._values[key]
+            return False
+        return True
+
+    def _store(self, key: str, ttl_seconds: float, value: Any) -> None:
+        now = time.monotonic()
+        self._values.pop(key, None)
+        self._values[key] = (now + ttl_seconds, value)
+        if now >= self._next_sweep:
+            # Chaves vencidas que ninguém mais leu (a leitura já descarta as que encontra)
+            self._next_sweep = now + self.sweep_seconds
+            for expired in [k for k, (expires_at, _) in self._values.items() if expires_at < now]:
+                del self._values[expired]
+        while len(self._values) > self.max_keys:
+            del self._values[next(iter(self._values))]
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._values[key][1] if self._alive(key) else None
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        self._store(key, ttl_seconds, value)
+
+    async def delete(self, key: str) -> None:
+        self._values.pop(key, None)
+
+    async def add_many(self, keys: Iterable[str], ttl_seconds: float) -> Set[str]:
+        added = set()
+        for key in keys:
+            if not self._alive(key):
+                self._store(key, ttl_seconds, True)
+                added.add(key)
+        return added
+
+    @asynccontextmanager
+    async def lock(self, name: str) -> AsyncIterator[None]:
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks[name] = asyncio.Lock()
+        async with lock:
+            yield
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        # Um único processo: quem invalidou já descartou a própria cópia
+        pass
+
+
+class RedisStateBackend(StateBackend):
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, prefix: str = STATE_KEY_PREFIX):
+        self.url = url
+        self.prefix = prefix
+        # Pool bloqueante: com todas as conexões em uso, espera uma liberar (o ConnectionPool
+        # padrão do redis-py levanta "Too many connections" na hora)
+        pool = redis_asyncio.BlockingConnectionPool.from_url(
+            url, max_connections=STATE_POOL_SIZE, timeout=STATE_POOL_TIMEOUT_SECONDS, decode_responses=True
+        )
+        self._client = redis_asyncio.Redis(connection_pool=pool)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self._client.ping()
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen(), name="shared-state-invalidations")
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self._client.aclose()
+
+    async def _call(self, operation: str, fn: Callable[[], Any], fallback: Any) -> Any:
+        try:
+            result = await fn()
+        except (RedisError, OSError) as e:
+            OPERATIONS.inc(operation=operation, result="error")
+            logger.warning("Falha no backend de estado compartilhado", extra={"operation": operation, "error": str(e)})
+            return fallback
+        OPERATIONS.inc(operation=operation, result="ok")
+        return result
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._call("get", lambda: self._client.get(self.prefix + key), None)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl_seconds: float) -> None:
+        if ttl_seconds <= 0:
+            return
+        await self._call("set", lambda: self._client.set(
+            self.prefix + key, json.dumps(value, default=str), px=int(ttl_seconds * 1000)
+        ), None)
+
+    async def delete(self, key: str) -> None:
+        await self._call("delete", lambda: self._client.delete(self.prefix + key), None)
+
+    async def add_many(self, keys: Iterable[str], ttl_seconds: float) -> Set[str]:
+        keys = list(keys)
+        if not keys:
+            return set()
+
+        async def pipeline() -> List[Any]:
+            async with self._client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.set(self.prefix + key, "1", nx=True, px=int(ttl_seconds * 1000))
+                return await pipe.execute()
+
+        # Indisponível: todas contam como novas (a tabela de deduplicação decide)
+        results = await self._call("add", pipeline, [True] * len(keys))
+        return {key for key, added in zip(keys, results) if added}
+
+    @asynccontextmanager
+    async def lock(self, name: str) -> AsyncIterator[None]:
+        lock = self._client.lock(
+            self.prefix + "lock:" + name,
+            timeout=STATE_LOCK_TIMEOUT_SECONDS,
+            blocking_timeout=STATE_LOCK_WAIT_SECONDS,
+            sleep=0.02,
+        )
+        started = time.perf_counter()
+        try:
+            acquired = await lock.acquire()
+        except (RedisError, OSError) as e:
+            OPERATIONS.inc(operation="lock", result="error")
+            raise LockUnavailable(name, str(e)) from e
+        finally:
+            LOCK_WAIT_SECONDS.observe(time.perf_counter() - started)
+        if not acquired:
+            OPERATIONS.inc(operation="lock", result="error")
+            raise LockUnavailable(name, f"espera maior que {STATE_LOCK_WAIT_SECONDS:.0f}s")
+        OPERATIONS.inc(operation="lock", result="ok")
+
+        keeper = asyncio.create_task(self._keep_lock(lock, name), name=f"shared-state-lock-{name}")
+        try:
+            yield
+        finally:
+            keeper.cancel()
+            try:
+                await keeper
+            except asyncio.CancelledError:
+                pass
+            try:
+                await lock.release()
+            except (LockError, RedisError, OSError):
+                # Expirou apesar das extensões (processo parado) ou a conexão caiu
+                logger.warning("Lock distribuído expirou antes da liberação", extra={"lock": name})
+
+    async def _keep_lock(self, lock: Any, name: str) -> None:
+        """Devolve a validade cheia ao lock a cada 1/3 dela, enquanto o dono ainda o usa."""
+        while True:
+            await asyncio.sleep(STATE_LOCK_TIMEOUT_SECONDS / 3)
+            try:
+                await lock.reacquire()
+            except (LockError, RedisError, OSError) as e:
+                # Sem o lock outra réplica pode renovar junto; não há como desfazer a chamada em curso
+                LOCK_EXTENSIONS.inc(result="lost")
+                logger.error("Não foi possível estender o lock distribuído", extra={"lock": name, "error": str(e)})
+                return
+            LOCK_EXTENSIONS.inc(result="ok")
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await self._call("publish", lambda: self._client.publish(self.prefix + channel, json.dumps(message)), None)
+
+    async def _listen(self) -> None:
+        channel = self.prefix + INVALIDATION_CHANNEL
+        while True:
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        _apply_invalidation(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                # Perdeu a conexão: os caches locais podem ficar desatualizados até voltar
+                logger.error("Assinatura de invalidações caiu; reconectando", extra={"error": str(e)})
+                await pubsub.aclose()
+                await asyncio.sleep(1)
+
+
+# -----------------------------------------------------------
+# INVALIDAÇÃO ENTRE PROCESSOS
+# -----------------------------------------------------------
+def on_invalidation(cache: str, handler: InvalidationHandler) -> None:
+    """Registra quem descarta a cópia local de `cache` quando outro processo invalida uma chave."""
+    _invalidation_handlers[cache] = handler
+
+
+def _apply_invalidation(message: Dict[str, Any]) -> None:
+    if message.get("origin") == INSTANCE_ID:
+        return
+    cache = message.get("cache")
+    handler = _invalidation_handlers.get(cache)
+    if handler is None:
+        return
+    INVALIDATIONS.inc(cache=cache, direction="received")
+    try:
+        handler(message.get("key") or [])
+    except Exception:
+        logger.exception("Erro ao aplicar invalidação", extra={"cache": cache})
+
+
+_pending: Set[asyncio.Task] = set()
+
+
+def broadcast_invalidation(cache: str, *key: str, shared_key: Optional[str] = None) -> None:
+    """
+    Avisa os outros processos (sem esperar): chamado pelos `invalidate`/`put` síncronos dos
+    caches locais. Com `shared_key`, apaga antes a cópia compartilhada, para que quem receber
+    o aviso não leia o valor antigo de volta. Sem backend compartilhado ou fora do event
+    loop, não faz nada.
+    """
+    backend = _backend
+    if backend is None or not backend.shared:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    INVALIDATIONS.inc(cache=cache, direction="sent")
+
+    async def send() -> None:
+        if shared_key is not None:
+            await backend.delete(shared_key)
+        await backend.publish(INVALIDATION_CHANNEL, {"origin": INSTANCE_ID, "cache": cache, "key": list(key)})
+
+    task = loop.create_task(send())
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+# -----------------------------------------------------------
+# CICLO DE VIDA
+# -----------------------------------------------------------
+_backend: Optional[StateBackend] = None
+
+
+def _build_backend(url: str) -> StateBackend:
+    if not url:
+        return MemoryStateBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        if redis_asyncio is None:
+            raise RuntimeError("STATE_BACKEND_URL aponta para Redis, mas o pacote 'redis' não está instalado.")
+        return RedisStateBackend(url)
+    raise RuntimeError(f"STATE_BACKEND_URL não suportada: {url}")
+
+
+def get_state_backend() -> StateBackend:
+    global _backend
+    if _backend is None:
+        _backend = _build_backend(STATE_BACKEND_URL)
+    return _backend
+
+
+async def start_state_backend() -> StateBackend:
+    """Conecta ao backend e assina as invalidações. Chamado no startup (lifespan)."""
+    backend = get_state_backend()
+    await backend.start()
+    logger.info("Backend de estado compartilhado pronto", extra={"backend": backend.name})
+    return backend
+
+
+async def flush_invalidations() -> None:
+    """Espera as invalidações já disparadas chegarem ao backend."""
+    if _pending:
+        await asyncio.gather(*list(_pending), return_exceptions=True)
+
+
+async def stop_state_backend() -> None:
+    global _backend
+    await flush_invalidations()
+    if _backend is not None:
+        await _backend.stop()
+        _backend = None
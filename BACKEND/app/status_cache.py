@@ -0,0 +1,141 @@
+# app/status_cache.py
+"""
+Cache curto e coalescido para o status das lojas (/ifood/merchant/status).
+
+Cada dashboard aberto consulta o status periodicamente; sem cache, N operadores olhando a
+mesma loja geram N chamadas idênticas ao iFood. Aqui:
+
+- requisições simultâneas para a mesma loja compartilham UMA busca (coalescing);
+- o resultado vale por MERCHANT_STATUS_CACHE_TTL_SECONDS;
+- depois disso, e por até MERCHANT_STATUS_STALE_SECONDS, o valor antigo ainda é servido
+  enquanto uma única busca em segundo plano o atualiza (stale-while-revalidate).
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+MERCHANT_STATUS_CACHE_TTL_SECONDS = float(os.getenv("MERCHANT_STATUS_CACHE_TTL_SECONDS", "5"))
+MERCHANT_STATUS_STALE_SECONDS = float(os.getenv("MERCHANT_STATUS_STALE_SECONDS", "30"))
+MERCHANT_STATUS_CACHE_MAX_ENTRIES = int(os.getenv("MERCHANT_STATUS_CACHE_MAX_ENTRIES", "10000"))
+
+FetchFn = Callable[[], Awaitable[Any]]
+
+STATUS_REQUESTS = registry.counter(
+    "merchant_status_cache_requests_total",
+    "Leituras de status de loja por resultado (hit, stale, coalesced, miss).",
+    labelnames=("result",),
+)
+STATUS_REVALIDATIONS = registry.counter(
+    "merchant_status_cache_revalidations_total",
+    "Atualizações em segundo plano de status vencidos por resultado (success, failure).",
+    labelnames=("result",),
+)
+
+
+class CoalescingCache:
+    def __init__(
+        self,
+        ttl_seconds: float = MERCHANT_STATUS_CACHE_TTL_SECONDS,
+        stale_seconds: float = MERCHANT_STATUS_STALE_SECONDS,
+        max_entries: int = MERCHANT_STATUS_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        # chave -> (instante monotônico da busca, valor)
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def get(self, key: Hashable, fetch_fn: FetchFn) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, value = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl_seconds:
+                STATUS_REQUESTS.inc(result="hit")
+                return value
+            if age < self.ttl_seconds + self.stale_seconds:
+                # Serve o valor antigo e atualiza em segundo plano (uma vez só por chave)
+                STATUS_REQUESTS.inc(result="stale")
+                if key not in self._inflight:
+                    self._start_fetch(key, fetch_fn).add_done_callback(self._log_revalidation)
+                return value
+
+        if key in self._inflight:
+            STATUS_REQUESTS.inc(result="coalesced")
+            task = self._inflight[key]
+        else:
+            STATUS_REQUESTS.inc(result="miss")
+            task = self._start_fetch(key, fetch_fn)
+        # shield: se o cliente desconectar, a busca compartilhada continua para os demais
+        return await asyncio.shield(task)
+
+    def _start_fetch(self, key: Hashable, fetch_fn: FetchFn) -> asyncio.Task:
+        task = asyncio.create_task(self._fetch(key, fetch_fn))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _fetch(self, key: Hashable, fetch_fn: FetchFn) -> Any:
+        value = await fetch_fn()
+        self._put(key, value)
+        return value
+
+    def _put(self, key: Hashable, value: Any) -> None:
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            self._prune()
+        self._entries[key] = (time.monotonic(), value)
+
+    def _prune(self) -> None:
+        """Remove entradas além da janela stale; se ainda estiver cheio, as mais antigas."""
+        horizon = time.monotonic() - self.ttl_seconds - self.stale_seconds
+        for key in [key for key, (fetched_at, _) in self._entries.items() if fetched_at < horizon]:
+            del self._entries[key]
+        while len(self._entries) >= self.max_entries:
+            oldest = min(self._entries, key=lambda key: self._entries[key][0])
+            del self._entries[oldest]
+
+    @staticmethod
+    def _log_revalidation(task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            STATUS_REVALIDATIONS.inc(result="success")
+        else:
+            # O valor antigo continua sendo servido até vencer a janela stale
+            STATUS_REVALIDATIONS.inc(result="failure")
+            logger.warning("Erro ao atualizar status em segundo plano", extra={"error": getattr(error, "detail", str(error))})
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+merchant_status_cache = CoalescingCache()
+
+
+def _hit_ratio() -> Dict[Tuple[str, ...], float]:
+    served = sum(STATUS_REQUESTS.get(result=result) for result in ("hit", "stale", "coalesced"))
+    total = served + STATUS_REQUESTS.get(result="miss")
+    return {(): served / total if total else 0.0}
+
+
+registry.callback_gauge(
+    "merchant_status_cache_entries",
+    "Status de lojas atualmente em cache.",
+    lambda: {(): len(merchant_status_cache)},
+)
+registry.callback_gauge(
+    "merchant_status_cache_hit_ratio",
+    "Fração das leituras de status que não geraram chamada ao iFood (hit, stale ou coalesced).",
+    _hit_ratio,
+)
@@ -1,18 +1,49 @@
 # app/supabase_client.py
-from dotenv import load_dotenv
+"""
+Cliente Supabase criado sob demanda, na primeira chamada de get_client() (normalmente o
+init_repositories() do lifespan), e não na importação do módulo.
+
+Importar a aplicação não exige SUPABASE_URL/SUPABASE_KEY nem paga o import do supabase-py
+(a maior parte do tempo de import do app.main), o que encurta o cold start dos pods e permite
+importar os módulos (e injetar outro cliente via init_repositories) sem credenciais.
+"""
 import os
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+_client: Optional["Client"] = None
+_client_lock = threading.Lock()
+
+
+def _credentials() -> Tuple[str, str]:
+    # O .env só é lido aqui, ao criar o cliente: importar o módulo não altera o os.environ
+    load_dotenv()
+    # tenta nomes comuns e faz fallback
+    url = os.getenv("SUPABASE_URL") or os.getenv("URL")
+    key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY") or os.getenv("KEY")
+    if not url or not key:
+        raise RuntimeError("SUPABASE_URL e SUPABASE_KEY não configurados. Verifique o .env")
+    return url, key
 
-load_dotenv()
 
-# tenta nomes comuns e faz fallback
-SUPABASE_URL = os.getenv("SUPABASE_URL") or os.getenv("URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY") or os.getenv("KEY")
+def get_client() -> "Client":
+    global _client
+    if _client is None:
+        # Pode ser chamada do pool de threads dos repositórios: cria um único cliente
+        with _client_lock:
+            if _client is None:
+                from supabase import create_client
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("SUPABASE_URL e SUPABASE_KEY não configurados. Verifique o .env")
+                _client = create_client(*_credentials())
+    return _client
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def get_client() -> Client:
-    return supabase
+def close_client() -> None:
+    """Descarta o cliente (shutdown); a próxima chamada de get_client() cria outro."""
+    global _client
+    _client = None
@@ -0,0 +1,112 @@
+# app/token_cache.py
+"""
+Cache em memória dos registros de integração (restaurante_integracoes) por
+(restaurante_id, plataforma), com um lock por chave para que apenas UMA renovação de
+token aconteça por restaurante enquanto as demais requisições aguardam o resultado.
+
+Com um backend compartilhado (shared_state.py) o registro também fica lá, visível para os
+outros workers/réplicas, e `invalidate` avisa os demais processos.
+"""
+import asyncio
+import weakref
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import registry
+from .shared_state import broadcast_invalidation, get_state_backend, on_invalidation
+
+TokenKey = Tuple[str, str]
+
+DEFAULT_EXPIRES_IN_SECONDS = 600
+
+CACHE_REQUESTS = registry.counter(
+    "token_cache_requests_total",
+    "Consultas ao cache de tokens por resultado (hit, coalesced, shared_hit, miss).",
+    labelnames=("result",),
+)
+TOKEN_REFRESHES = registry.counter(
+    "token_refresh_total",
+    "Renovações de token junto à plataforma por resultado (success, failure).",
+    labelnames=("result",),
+)
+
+
+def token_expiration(record: Dict[str, Any]) -> datetime:
+    """Calcula o instante de expiração do access_token a partir de created_at + token_expires_in."""
+    created_at_iso = record.get("created_at")
+    try:
+        # Pega a data da última atualização do token.
+        token_created_time = datetime.fromisoformat(created_at_iso.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        token_created_time = datetime.now(timezone.utc)
+
+    expires_in_seconds = record.get("token_expires_in") or DEFAULT_EXPIRES_IN_SECONDS
+    return token_created_time + timedelta(seconds=expires_in_seconds)
+
+
+class TokenCache:
+    def __init__(self):
+        self._entries: Dict[TokenKey, Tuple[datetime, Dict[str, Any]]] = {}
+        # A chave vem da query string: o lock só vive enquanto alguém o segura (ou espera por ele)
+        self._locks: "weakref.WeakValueDictionary[TokenKey, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def get(self, key: TokenKey, min_ttl_seconds: float) -> Optional[Dict[str, Any]]:
+        """Retorna uma cópia do registro se o token ainda for válido por pelo menos `min_ttl_seconds`."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, record = entry
+        if expires_at < datetime.now(timezone.utc) + timedelta(seconds=min_ttl_seconds):
+            return None
+        return dict(record)
+
+    def put(self, key: TokenKey, record: Dict[str, Any]) -> None:
+        self._entries[key] = (token_expiration(record), dict(record))
+
+    def invalidate(self, key: TokenKey) -> None:
+        self.invalidate_local(key)
+        broadcast_invalidation("token", *key, shared_key=_shared_key(key))
+
+    def invalidate_local(self, key: TokenKey) -> None:
+        self._entries.pop(key, None)
+
+    async def get_shared(self, key: TokenKey, min_ttl_seconds: float) -> Optional[Dict[str, Any]]:
+        """Registro deixado por outro processo no backend compartilhado (e copiado para este)."""
+        backend = get_state_backend()
+        if not backend.shared:
+            return None
+        record = await backend.get(_shared_key(key))
+        if record is None:
+            return None
+        self.put(key, record)
+        return self.get(key, min_ttl_seconds)
+
+    async def put_shared(self, key: TokenKey, record: Dict[str, Any]) -> None:
+        self.put(key, record)
+        backend = get_state_backend()
+        if backend.shared:
+            ttl = (token_expiration(record) - datetime.now(timezone.utc)).total_seconds()
+            await backend.set(_shared_key(key), record, ttl)
+
+    def lock(self, key: TokenKey) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _shared_key(key: TokenKey) -> str:
+    return f"token:{key[0]}:{key[1]}"
+
+
+token_cache = TokenCache()
+on_invalidation("token", lambda key: token_cache.invalidate_local((key[0], key[1])))
+
+registry.callback_gauge(
+    "token_cache_entries",
+    "Registros de integração atualmente em cache.",
+    lambda: {(): len(token_cache)},
+)
@@ -0,0 +1,235 @@
+# app/token_refresher.py
+"""
+Renovação proativa de tokens em segundo plano.
+
+Varre periodicamente os registros autorizados de restaurante_integracoes, agenda cada um
+num heap ordenado pelo horário de expiração e renova o token ANTES de vencer (com jitter e
+concorrência limitada), para que o processamento de pedidos nunca espere uma renovação.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .metrics import registry
+from .platforms import uses_refresh_token
+from .token_cache import TokenKey, token_cache, token_expiration
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REFRESHER_ENABLED = os.getenv("TOKEN_REFRESHER_ENABLED", "1") != "0"
+TOKEN_REFRESH_LEAD_SECONDS = float(os.getenv("TOKEN_REFRESH_LEAD_SECONDS", "120"))
+TOKEN_REFRESH_JITTER_SECONDS = float(os.getenv("TOKEN_REFRESH_JITTER_SECONDS", "20"))
+TOKEN_REFRESH_CONCURRENCY = int(os.getenv("TOKEN_REFRESH_CONCURRENCY", "5"))
+TOKEN_REFRESH_RESCAN_SECONDS = float(os.getenv("TOKEN_REFRESH_RESCAN_SECONDS", "300"))
+TOKEN_REFRESH_RETRY_SECONDS = float(os.getenv("TOKEN_REFRESH_RETRY_SECONDS", "30"))
+
+# refresh_fn(restaurante_id, plataforma, margem_em_segundos) -> registro atualizado
+RefreshFn = Callable[[str, str, float], Awaitable[Dict[str, Any]]]
+# list_fn() -> registros autorizados de restaurante_integracoes
+ListFn = Callable[[], Awaitable[List[Dict[str, Any]]]]
+
+REFRESH_SECONDS = registry.histogram(
+    "token_refresher_refresh_seconds",
+    "Latência das renovações proativas de token.",
+)
+REFRESH_TOTAL = registry.counter(
+    "token_refresher_refresh_total",
+    "Renovações proativas por resultado (success, failure).",
+    labelnames=("result",),
+)
+SCAN_FAILURES = registry.counter(
+    "token_refresher_scan_failures_total",
+    "Falhas ao varrer restaurante_integracoes em busca de tokens a renovar.",
+)
+
+
+class TokenRefresher:
+    def __init__(
+        self,
+        refresh_fn: RefreshFn,
+        list_fn: ListFn,
+        lead_seconds: float = TOKEN_REFRESH_LEAD_SECONDS,
+        jitter_seconds: float = TOKEN_REFRESH_JITTER_SECONDS,
+        concurrency: int = TOKEN_REFRESH_CONCURRENCY,
+        rescan_seconds: float = TOKEN_REFRESH_RESCAN_SECONDS,
+        retry_seconds: float = TOKEN_REFRESH_RETRY_SECONDS,
+    ):
+        self._refresh_fn = refresh_fn
+        self._list_fn = list_fn
+        self.lead_seconds = lead_seconds
+        self.jitter_seconds = jitter_seconds
+        self.rescan_seconds = rescan_seconds
+        self.retry_seconds = retry_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # Heap de (instante_da_renovação, chave). Entradas antigas são ignoradas via self._due.
+        self._heap: List[Tuple[float, TokenKey]] = []
+        self._due: Dict[TokenKey, float] = {}
+        self._in_flight: Set[TokenKey] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Renovações em andamento: referência forte (não são coletadas no meio) e canceladas no stop()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self._next_scan = 0.0
+
+    # -------------------------------------------------------
+    # AGENDAMENTO
+    # -------------------------------------------------------
+    def schedule(self, restaurante_id: str, plataforma: str, record: Dict[str, Any]) -> None:
+        """Agenda (ou reagenda) a renovação do token de um restaurante com base no registro."""
+        expires_at = token_expiration(record).timestamp()
+        jitter = random.uniform(0, self.jitter_seconds)
+        self._schedule_at((restaurante_id, plataforma), expires_at - self.lead_seconds - jitter)
+
+    def _schedule_at(self, key: TokenKey, due_at: float) -> None:
+        self._due[key] = due_at
+        heapq.heappush(self._heap, (due_at, key))
+        self._wakeup.set()
+
+    def unschedule(self, restaurante_id: str, plataforma: str) -> None:
+        self._due.pop((restaurante_id, plataforma), None)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._due)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    # -------------------------------------------------------
+    # CICLO DE VIDA
+    # -------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="token-refresher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Nenhuma renovação pode seguir depois que o pool HTTP e os repositórios fecharem
+        tasks = list(self._refresh_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refresh_tasks.clear()
+
+    async def _scan(self) -> None:
+        try:
+            records = await self._list_fn()
+        except Exception as e:
+            SCAN_FAILURES.inc()
+            logger.error("Erro ao varrer integrações para renovação de tokens", extra={"error": str(e)})
+            return
+
+        seen = set()
+        for record in records:
+            key = (record.get("restaurante_id"), record.get("plataforma"))
+            # Rappi e 99Food renovam com client credentials, sem refresh_token
+            if not all(key) or (uses_refresh_token(key[1]) and not record.get("refresh_token")):
+                continue
+            seen.add(key)
+            # Aproveita a varredura para aquecer o cache de tokens ainda válidos
+            if token_expiration(record) > datetime.now(timezone.utc):
+                token_cache.put(key, record)
+            if key not in self._due and key not in self._in_flight:
+                self.schedule(key[0], key[1], record)
+
+        # Integrações desautorizadas deixam de ser renovadas
+        for key in list(self._due):
+            if key not in seen:
+                del self._due[key]
+
+    async def _run(self) -> None:
+        while True:
+            now = time.time()
+            if now >= self._next_scan:
+                await self._scan()
+                self._next_scan = time.time() + self.rescan_seconds
+
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due_at, key = heapq.heappop(self._heap)
+                if self._due.get(key) != due_at:
+                    continue  # entrada obsoleta (reagendada ou removida)
+                del self._due[key]
+                self._in_flight.add(key)
+                task = asyncio.create_task(self._refresh(key), name="token-refresh")
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+
+            next_due = self._heap[0][0] if self._heap else self._next_scan
+            timeout = max(0.0, min(next_due, self._next_scan) - time.time())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh(self, key: TokenKey) -> None:
+        restaurante_id, plataforma = key
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    # Margem = antecedência + jitter: força a renovação agora (via o mesmo
+                    # caminho single-flight de get_valid_integration_record)
+                    record = await self._refresh_fn(
+                        restaurante_id, plataforma, self.lead_seconds + self.jitter_seconds
+                    )
+                except Exception as e:
+                    REFRESH_TOTAL.inc(result="failure")
+                    logger.error("Erro na renovação proativa do token", extra={"restaurante_id": restaurante_id, "plataforma": plataforma, "error": getattr(e, "detail", str(e))})
+                    self._schedule_at(key, time.time() + self.retry_seconds)
+                    return
+                finally:
+                    REFRESH_SECONDS.observe(time.perf_counter() - started)
+
+            REFRESH_TOTAL.inc(result="success")
+            self.schedule(restaurante_id, plataforma, record)
+        finally:
+            self._in_flight.discard(key)
+
+
+_refresher: Optional[TokenRefresher] = None
+
+registry.callback_gauge(
+    "token_refresher_queue_depth",
+    "Integrações aguardando renovação proativa (scheduled) e em renovação (in_flight).",
+    lambda: {
+        ("scheduled",): _refresher.queue_depth if _refresher else 0,
+        ("in_flight",): _refresher.in_flight if _refresher else 0,
+    },
+    labelnames=("state",),
+)
+
+
+def start_token_refresher(refresh_fn: RefreshFn, list_fn: ListFn) -> Optional[TokenRefresher]:
+    """Inicia o agendador (chamado no lifespan). Desligável com TOKEN_REFRESHER_ENABLED=0."""
+    global _refresher
+    if not TOKEN_REFRESHER_ENABLED:
+        return None
+    if _refresher is None:
+        _refresher = TokenRefresher(refresh_fn, list_fn)
+        _refresher.start()
+    return _refresher
+
+
+async def stop_token_refresher() -> None:
+    global _refresher
+    if _refresher is not None:
+        await _refresher.stop()
+        _refresher = None
+
+
+def get_token_refresher() -> Optional[TokenRefresher]:
+    return _refresher
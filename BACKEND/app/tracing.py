@@ -0,0 +1,59 @@
+# app/tracing.py
+"""
+Correlação dos logs e tempo de cada etapa do processamento de pedidos.
+
+- `bind(**campos)`: coloca campos (correlation_id, order_id, restaurante_id, job_id...) no
+  contexto atual; todo log emitido dentro do bloco, inclusive em tasks criadas nele, sai com
+  esses campos (ver logging_config.ContextFilter).
+- `stage(nome)`: mede uma etapa do caminho webhook -> token -> GET do pedido -> confirmação
+  no histograma order_stage_seconds e registra a duração no log (nível DEBUG).
+
+Chamadas ao Supabase e ao iFood já têm histogramas próprios (supabase_query_seconds e
+ifood_http_request_seconds); aqui ficam as etapas de negócio que as agrupam.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+STAGE_SECONDS = registry.histogram(
+    "order_stage_seconds",
+    "Duração de cada etapa do processamento de pedidos (route, token, token_refresh, order_get, persist, confirm), por resultado.",
+    labelnames=("stage", "result"),
+)
+
+
+@contextmanager
+def bind(**fields: Any) -> Iterator[None]:
+    """Acrescenta campos de correlação ao contexto enquanto o bloco roda."""
+    token = _context.set({**_context.get(), **{key: value for key, value in fields.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def current_context() -> Dict[str, Any]:
+    return _context.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    started = time.perf_counter()
+    result = "success"
+    try:
+        yield
+    except BaseException:
+        result = "failure"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name, result=result)
+        logger.debug("Etapa concluída", extra={"stage": name, "result": result, "duration_ms": round(elapsed * 1000, 3)})
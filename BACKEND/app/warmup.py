@@ -0,0 +1,266 @@
+# app/warmup.py
+"""
+Aquecimento dos caches no startup, em segundo plano, e o estado de prontidão (/health/ready).
+
+O lifespan só cria os clientes e inicia os serviços; o aquecimento roda em segundo plano,
+com o servidor já aceitando conexões, e as etapas em paralelo:
+
+- merchant_index: mapeamentos merchantId -> restaurante_id (merchant_index.py);
+- tokens: registros com token válido vão para o token_cache e os que vencem em até
+  WARMUP_TOKEN_MARGIN_SECONDS são renovados já (WARMUP_CONCURRENCY por vez), para que os
+  primeiros pedidos não esperem uma renovação. Usa a mesma leitura de
+  restaurante_integracoes do merchant_index (uma query só);
+- order_state: conjunto quente de pedidos ativos (order_state.py).
+
+Enquanto isso /health/live responde 200 e /health/ready responde 503 com o progresso de cada
+etapa; o orquestrador só manda tráfego quando todas terminarem. Uma etapa que falha ou
+estoura WARMUP_TIMEOUT_SECONDS não segura a prontidão (os caches se completam sob demanda,
+como antes): o relatório mostra a falha e o log registra o erro.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .merchant_index import merchant_index
+from .metrics import registry
+from .order_state import warm_order_state
+from .platforms import uses_refresh_token
+from .repositories import PedidosRepository
+from .token_cache import token_cache, token_expiration
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "60"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "10"))
+WARMUP_TOKEN_MARGIN_SECONDS = float(os.getenv("WARMUP_TOKEN_MARGIN_SECONDS", "300"))
+
+STEP_MERCHANT_INDEX = "merchant_index"
+STEP_TOKENS = "tokens"
+STEP_ORDER_STATE = "order_state"
+WARMUP_STEPS = (STEP_MERCHANT_INDEX, STEP_TOKENS, STEP_ORDER_STATE)
+
+# list_fn() -> registros autorizados de restaurante_integracoes
+ListFn = Callable[[], Awaitable[List[Dict[str, Any]]]]
+# refresh_fn(restaurante_id, plataforma, margem_em_segundos) -> registro atualizado
+RefreshFn = Callable[[str, str, float], Awaitable[Dict[str, Any]]]
+
+STEP_SECONDS = registry.gauge(
+    "warmup_step_seconds",
+    "Duração de cada etapa do aquecimento do startup.",
+    labelnames=("step",),
+)
+STARTUP_SECONDS = registry.gauge(
+    "startup_seconds",
+    "Duração das fases do startup (lifespan: clientes e serviços; warmup: até ficar pronto).",
+    labelnames=("phase",),
+)
+
+
+class WarmupStep:
+    __slots__ = ("name", "status", "total", "done", "failed", "error", "started_at", "finished_at")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = "pending"  # pending, running, done, failed, timeout
+        self.total: Optional[int] = None
+        self.done = 0
+        self.failed = 0
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "timeout")
+
+    def start(self) -> None:
+        self.status = "running"
+        self.started_at = time.monotonic()
+
+    def finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self.finished_at = time.monotonic()
+        if self.started_at is not None:
+            STEP_SECONDS.set(self.finished_at - self.started_at, step=self.name)
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        report = {"status": self.status, "done": self.done, "total": self.total, "seconds": elapsed}
+        if self.failed:
+            report["failed"] = self.failed
+        if self.error:
+            report["error"] = self.error
+        return report
+
+
+class Warmup:
+    def __init__(
+        self,
+        list_fn: ListFn,
+        refresh_fn: RefreshFn,
+        pedidos: PedidosRepository,
+        timeout_seconds: float = WARMUP_TIMEOUT_SECONDS,
+        concurrency: int = WARMUP_CONCURRENCY,
+        token_margin_seconds: float = WARMUP_TOKEN_MARGIN_SECONDS,
+    ):
+        self._list_fn = list_fn
+        self._refresh_fn = refresh_fn
+        self._pedidos = pedidos
+        self.timeout_seconds = timeout_seconds
+        self.token_margin_seconds = token_margin_seconds
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.steps: Dict[str, WarmupStep] = {name: WarmupStep(name) for name in WARMUP_STEPS}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished_at is not None
+
+    # -------------------------------------------------------
+    # ETAPAS
+    # -------------------------------------------------------
+    async def _warm_integrations(self) -> None:
+        merchants, tokens = self.steps[STEP_MERCHANT_INDEX], self.steps[STEP_TOKENS]
+        merchants.start()
+        tokens.start()
+        try:
+            records = await self._list_fn()
+        except Exception as e:
+            merchants.finish("failed", str(e))
+            tokens.finish("failed", str(e))
+            logger.error("Erro ao listar integrações no aquecimento", extra={"error": str(e)})
+            return
+
+        merchants.total = len(records)
+        merchants.done = merchant_index.warm(records)
+        merchants.finish("done")
+        await self._warm_tokens(records)
+
+    async def _warm_tokens(self, records: List[Dict[str, Any]]) -> None:
+        step = self.steps[STEP_TOKENS]
+        due_before = datetime.now(timezone.utc) + timedelta(seconds=self.token_margin_seconds)
+        cached, expiring = [], []
+        for record in records:
+            key = (record.get("restaurante_id"), record.get("plataforma"))
+            if not all(key) or (uses_refresh_token(key[1]) and not record.get("refresh_token")):
+                continue
+            if token_expiration(record) > due_before:
+                token_cache.put(key, record)
+                cached.append(key)
+            else:
+                expiring.append(key)
+        step.done = len(cached)
+        step.total = len(cached) + len(expiring)
+
+        async def refresh(restaurante_id: str, plataforma: str) -> None:
+            async with self._semaphore:
+                try:
+                    await self._refresh_fn(restaurante_id, plataforma, self.token_margin_seconds)
+                    step.done += 1
+                except Exception as e:
+                    step.failed += 1
+                    logger.warning("Erro ao renovar token no aquecimento", extra={
+                        "restaurante_id": restaurante_id, "plataforma": plataforma, "error": str(e),
+                    })
+
+        await asyncio.gather(*(refresh(*key) for key in expiring))
+        step.finish("failed" if step.failed else "done")
+
+    async def _warm_order_state(self) -> None:
+        step = self.steps[STEP_ORDER_STATE]
+        step.start()
+        try:
+            step.done = step.total = await warm_order_state(self._pedidos)
+        except Exception as e:
+            step.finish("failed", str(e))
+            logger.error("Erro ao aquecer a máquina de estados dos pedidos", extra={"error": str(e)})
+            return
+        step.finish("done")
+
+    # -------------------------------------------------------
+    # CICLO DE VIDA
+    # -------------------------------------------------------
+    def start(self) -> None:
+        if self._task is None:
+            self.started_at = time.monotonic()
+            self._task = asyncio.create_task(self._run(), name="warmup")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(self._warm_integrations(), self._warm_order_state()),
+                timeout=self.timeout_seconds,
+            )
+        except asyncio.TimeoutError:
+            for step in self.steps.values():
+                if not step.finished:
+                    step.finish("timeout", f"Aquecimento excedeu {self.timeout_seconds:.0f}s")
+        self.finished_at = time.monotonic()
+        STARTUP_SECONDS.set(self.finished_at - self.started_at, phase="warmup")
+        logger.info("Aquecimento concluído", extra={
+            "seconds": round(self.finished_at - self.started_at, 3),
+            **{name: step.status for name, step in self.steps.items()},
+        })
+
+    def report(self) -> Dict[str, Any]:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round((self.finished_at or time.monotonic()) - self.started_at, 3)
+        return {
+            "ready": self.ready,
+            "seconds": elapsed,
+            "steps": {name: step.report() for name, step in self.steps.items()},
+        }
+
+
+_warmup: Optional[Warmup] = None
+
+registry.callback_gauge(
+    "app_ready",
+    "1 quando o aquecimento do startup terminou (a réplica recebe tráfego), 0 caso contrário.",
+    lambda: {(): 1.0 if _warmup is not None and _warmup.ready else 0.0},
+)
+
+
+def record_startup_phase(phase: str, seconds: float) -> None:
+    STARTUP_SECONDS.set(seconds, phase=phase)
+
+
+def start_warmup(list_fn: ListFn, refresh_fn: RefreshFn, pedidos: PedidosRepository) -> Warmup:
+    """Dispara o aquecimento em segundo plano (chamado no lifespan, depois dos serviços)."""
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup(list_fn, refresh_fn, pedidos)
+        _warmup.start()
+    return _warmup
+
+
+async def stop_warmup() -> None:
+    """No shutdown a réplica deixa de estar pronta antes de parar os serviços."""
+    global _warmup
+    if _warmup is not None:
+        warmup, _warmup = _warmup, None
+        await warmup.stop()
+
+
+def warmup_report() -> Dict[str, Any]:
+    if _warmup is None:
+        return {"ready": False, "seconds": None, "steps": {}}
+    return _warmup.report()
@@ -0,0 +1,208 @@
+# app/webhook_dedup.py
+"""
+Deduplicação de eventos de webhook.
+
+O iFood reentrega eventos; sem memória do que já chegou, cada reentrega dispararia de novo
+o GET do pedido e o POST de confirmação. A checagem é feita ANTES de qualquer trabalho ser
+agendado: primeiro num LRU em memória (limitado), depois no backend compartilhado (quando
+configurado: SET NX, visto por todos os workers/réplicas sem ir ao banco) e, se a chave for
+nova, na tabela webhook_eventos (chave única), que continua sendo a garantia durável.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from .metrics import registry
+from .repositories import WebhookEventosRepository, get_webhook_eventos_repository
+from .shared_state import get_state_backend
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_DEDUP_RETENTION_SECONDS = float(os.getenv("WEBHOOK_DEDUP_RETENTION_SECONDS", str(24 * 3600)))
+WEBHOOK_DEDUP_MAX_ENTRIES = int(os.getenv("WEBHOOK_DEDUP_MAX_ENTRIES", "100000"))
+WEBHOOK_DEDUP_PURGE_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_DEDUP_PURGE_INTERVAL_SECONDS", "900"))
+
+EVENTS_CHECKED = registry.counter(
+    "webhook_dedup_events_total",
+    "Eventos checados na deduplicação por resultado (new, duplicate_memory, duplicate_shared, duplicate_table, store_error).",
+    labelnames=("result",),
+)
+
+
+def event_key(code: str, event_id: str, correlation_id: str) -> str:
+    """Chave do evento: o mesmo pedido gera eventos distintos por código (PLACED, CONFIRMED...)."""
+    return f"{code}:{event_id}:{correlation_id}"
+
+
+def _shared_key(key: str) -> str:
+    return f"webhook:{key}"
+
+
+class WebhookDeduplicator:
+    def __init__(
+        self,
+        repository: WebhookEventosRepository,
+        retention_seconds: float = WEBHOOK_DEDUP_RETENTION_SECONDS,
+        max_entries: int = WEBHOOK_DEDUP_MAX_ENTRIES,
+    ):
+        self._repository = repository
+        self.retention_seconds = retention_seconds
+        self.max_entries = max_entries
+        # chave -> instante (monotônico) em que a entrada deixa de valer
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._purge_task: Optional[asyncio.Task] = None
+
+    def _remember(self, key: str) -> None:
+        self._seen[key] = time.monotonic() + self.retention_seconds
+        self._seen.move_to_end(key)
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+
+    def _seen_recently(self, key: str) -> bool:
+        expires_at = self._seen.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._seen[key]
+            return False
+        self._seen.move_to_end(key)
+        return True
+
+    async def register(self, key: str, **columns) -> bool:
+        """
+        Registra o evento. Retorna True se é a primeira vez que ele aparece (deve ser processado)
+        e False se é duplicado. Se a tabela estiver indisponível, aceita o evento (fail-open):
+        preferimos processar duas vezes a perder um pedido.
+        """
+        if self._seen_recently(key):
+            EVENTS_CHECKED.inc(result="duplicate_memory")
+            return False
+        backend = get_state_backend()
+        if backend.shared and not await backend.add(_shared_key(key), self.retention_seconds):
+            EVENTS_CHECKED.inc(result="duplicate_shared")
+            self._remember(key)
+            return False
+
+        row = {"event_key": key, "received_at": datetime.now(timezone.utc).isoformat(), **columns}
+        try:
+            inserted = await self._repository.try_insert(row)
+        except Exception as e:
+            EVENTS_CHECKED.inc(result="store_error")
+            logger.error("Erro ao registrar evento na deduplicação", extra={"event_key": key, "error": str(e)})
+            inserted = True
+
+        self._remember(key)
+        if not inserted:
+            EVENTS_CHECKED.inc(result="duplicate_table")
+            return False
+        EVENTS_CHECKED.inc(result="new")
+        return True
+
+    async def register_many(self, rows: List[Dict[str, Any]]) -> Set[str]:
+        """
+        Versão em lote de register: `rows` traz event_key + colunas. Retorna as chaves inéditas.
+        Chaves repetidas dentro do próprio lote contam como duplicadas.
+        """
+        now_iso = datetime.now(timezone.utc).isoformat()
+        candidates: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            key = row["event_key"]
+            if key in candidates or self._seen_recently(key):
+                EVENTS_CHECKED.inc(result="duplicate_memory")
+                continue
+            candidates[key] = {"received_at": now_iso, **row}
+
+        backend = get_state_backend()
+        if backend.shared and candidates:
+            added = await backend.add_many([_shared_key(key) for key in candidates], self.retention_seconds)
+            for key in [key for key in candidates if _shared_key(key) not in added]:
+                EVENTS_CHECKED.inc(result="duplicate_shared")
+                self._remember(key)
+                del candidates[key]
+
+        try:
+            inserted = set(await self._repository.try_insert_many(list(candidates.values())))
+        except Exception as e:
+            EVENTS_CHECKED.inc(len(candidates), result="store_error")
+            logger.error("Erro ao registrar lote de eventos na deduplicação", extra={"events": len(candidates), "error": str(e)})
+            inserted = set(candidates)
+        else:
+            EVENTS_CHECKED.inc(len(inserted), result="new")
+            EVENTS_CHECKED.inc(len(candidates) - len(inserted), result="duplicate_table")
+
+        for key in candidates:
+            self._remember(key)
+        return inserted
+
+    async def forget(self, key: str) -> None:
+        """Desfaz o registro (ex.: falha ao enfileirar), para que a reentrega do iFood seja aceita."""
+        self._seen.pop(key, None)
+        backend = get_state_backend()
+        if backend.shared:
+            await backend.delete(_shared_key(key))
+        try:
+            await self._repository.delete(key)
+        except Exception as e:
+            logger.error("Erro ao remover evento da deduplicação", extra={"event_key": key, "error": str(e)})
+
+    async def purge_expired(self) -> None:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+        await self._repository.delete_older_than(cutoff.isoformat())
+
+    def start(self) -> None:
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purge_loop(), name="webhook-dedup-purge")
+
+    async def stop(self) -> None:
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            try:
+                await self._purge_task
+            except asyncio.CancelledError:
+                pass
+            self._purge_task = None
+
+    async def _purge_loop(self) -> None:
+        while True:
+            await asyncio.sleep(WEBHOOK_DEDUP_PURGE_INTERVAL_SECONDS)
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                logger.error("Erro ao expurgar eventos antigos da deduplicação", extra={"error": str(e)})
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+_deduplicator: Optional[WebhookDeduplicator] = None
+
+registry.callback_gauge(
+    "webhook_dedup_memory_entries",
+    "Chaves de eventos mantidas no LRU em memória.",
+    lambda: {(): len(_deduplicator) if _deduplicator else 0},
+)
+
+
+def get_webhook_deduplicator() -> WebhookDeduplicator:
+    global _deduplicator
+    if _deduplicator is None:
+        _deduplicator = WebhookDeduplicator(get_webhook_eventos_repository())
+    return _deduplicator
+
+
+def start_webhook_deduplicator() -> WebhookDeduplicator:
+    """Inicia o expurgo periódico da tabela. Chamado no startup (lifespan) da aplicação."""
+    deduplicator = get_webhook_deduplicator()
+    deduplicator.start()
+    return deduplicator
+
+
+async def stop_webhook_deduplicator() -> None:
+    global _deduplicator
+    if _deduplicator is not None:
+        await _deduplicator.stop()
+        _deduplicator = None
@@ -0,0 +1,138 @@
+# app/webhook_intake.py
+"""
+Recepção rápida (fast path) do webhook do iFood.
+
+O tempo de ACK não depende mais do Supabase: o receptor confere a assinatura HMAC sobre o
+corpo bruto, extrai só o necessário para rotear (code, id, merchantId) e grava os bytes
+recebidos na fila durável local (SQLite). A validação completa (IfoodWebhookPayload), o
+mapeamento merchantId -> restaurante e a deduplicação rodam depois, no worker da fila
+(job WEBHOOK_RAW_JOB em routes.py).
+
+- Assinatura: HMAC-SHA256 (hex) do corpo com IFOOD_WEBHOOK_SECRET, no cabeçalho
+  X-IFood-Signature. Sem o segredo configurado (sandbox/desenvolvimento) não há verificação.
+- JSON: usa o pacote opcional 'orjson' quando instalado; senão, o json da biblioteca padrão.
+- Latência do ACK: histograma + p50/p99 das últimas WEBHOOK_ACK_LATENCY_WINDOW requisições.
+"""
+import hashlib
+import hmac
+import json
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .metrics import registry
+
+try:  # JSON rápido depende do pacote opcional 'orjson'
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+IFOOD_WEBHOOK_SECRET = os.getenv("IFOOD_WEBHOOK_SECRET", "")
+WEBHOOK_ACK_LATENCY_WINDOW = int(os.getenv("WEBHOOK_ACK_LATENCY_WINDOW", "2048"))
+
+ACK_SECONDS = registry.histogram(
+    "ifood_webhook_ack_seconds",
+    "Tempo entre a chegada do webhook e a resposta ao iFood, por resultado.",
+    labelnames=("result",),
+    buckets=(0.0005, 0.001, 0.002, 0.003, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0),
+)
+
+
+class WebhookRejected(Exception):
+    """Webhook recusado antes de ir para a fila (assinatura inválida ou corpo ilegível)."""
+
+    def __init__(self, status_code: int, reason: str, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+
+
+def decode_body(body: bytes) -> str:
+    """
+    Corpo como texto UTF-8 (o que vai para a fila). Conferido antes de tudo: o json da
+    biblioteca padrão aceita UTF-16/32, o orjson não, e o corpo gravado precisa ser UTF-8.
+    """
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise WebhookRejected(400, "malformed", "Corpo do webhook não é UTF-8 válido.")
+
+
+def verify_signature(
+    body: bytes,
+    signature: Optional[str],
+    secret: str = IFOOD_WEBHOOK_SECRET,
+    header: str = "X-IFood-Signature",
+) -> None:
+    """Confere o HMAC-SHA256 do corpo bruto; sem segredo configurado, aceita tudo."""
+    if not secret:
+        return
+    if not signature:
+        raise WebhookRejected(401, "missing_signature", f"Webhook sem o cabeçalho {header}.")
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature.strip().lower()):
+        raise WebhookRejected(401, "invalid_signature", "Assinatura do webhook inválida.")
+
+
+def parse_event(body: bytes) -> Tuple[str, str, Optional[str]]:
+    """Parse mínimo do evento: (code, id, merchantId). O modelo completo é validado no worker."""
+    try:
+        event: Any = _loads(body)
+    except ValueError:
+        raise WebhookRejected(400, "malformed", "Corpo do webhook não é um JSON válido.")
+    if not isinstance(event, dict) or not isinstance(event.get("code"), str) or not isinstance(event.get("id"), str):
+        raise WebhookRejected(400, "malformed", "Webhook sem os campos 'code' e 'id'.")
+    metadata = event.get("metadata")
+    merchant_id = metadata.get("merchantId") if isinstance(metadata, dict) else None
+    return event["code"], event["id"], merchant_id if isinstance(merchant_id, str) and merchant_id else None
+
+
+def parse_batch(body: bytes) -> List[Dict[str, Any]]:
+    """Corpo do /webhook/batch (já com a assinatura conferida): lista de eventos."""
+    try:
+        events: Any = _loads(body)
+    except ValueError:
+        raise WebhookRejected(400, "malformed", "Corpo do lote não é um JSON válido.")
+    if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+        raise WebhookRejected(400, "malformed", "O lote precisa ser uma lista de eventos.")
+    return events
+
+
+def load_event(body: str) -> Dict[str, Any]:
+    """Usada pelo worker: o corpo bruto guardado na fila de volta para dict."""
+    return _loads(body)
+
+
+class LatencyWindow:
+    """Últimas N latências, para publicar p50/p99 sem depender dos buckets do histograma."""
+
+    def __init__(self, size: int = WEBHOOK_ACK_LATENCY_WINDOW):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self._samples:
+            return 0.0
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+ack_latency = LatencyWindow()
+
+
+def observe_ack(seconds: float, result: str) -> None:
+    ACK_SECONDS.observe(seconds, result=result)
+    if result == "accepted":
+        ack_latency.observe(seconds)
+
+
+registry.callback_gauge(
+    "ifood_webhook_ack_latency_seconds",
+    "Latência do ACK dos webhooks aceitos (p50/p99 das últimas requisições).",
+    lambda: {(str(q),): ack_latency.quantile(q) for q in (0.5, 0.99)},
+    labelnames=("quantile",),
+)
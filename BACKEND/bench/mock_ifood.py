@@ -0,0 +1,218 @@
+# bench/mock_ifood.py
+"""
+Servidor local que imita a API do iFood (autenticação, pedidos, merchant, cardápio e
+eventos/polling), para exercitar a aplicação sem depender do iFood real.
+
+Uso (a partir da pasta BACKEND):
+
+    uvicorn bench.mock_ifood:app --port 8081
+    IFOOD_API_BASE_URL=http://127.0.0.1:8081 EVENT_POLLING_ENABLED=1 uvicorn app.main:app
+
+Latência e taxas de erro simuladas: MOCK_IFOOD_LATENCY_MS, MOCK_IFOOD_ERROR_RATE (503) e
+MOCK_IFOOD_THROTTLE_RATE (429 com Retry-After), as taxas de 0 a 1, ou em tempo de execução via PUT /_mock/config. Eventos para o polling são injetados com
+POST /_mock/events; POST /_mock/menus/{merchant_id}/change altera preços de itens do cardápio
+(novo ETag). O cardápio tem MOCK_IFOOD_MENU_ITEMS itens.
+"""
+import asyncio
+import os
+import random
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Form, Header, Request
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+app = FastAPI(title="Mock iFood Merchant API")
+
+
+class MockConfig(BaseModel):
+    latency_ms: float = float(os.getenv("MOCK_IFOOD_LATENCY_MS", "0"))
+    error_rate: float = float(os.getenv("MOCK_IFOOD_ERROR_RATE", "0"))
+    throttle_rate: float = float(os.getenv("MOCK_IFOOD_THROTTLE_RATE", "0"))
+    token_expires_in: int = int(os.getenv("MOCK_IFOOD_TOKEN_EXPIRES_IN", "21600"))
+
+
+class ChangeMenuRequest(BaseModel):
+    count: int = 1
+
+
+class InjectEventsRequest(BaseModel):
+    merchantId: str
+    count: int = 1
+    fullCode: str = "PLACED"
+
+
+MOCK_IFOOD_MENU_ITEMS = int(os.getenv("MOCK_IFOOD_MENU_ITEMS", "50"))
+
+config = MockConfig()
+stats: Counter = Counter()
+# merchantId -> versão do cardápio e preços alterados ({índice do item: preço})
+menu_versions: Counter = Counter()
+menu_prices: Dict[str, Dict[int, float]] = defaultdict(dict)
+# merchantId -> eventos pendentes de acknowledgment
+pending_events: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+
+
+@app.middleware("http")
+async def simulate_network(request: Request, call_next):
+    """Aplica a latência e a taxa de erro configuradas a todas as rotas fora de /_mock."""
+    if request.url.path.startswith("/_mock"):
+        return await call_next(request)
+    if config.latency_ms:
+        await asyncio.sleep(config.latency_ms / 1000)
+    if config.error_rate and random.random() < config.error_rate:
+        stats["injected_errors"] += 1
+        return JSONResponse({"error": "mock: erro injetado"}, status_code=503)
+    if config.throttle_rate and random.random() < config.throttle_rate:
+        stats["throttled"] += 1
+        return JSONResponse({"error": "mock: limite de requisições"}, status_code=429, headers={"Retry-After": "1"})
+    response = await call_next(request)
+    route = request.scope.get("route")
+    stats[f"{request.method} {getattr(route, 'path', request.url.path)}"] += 1
+    return response
+
+
+# -----------------------------------------------------------
+# AUTENTICAÇÃO
+# -----------------------------------------------------------
+@app.post("/authentication/v1.0/oauth/userCode")
+async def user_code(clientId: str = Form(...)):
+    return {
+        "userCode": uuid.uuid4().hex[:8].upper(),
+        "authorizationCodeVerifier": uuid.uuid4().hex,
+        "verificationUrl": "https://portal.ifood.com.br/apps/code",
+        "verificationUrlComplete": "https://portal.ifood.com.br/apps/code?c=MOCK",
+        "expiresIn": 600,
+    }
+
+
+@app.post("/authentication/v1.0/oauth/token")
+async def token(grantType: str = Form(...), clientId: str = Form(...)):
+    return {
+        "accessToken": f"mock-access-{uuid.uuid4().hex}",
+        "refreshToken": f"mock-refresh-{uuid.uuid4().hex}",
+        "type": "bearer",
+        "expiresIn": config.token_expires_in,
+        "merchantId": f"mock-merchant-{uuid.uuid4().hex[:8]}",
+    }
+
+
+# -----------------------------------------------------------
+# PEDIDOS
+# -----------------------------------------------------------
+@app.get("/merchant/v1.0/orders/v1.0/orders/{order_id}")
+async def get_order(order_id: str):
+    return {
+        "id": order_id,
+        "displayId": order_id[-4:].upper(),
+        "orderType": "DELIVERY",
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "merchant": {"id": "mock-merchant", "name": "Loja Mock"},
+        "customer": {"name": "Cliente Mock"},
+        "items": [{"name": "X-Burger", "quantity": 1, "unitPrice": 25.9, "totalPrice": 25.9}],
+        "total": {"subTotal": 25.9, "deliveryFee": 5.0, "orderAmount": 30.9},
+    }
+
+
+@app.post("/merchant/v1.0/orders/v1.0/orders/{order_id}/{action}", status_code=202)
+async def order_action(order_id: str, action: str):
+    return Response(status_code=202)
+
+
+# -----------------------------------------------------------
+# MERCHANT
+# -----------------------------------------------------------
+@app.get("/merchant/v1.0/merchants/{merchant_id}/status")
+async def merchant_status(merchant_id: str):
+    return {"status": "AVAILABLE"}
+
+
+@app.get("/merchant/v1.0/merchants/{merchant_id}/menus")
+async def merchant_menu(merchant_id: str, if_none_match: Optional[str] = Header(None)):
+    # O cardápio só muda por POST /_mock/menus/{merchant_id}/change: o ETag acompanha a versão
+    etag = f'"menu-{merchant_id}-{menu_versions[merchant_id]}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    prices = menu_prices[merchant_id]
+    menu = {
+        "merchantId": merchant_id,
+        "categories": ["Lanches", "Bebidas"],
+        "items": [
+            {"itemId": f"item-{index}", "name": f"Item {index}", "price": prices.get(index, 10.0 + index), "status": "AVAILABLE",
+             "category": "Lanches" if index % 2 else "Bebidas"}
+            for index in range(MOCK_IFOOD_MENU_ITEMS)
+        ],
+    }
+    return JSONResponse(menu, headers={"ETag": etag})
+
+
+# -----------------------------------------------------------
+# EVENTOS (POLLING)
+# -----------------------------------------------------------
+@app.get("/events/v1.0/events:polling")
+async def events_polling(x_polling_merchants: Optional[str] = Header(None)):
+    merchants = x_polling_merchants.split(",") if x_polling_merchants else list(pending_events)
+    events: List[Dict[str, Any]] = []
+    for merchant_id in merchants:
+        events.extend(pending_events.get(merchant_id, {}).values())
+    if not events:
+        return Response(status_code=204)
+    return events
+
+
+@app.post("/events/v1.0/events/acknowledgment", status_code=202)
+async def events_acknowledgment(request: Request):
+    acked = {item["id"] for item in await request.json()}
+    for events in pending_events.values():
+        for event_id in acked & set(events):
+            del events[event_id]
+    stats["acked_events"] += len(acked)
+    return Response(status_code=202)
+
+
+# -----------------------------------------------------------
+# CONTROLE DO MOCK
+# -----------------------------------------------------------
+@app.post("/_mock/events")
+async def inject_events(payload: InjectEventsRequest):
+    created = []
+    for _ in range(payload.count):
+        event_id = str(uuid.uuid4())
+        pending_events[payload.merchantId][event_id] = {
+            "id": event_id,
+            "code": payload.fullCode[:3],
+            "fullCode": payload.fullCode,
+            "orderId": str(uuid.uuid4()),
+            "merchantId": payload.merchantId,
+            "createdAt": datetime.now(timezone.utc).isoformat(),
+        }
+        created.append(event_id)
+    return {"created": len(created)}
+
+
+@app.post("/_mock/menus/{merchant_id}/change")
+async def change_menu(merchant_id: str, payload: ChangeMenuRequest):
+    """Altera o preço de `count` itens sorteados do cardápio do merchant."""
+    changed = random.sample(range(MOCK_IFOOD_MENU_ITEMS), min(payload.count, MOCK_IFOOD_MENU_ITEMS))
+    for index in changed:
+        menu_prices[merchant_id][index] = round(random.uniform(5, 100), 2)
+    menu_versions[merchant_id] += 1
+    return {"changed": len(changed), "version": menu_versions[merchant_id]}
+
+
+@app.put("/_mock/config")
+async def update_config(new_config: MockConfig):
+    global config
+    config = new_config
+    return config
+
+
+@app.get("/_mock/stats")
+async def get_stats():
+    return {
+        "requests": dict(stats),
+        "pending_events": sum(len(events) for events in pending_events.values()),
+    }
@@ -0,0 +1,251 @@
+# bench/mock_supabase.py
+"""
+Supabase em memória para o benchmark e testes locais.
+
+Implementa o subconjunto do query builder do supabase-py usado por app/repositories.py
+(select/eq/in_/lt/gt/gte/order/limit, insert, update, delete e upsert com on_conflict e
+ignore_duplicates) sobre listas de dicts, com um lock para as threads do pool dos
+repositórios, e as funções SQL chamadas por rpc() (sql/006: incrementar_pedidos_rollup). Entra no lugar do cliente real com `init_repositories(MockSupabase())`.
+
+Latência e erros simulados (por query): MOCK_SUPABASE_LATENCY_MS, que bloqueia a thread como
+o cliente síncrono real, e MOCK_SUPABASE_ERROR_RATE (0 a 1).
+"""
+import copy
+import os
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class MockResponse:
+    data: List[Dict[str, Any]]
+
+
+class MockSupabaseError(Exception):
+    """Erro injetado (equivale a uma falha de rede/PostgREST)."""
+
+
+class _Query:
+    def __init__(self, db: "MockSupabase", table: str):
+        self._db = db
+        self._table = table
+        self._operation = "select"
+        self._columns: Optional[List[str]] = None
+        self._filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self._order: Optional[tuple] = None
+        self._limit: Optional[int] = None
+        self._payload: Any = None
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+
+    # -------------------------------------------------------
+    # CONSTRUÇÃO DA QUERY
+    # -------------------------------------------------------
+    def select(self, columns: str = "*", **_: Any) -> "_Query":
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def insert(self, payload: Any, **_: Any) -> "_Query":
+        self._operation, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload: Any, on_conflict: str = "", ignore_duplicates: bool = False, **_: Any) -> "_Query":
+        self._operation, self._payload = "upsert", payload
+        self._on_conflict, self._ignore_duplicates = on_conflict or None, ignore_duplicates
+        return self
+
+    def update(self, payload: Dict[str, Any], **_: Any) -> "_Query":
+        self._operation, self._payload = "update", payload
+        return self
+
+    def delete(self, **_: Any) -> "_Query":
+        self._operation = "delete"
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column: str, values: List[Any]) -> "_Query":
+        allowed = set(values)
+        self._filters.append(lambda row: row.get(column) in allowed)
+        return self
+
+    def lt(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def gt(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def gte(self, column: str, value: Any) -> "_Query":
+        self._filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def order(self, column: str, desc: bool = False, **_: Any) -> "_Query":
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count: int, **_: Any) -> "_Query":
+        self._limit = count
+        return self
+
+    # -------------------------------------------------------
+    # EXECUÇÃO
+    # -------------------------------------------------------
+    def execute(self) -> MockResponse:
+        self._db.simulate(self._table, self._operation)
+        with self._db.lock:
+            rows = self._db.tables.setdefault(self._table, [])
+            if self._operation in ("insert", "upsert"):
+                return MockResponse(self._write(rows))
+            matched = [row for row in rows if all(f(row) for f in self._filters)]
+            if self._operation == "update":
+                for row in matched:
+                    row.update(copy.deepcopy(self._payload))
+                return MockResponse(copy.deepcopy(matched))
+            if self._operation == "delete":
+                removed = {id(row) for row in matched}
+                self._db.tables[self._table] = [row for row in rows if id(row) not in removed]
+                return MockResponse(copy.deepcopy(matched))
+            return MockResponse(self._project(matched))
+
+    def _write(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        payload = self._payload if isinstance(self._payload, list) else [self._payload]
+        written = []
+        for item in copy.deepcopy(payload):
+            existing = None
+            if self._on_conflict:
+                existing = next((row for row in rows if row.get(self._on_conflict) == item.get(self._on_conflict)), None)
+            if existing is not None:
+                if self._ignore_duplicates:
+                    continue
+                existing.update(item)
+                written.append(copy.deepcopy(existing))
+            else:
+                item.setdefault("id", self._db.next_id())
+                rows.append(item)
+                written.append(copy.deepcopy(item))
+        return written
+
+    def _project(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self._order is not None:
+            column, desc = self._order
+            rows = sorted(rows, key=lambda row: (row.get(column) is not None, row.get(column) or ""), reverse=desc)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._columns is None:
+            return copy.deepcopy(rows)
+        return [{column: copy.deepcopy(row.get(column)) for column in self._columns} for row in rows]
+
+
+class _Rpc:
+    def __init__(self, db: "MockSupabase", name: str, params: Dict[str, Any]):
+        self._db = db
+        self._name = name
+        self._params = params
+
+    def execute(self) -> MockResponse:
+        self._db.simulate(self._name, "rpc")
+        function = getattr(self._db, f"_rpc_{self._name}", None)
+        if function is None:
+            raise MockSupabaseError(f"mock: função {self._name} não existe")
+        with self._db.lock:
+            return MockResponse(function(**copy.deepcopy(self._params)) or [])
+
+
+class MockSupabase:
+    def __init__(self, latency_ms: Optional[float] = None, error_rate: Optional[float] = None):
+        self.latency_ms = float(os.getenv("MOCK_SUPABASE_LATENCY_MS", "0")) if latency_ms is None else latency_ms
+        self.error_rate = float(os.getenv("MOCK_SUPABASE_ERROR_RATE", "0")) if error_rate is None else error_rate
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats: Counter = Counter()
+        self.lock = threading.Lock()
+        self._ids = 0
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> _Rpc:
+        return _Rpc(self, name, params)
+
+    def next_id(self) -> int:
+        self._ids += 1
+        return self._ids
+
+    def simulate(self, table: str, operation: str) -> None:
+        """Latência e erro injetados, contados por tabela/operação."""
+        self.stats[f"{table}.{operation}"] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            self.stats["injected_errors"] += 1
+            raise MockSupabaseError(f"mock: erro injetado em {table}.{operation}")
+
+    # -------------------------------------------------------
+    # FUNÇÕES SQL (rpc)
+    # -------------------------------------------------------
+    def _rpc_incrementar_pedidos_rollup(self, lote_id: str, linhas: List[Dict[str, Any]]) -> None:
+        batches = self.tables.setdefault("pedidos_rollup_lotes", [])
+        if any(batch["lote_id"] == lote_id for batch in batches):
+            return  # lote já aplicado
+        batches.append({"lote_id": lote_id, "created_at": datetime.now(timezone.utc).isoformat()})
+        rows = self.tables.setdefault("pedidos_rollup_hora", [])
+        index = {(row["restaurante_id"], row["hora"], row["plataforma"], row["status"]): row for row in rows}
+        now = datetime.now(timezone.utc).isoformat()
+        for line in linhas:
+            key = (line["restaurante_id"], line["hora"], line["plataforma"], line["status"])
+            row = index.get(key)
+            if row is None:
+                row = index[key] = {**line, "updated_at": now}
+                rows.append(row)
+                continue
+            for column in ("pedidos", "confirmacao_segundos_soma", "confirmacao_amostras"):
+                row[column] += line[column]
+            row["updated_at"] = now
+
+    # -------------------------------------------------------
+    # DADOS DE TESTE
+    # -------------------------------------------------------
+    def seed_integrations(self, count: int, token_expires_in: int = 21600, plataforma: str = "ifood") -> List[Dict[str, Any]]:
+        """Cria `count` restaurantes autorizados (bench-rest-N / bench-merchant-N) com token válido."""
+        now = datetime.now(timezone.utc).isoformat()
+        rows = [
+            {
+                "id": self.next_id(),
+                "restaurante_id": f"bench-rest-{index}",
+                "plataforma": plataforma,
+                "external_merchant_id": f"bench-merchant-{index}",
+                "access_token": f"bench-access-{index}",
+                "refresh_token": f"bench-refresh-{index}",
+                "is_authorized": True,
+                "token_expires_in": token_expires_in,
+                "created_at": now,
+            }
+            for index in range(count)
+        ]
+        with self.lock:
+            self.tables.setdefault("restaurante_integracoes", []).extend(rows)
+        return copy.deepcopy(rows)
+
+    def expire_tokens(self, plataforma: str = "ifood") -> int:
+        """Faz todos os tokens parecerem vencidos (created_at no passado)."""
+        past = (datetime.now(timezone.utc) - timedelta(days=1)).isoformat()
+        with self.lock:
+            rows = [row for row in self.tables.get("restaurante_integracoes", []) if row.get("plataforma") == plataforma]
+            for row in rows:
+                row["created_at"] = past
+        return len(rows)
+
+    def count(self, table: str, **equals: Any) -> int:
+        with self.lock:
+            return sum(
+                1 for row in self.tables.get(table, [])
+                if all(row.get(column) == value for column, value in equals.items())
+            )
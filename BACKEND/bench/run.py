@@ -0,0 +1,393 @@
+# bench/run.py
+"""
+Benchmark dos caminhos quentes do backend contra dublês locais do iFood e do Supabase.
+
+Sobe dois processos, o bench/mock_ifood.py e a aplicação via bench/serve.py (Supabase em
+memória com N restaurantes), e dispara os cenários abaixo, medindo vazão e percentis de
+latência de cada um:
+
+- webhook:     rajada de webhooks ORDER_PLACED assinados (latência do ACK) e o tempo até
+               todos os pedidos estarem confirmados (vazão ponta a ponta da fila);
+- status:      dashboards consultando /merchant/status em loop;
+- menu:        dashboards consultando /merchant/menu com If-None-Match;
+- menu_items:  leituras de itens pelo índice (/merchant/menu/items/{itemId}) e, no fim, uma
+               sincronização de todos os cardápios com UM item alterado em cada (só a
+               diferença deve ser gravada);
+- token_storm: todos os tokens vencem de uma vez e cada restaurante recebe várias
+               requisições simultâneas (deve haver UMA renovação por restaurante).
+
+Uso (a partir da pasta BACKEND):
+
+    python -m bench.run --restaurants 50 --requests 2000 --concurrency 50 --json resultado.json
+    python -m bench.run --baseline resultado.json --max-regression 0.25   # falha (exit 1) se piorar
+
+Latência e erros simulados: --ifood-latency-ms, --ifood-error-rate, --supabase-latency-ms e
+--supabase-error-rate (repassados aos dublês como MOCK_IFOOD_* / MOCK_SUPABASE_*).
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEBHOOK_SECRET = "bench-webhook-secret"
+IFOOD_TOKEN_ROUTE = "POST /authentication/v1.0/oauth/token"
+IFOOD_STATUS_ROUTE = "GET /merchant/v1.0/merchants/{merchant_id}/status"
+IFOOD_MENU_ROUTE = "GET /merchant/v1.0/merchants/{merchant_id}/menus"
+# Itens do cardápio do mock (MOCK_IFOOD_MENU_ITEMS padrão)
+MOCK_MENU_ITEMS = 50
+
+RequestFn = Callable[[httpx.AsyncClient], Awaitable[httpx.Response]]
+
+
+# -----------------------------------------------------------
+# MEDIÇÃO
+# -----------------------------------------------------------
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    def summary(self) -> Dict[str, Any]:
+        total = len(self.latencies) + self.errors
+        return {
+            "requests": total,
+            "errors": self.errors,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "rps": round(total / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(percentile(self.latencies, 0.50) * 1000, 2),
+            "p90_ms": round(percentile(self.latencies, 0.90) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 0.99) * 1000, 2),
+            "max_ms": round(max(self.latencies, default=0.0) * 1000, 2),
+            **self.extra,
+        }
+
+
+async def drive(
+    name: str,
+    client: httpx.AsyncClient,
+    make_request: RequestFn,
+    concurrency: int,
+    total: Optional[int] = None,
+    duration: Optional[float] = None,
+) -> ScenarioResult:
+    """Roda `make_request` com `concurrency` clientes até `total` requisições ou `duration` segundos."""
+    result = ScenarioResult(name)
+    remaining = [total if total is not None else float("inf")]
+    deadline = time.perf_counter() + duration if duration is not None else float("inf")
+
+    async def worker() -> None:
+        while remaining[0] > 0 and time.perf_counter() < deadline:
+            remaining[0] -= 1
+            started = time.perf_counter()
+            try:
+                response = await make_request(client)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                result.latencies.append(time.perf_counter() - started)
+            else:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+# -----------------------------------------------------------
+# CENÁRIOS
+# -----------------------------------------------------------
+def signed_webhook(event: Dict[str, Any]) -> Dict[str, Any]:
+    body = json.dumps(event).encode()
+    signature = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return {"content": body, "headers": {"content-type": "application/json", "X-IFood-Signature": signature}}
+
+
+async def confirmed_orders(client: httpx.AsyncClient) -> int:
+    orders = (await client.get("/_bench/stats")).json()["orders"]
+    return sum(total for order_status, total in orders.items() if order_status not in ("pending", "cancelled"))
+
+
+async def scenario_webhook(client: httpx.AsyncClient, mock: httpx.AsyncClient, args: argparse.Namespace) -> ScenarioResult:
+    run_id = f"{time.time_ns():x}"
+    counter = iter(range(args.requests))
+    baseline = await confirmed_orders(client)
+
+    async def request(http: httpx.AsyncClient) -> httpx.Response:
+        index = next(counter)
+        return await http.post("/ifood/webhook", **signed_webhook({
+            "id": f"bench-{run_id}-{index}",
+            "code": "ORDER_PLACED",
+            "correlationId": f"corr-{run_id}-{index}",
+            "metadata": {"merchantId": f"bench-merchant-{random.randrange(args.restaurants)}"},
+        }))
+
+    result = await drive("webhook", client, request, args.concurrency, total=args.requests)
+
+    # Ponta a ponta: espera os workers da fila buscarem, gravarem e confirmarem os pedidos
+    accepted = len(result.latencies)
+    started = time.perf_counter()
+    done = 0
+    while time.perf_counter() - started < args.drain_timeout:
+        done = await confirmed_orders(client) - baseline
+        if done >= accepted:
+            break
+        await asyncio.sleep(0.2)
+    drain_seconds = time.perf_counter() - started + result.elapsed
+    result.extra = {
+        "orders_confirmed": done,
+        "orders_per_second": round(done / drain_seconds, 1) if drain_seconds else 0.0,
+        "end_to_end_seconds": round(drain_seconds, 2),
+    }
+    return result
+
+
+async def mock_calls(mock: httpx.AsyncClient, route: str) -> int:
+    return (await mock.get("/_mock/stats")).json()["requests"].get(route, 0)
+
+
+async def scenario_status(client: httpx.AsyncClient, mock: httpx.AsyncClient, args: argparse.Namespace) -> ScenarioResult:
+    before = await mock_calls(mock, IFOOD_STATUS_ROUTE)
+
+    async def request(http: httpx.AsyncClient) -> httpx.Response:
+        return await http.get("/ifood/merchant/status", params={"restaurante_id": f"bench-rest-{random.randrange(args.restaurants)}"})
+
+    result = await drive("status", client, request, args.concurrency, duration=args.duration)
+    result.extra = {"upstream_calls": await mock_calls(mock, IFOOD_STATUS_ROUTE) - before}
+    return result
+
+
+async def scenario_menu(client: httpx.AsyncClient, mock: httpx.AsyncClient, args: argparse.Namespace) -> ScenarioResult:
+    before = await mock_calls(mock, IFOOD_MENU_ROUTE)
+    etags: Dict[str, str] = {}
+    not_modified = [0]
+
+    async def request(http: httpx.AsyncClient) -> httpx.Response:
+        restaurante_id = f"bench-rest-{random.randrange(args.restaurants)}"
+        headers = {"accept-encoding": "gzip"}
+        if restaurante_id in etags:
+            headers["if-none-match"] = etags[restaurante_id]
+        response = await http.get("/ifood/merchant/menu", params={"restaurante_id": restaurante_id}, headers=headers)
+        if response.status_code == 304:
+            not_modified[0] += 1
+        elif "etag" in response.headers:
+            etags[restaurante_id] = response.headers["etag"]
+        return response
+
+    result = await drive("menu", client, request, args.concurrency, duration=args.duration)
+    result.extra = {
+        "not_modified": not_modified[0],
+        "upstream_calls": await mock_calls(mock, IFOOD_MENU_ROUTE) - before,
+    }
+    return result
+
+
+async def scenario_menu_items(client: httpx.AsyncClient, mock: httpx.AsyncClient, args: argparse.Namespace) -> ScenarioResult:
+    async def request(http: httpx.AsyncClient) -> httpx.Response:
+        return await http.get(
+            f"/ifood/merchant/menu/items/item-{random.randrange(MOCK_MENU_ITEMS)}",
+            params={"restaurante_id": f"bench-rest-{random.randrange(args.restaurants)}"},
+        )
+
+    result = await drive("menu_items", client, request, args.concurrency, duration=args.duration)
+
+    # Um item alterado por cardápio: a sincronização deve gravar um item por restaurante
+    await asyncio.gather(*(
+        mock.post(f"/_mock/menus/bench-merchant-{index}/change", json={"count": 1}) for index in range(args.restaurants)
+    ))
+    responses = await asyncio.gather(*(
+        client.post("/ifood/merchant/menu/sync", params={"restaurante_id": f"bench-rest-{index}"}) for index in range(args.restaurants)
+    ), return_exceptions=True)
+    synced = [response.json() for response in responses if isinstance(response, httpx.Response) and response.status_code == 200]
+    result.extra = {
+        "sync_items_written": sum(item["added"] + item["updated"] + item["removed"] for item in synced),
+        "sync_items_unchanged": sum(item["unchanged"] for item in synced),
+        "sync_errors": len(responses) - len(synced),
+    }
+    return result
+
+
+async def scenario_token_storm(client: httpx.AsyncClient, mock: httpx.AsyncClient, args: argparse.Namespace) -> ScenarioResult:
+    before = await mock_calls(mock, IFOOD_TOKEN_ROUTE)
+    await client.post("/_bench/expire_tokens")
+    targets = iter([f"bench-rest-{index}" for index in range(args.restaurants)] * args.storm_fanout)
+
+    async def request(http: httpx.AsyncClient) -> httpx.Response:
+        return await http.get("/ifood/merchant/status", params={"restaurante_id": next(targets)})
+
+    result = await drive(
+        "token_storm", client, request,
+        concurrency=max(args.concurrency, args.restaurants),
+        total=args.restaurants * args.storm_fanout,
+    )
+    result.extra = {"token_refreshes": await mock_calls(mock, IFOOD_TOKEN_ROUTE) - before}
+    return result
+
+
+SCENARIOS = {
+    "webhook": scenario_webhook,
+    "status": scenario_status,
+    "menu": scenario_menu,
+    "menu_items": scenario_menu_items,
+    "token_storm": scenario_token_storm,
+}
+
+
+# -----------------------------------------------------------
+# PROCESSOS (DUBLÊS + APLICAÇÃO)
+# -----------------------------------------------------------
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 30.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient() as http:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Processo encerrou antes de responder em {url} (código {process.returncode}).")
+            try:
+                if (await http.get(url)).status_code < 500:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} não respondeu em {timeout:.0f}s.")
+
+
+def spawn(command: List[str], env: Dict[str, str]) -> subprocess.Popen:
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env={**os.environ, **env})
+
+
+# -----------------------------------------------------------
+# RELATÓRIO E COMPARAÇÃO COM A LINHA DE BASE
+# -----------------------------------------------------------
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    columns = ("requests", "errors", "rps", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+    print(f"{'cenário':<12}" + "".join(f"{column:>10}" for column in columns))
+    for name, summary in results.items():
+        print(f"{name:<12}" + "".join(f"{summary[column]:>10}" for column in columns))
+        extra = {key: value for key, value in summary.items() if key not in columns and key != "error_rate"}
+        if extra:
+            print(f"{'':<12}  " + ", ".join(f"{key}={value}" for key, value in extra.items()))
+
+
+def find_regressions(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float, max_error_rate: float) -> List[str]:
+    regressions = []
+    for name, summary in results.items():
+        if summary["error_rate"] > max_error_rate:
+            regressions.append(f"{name}: taxa de erro {summary['error_rate']:.2%} acima de {max_error_rate:.2%}")
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if previous["p99_ms"] and summary["p99_ms"] > previous["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {summary['p99_ms']}ms (linha de base {previous['p99_ms']}ms)")
+        if previous["rps"] and summary["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: vazão {summary['rps']} req/s (linha de base {previous['rps']} req/s)")
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> int:
+    mock_port, app_port = free_port(), free_port()
+    mock_url, app_url = f"http://127.0.0.1:{mock_port}", f"http://127.0.0.1:{app_port}"
+    mock_env = {
+        "MOCK_IFOOD_LATENCY_MS": str(args.ifood_latency_ms),
+        "MOCK_IFOOD_ERROR_RATE": str(args.ifood_error_rate),
+    }
+    app_env = {
+        "IFOOD_API_BASE_URL": mock_url,
+        "IFOOD_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "MOCK_SUPABASE_LATENCY_MS": str(args.supabase_latency_ms),
+        "MOCK_SUPABASE_ERROR_RATE": str(args.supabase_error_rate),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    processes = [
+        spawn([sys.executable, "-m", "uvicorn", "bench.mock_ifood:app", "--port", str(mock_port), "--log-level", "warning"], mock_env),
+    ]
+    try:
+        await wait_ready(f"{mock_url}/_mock/stats", processes[0])
+        processes.append(spawn([sys.executable, "-m", "bench.serve", "--port", str(app_port), "--restaurants", str(args.restaurants)], app_env))
+        await wait_ready(f"{app_url}/metrics", processes[1])
+
+        limits = httpx.Limits(max_connections=max(args.concurrency, args.restaurants) + 10)
+        results: Dict[str, Dict[str, Any]] = {}
+        async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=30) as client, \
+                httpx.AsyncClient(base_url=mock_url) as mock:
+            for name in args.scenarios:
+                print(f"-> {name}...", flush=True)
+                results[name] = (await SCENARIOS[name](client, mock, args)).summary()
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    regressions = find_regressions(results, baseline, args.max_regression, args.max_error_rate)
+    for regression in regressions:
+        print(f"REGRESSÃO: {regression}")
+    return 1 if regressions else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark do backend contra dublês locais do iFood e do Supabase.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), type=lambda value: [name.strip() for name in value.split(",") if name.strip()],
+                        help=f"Cenários separados por vírgula ({', '.join(SCENARIOS)}).")
+    parser.add_argument("--restaurants", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="Webhooks na rajada.")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de polling nos cenários status, menu e menu_items.")
+    parser.add_argument("--storm-fanout", type=int, default=5, help="Requisições simultâneas por restaurante na tempestade de tokens.")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="Espera máxima pela confirmação de todos os pedidos da rajada.")
+    parser.add_argument("--ifood-latency-ms", type=float, default=20.0)
+    parser.add_argument("--ifood-error-rate", type=float, default=0.0)
+    parser.add_argument("--supabase-latency-ms", type=float, default=5.0)
+    parser.add_argument("--supabase-error-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="Grava o resumo em JSON (serve de linha de base para as próximas rodadas).")
+    parser.add_argument("--baseline", help="JSON de uma rodada anterior para comparar.")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Piora tolerada de p99 e vazão em relação à linha de base.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"cenários desconhecidos: {', '.join(unknown)}")
+    return args
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
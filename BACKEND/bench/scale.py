@@ -0,0 +1,259 @@
+# bench/scale.py
+"""
+Escala horizontal: a mesma carga contra 1, 2, 4... processos da aplicação que compartilham
+o backend de estado (app/shared_state.py), como workers do uvicorn ou réplicas atrás de um
+balanceador.
+
+Para cada quantidade de processos sobe N vezes o bench/serve.py (cada um com o seu Supabase
+em memória, semeado igual, e a sua fila SQLite), distribui as requisições em round-robin e
+mede:
+
+- webhook:     vazão e latência do ACK de webhooks assinados;
+- status:      vazão do /merchant/status (token e status em cache);
+- token_storm: todos os tokens vencem em todos os processos ao mesmo tempo; com o backend
+               compartilhado deve haver UMA renovação por restaurante no total, não uma
+               por restaurante por processo.
+
+O relatório traz a eficiência de escala de cada cenário: vazão com N processos dividida por
+N vezes a vazão com 1 (1.0 = linear). Só faz sentido com pelo menos N núcleos livres.
+
+Backend de estado: --state-url redis://...; sem ela, sobe um redis-server local (se estiver
+no PATH) ou o servidor TCP do pacote fakeredis (se instalado). Sem nenhum dos dois, os
+processos ficam isolados (backend em memória) e a tempestade de tokens mostra a diferença.
+
+Uso (a partir da pasta BACKEND):
+
+    python -m bench.scale --workers 1,2,4 --restaurants 50 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.run import (
+    IFOOD_TOKEN_ROUTE,
+    WEBHOOK_SECRET,
+    drive,
+    free_port,
+    mock_calls,
+    signed_webhook,
+    spawn,
+    wait_ready,
+)
+
+
+# -----------------------------------------------------------
+# BACKEND DE ESTADO LOCAL
+# -----------------------------------------------------------
+def start_state_server() -> Optional[tuple]:
+    """(processo, url) de um servidor local com o protocolo do Redis, se houver um disponível."""
+    port = free_port()
+    if shutil.which("redis-server"):
+        process = subprocess.Popen(["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"], stdout=subprocess.DEVNULL)
+    else:
+        try:
+            import fakeredis  # noqa: F401
+        except ImportError:
+            return None
+        process = subprocess.Popen([sys.executable, "-c", (
+            "from fakeredis import TcpFakeServer; "
+            f"TcpFakeServer(('127.0.0.1', {port}), server_type='redis').serve_forever()"
+        )])
+    return process, f"redis://127.0.0.1:{port}/0"
+
+
+async def wait_state_server(url: str, process: subprocess.Popen, timeout: float = 15.0) -> None:
+    import redis.asyncio as redis_asyncio
+    from redis.asyncio.lock import Lock
+
+    client = redis_asyncio.from_url(url)
+    deadline = time.perf_counter() + timeout
+    try:
+        while time.perf_counter() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Servidor de estado encerrou (código {process.returncode}).")
+            try:
+                await client.ping()
+                await client.flushdb()
+                # O servidor TCP do fakeredis fecha a conexão depois de qualquer resposta de
+                # erro, inclusive o NOSCRIPT do primeiro EVALSHA do lock: carrega os scripts antes
+                for script in (Lock.LUA_RELEASE_SCRIPT, Lock.LUA_EXTEND_SCRIPT, Lock.LUA_REACQUIRE_SCRIPT):
+                    await client.script_load(script)
+                return
+            except Exception:
+                await asyncio.sleep(0.1)
+        raise RuntimeError(f"Servidor de estado não respondeu em {url}.")
+    finally:
+        await client.aclose()
+
+
+# -----------------------------------------------------------
+# CENÁRIOS (round-robin entre os processos)
+# -----------------------------------------------------------
+async def scenario_webhook(clients: List[httpx.AsyncClient], args: argparse.Namespace) -> Dict[str, Any]:
+    run_id = f"{time.time_ns():x}"
+    counter = itertools.count()
+    targets = itertools.cycle(clients)
+
+    async def request(_: httpx.AsyncClient) -> httpx.Response:
+        index = next(counter)
+        return await next(targets).post("/ifood/webhook", **signed_webhook({
+            "id": f"scale-{run_id}-{index}",
+            "code": "ORDER_CONFIRMED",
+            "correlationId": f"corr-{run_id}-{index}",
+            "metadata": {"merchantId": f"bench-merchant-{random.randrange(args.restaurants)}"},
+        }))
+
+    return (await drive("webhook", clients[0], request, args.concurrency, duration=args.duration)).summary()
+
+
+async def scenario_status(clients: List[httpx.AsyncClient], args: argparse.Namespace) -> Dict[str, Any]:
+    targets = itertools.cycle(clients)
+
+    async def request(_: httpx.AsyncClient) -> httpx.Response:
+        return await next(targets).get("/ifood/merchant/status", params={"restaurante_id": f"bench-rest-{random.randrange(args.restaurants)}"})
+
+    return (await drive("status", clients[0], request, args.concurrency, duration=args.duration)).summary()
+
+
+async def scenario_token_storm(clients: List[httpx.AsyncClient], mock: httpx.AsyncClient, args: argparse.Namespace) -> Dict[str, Any]:
+    before = await mock_calls(mock, IFOOD_TOKEN_ROUTE)
+    await asyncio.gather(*(client.post("/_bench/expire_tokens") for client in clients))
+    # Cada restaurante recebe storm_fanout requisições em CADA processo
+    targets = iter([
+        (client, f"bench-rest-{index}")
+        for index in range(args.restaurants)
+        for client in clients
+        for _ in range(args.storm_fanout)
+    ])
+
+    async def request(_: httpx.AsyncClient) -> httpx.Response:
+        client, restaurante_id = next(targets)
+        return await client.get("/ifood/merchant/status", params={"restaurante_id": restaurante_id})
+
+    total = args.restaurants * len(clients) * args.storm_fanout
+    result = await drive("token_storm", clients[0], request, concurrency=max(args.concurrency, args.restaurants), total=total)
+    summary = result.summary()
+    summary["token_refreshes"] = await mock_calls(mock, IFOOD_TOKEN_ROUTE) - before
+    return summary
+
+
+# -----------------------------------------------------------
+# EXECUÇÃO
+# -----------------------------------------------------------
+async def run_with_workers(workers: int, mock_url: str, state_url: str, args: argparse.Namespace) -> Dict[str, Dict[str, Any]]:
+    ports = [free_port() for _ in range(workers)]
+    app_env = {
+        "IFOOD_API_BASE_URL": mock_url,
+        "IFOOD_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "STATE_BACKEND_URL": state_url,
+        "MOCK_SUPABASE_LATENCY_MS": str(args.supabase_latency_ms),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    }
+    processes = [
+        spawn([sys.executable, "-m", "bench.serve", "--port", str(port), "--restaurants", str(args.restaurants)], app_env)
+        for port in ports
+    ]
+    try:
+        for port, process in zip(ports, processes):
+            await wait_ready(f"http://127.0.0.1:{port}/metrics", process)
+        limits = httpx.Limits(max_connections=max(args.concurrency, args.restaurants) + 10)
+        clients = [httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30) for port in ports]
+        try:
+            async with httpx.AsyncClient(base_url=mock_url) as mock:
+                return {
+                    "webhook": await scenario_webhook(clients, args),
+                    "status": await scenario_status(clients, args),
+                    "token_storm": await scenario_token_storm(clients, mock, args),
+                }
+        finally:
+            for client in clients:
+                await client.aclose()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def print_report(results: Dict[int, Dict[str, Dict[str, Any]]], restaurants: int) -> None:
+    baseline = results[min(results)]
+    print(f"{'processos':<10}{'cenário':<13}{'rps':>10}{'p50_ms':>10}{'p99_ms':>10}{'erros':>8}{'eficiência':>12}")
+    for workers, scenarios in results.items():
+        for name, summary in scenarios.items():
+            efficiency = ""
+            if name != "token_storm" and baseline[name]["rps"]:
+                efficiency = f"{summary['rps'] / (workers / min(results) * baseline[name]['rps']):.2f}"
+            print(f"{workers:<10}{name:<13}{summary['rps']:>10}{summary['p50_ms']:>10}{summary['p99_ms']:>10}{summary['errors']:>8}{efficiency:>12}")
+        print(f"{'':<10}token_refreshes={scenarios['token_storm']['token_refreshes']} (restaurantes: {restaurants})")
+
+
+async def run(args: argparse.Namespace) -> int:
+    mock_port = free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    processes = [spawn(
+        [sys.executable, "-m", "uvicorn", "bench.mock_ifood:app", "--port", str(mock_port), "--log-level", "warning"],
+        {"MOCK_IFOOD_LATENCY_MS": str(args.ifood_latency_ms)},
+    )]
+    state_url = args.state_url or ""
+    try:
+        await wait_ready(f"{mock_url}/_mock/stats", processes[0])
+        if not state_url:
+            started = start_state_server()
+            if started is None:
+                print("AVISO: sem redis-server nem fakeredis; processos isolados (backend em memória).")
+            else:
+                processes.append(started[0])
+                state_url = started[1]
+                await wait_state_server(state_url, started[0])
+        print(f"backend de estado: {state_url or 'memória'}")
+
+        results: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        for workers in args.workers:
+            print(f"-> {workers} processo(s)...", flush=True)
+            results[workers] = await run_with_workers(workers, mock_url, state_url, args)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print(f"núcleos disponíveis: {os.cpu_count()}")
+    print_report(results, args.restaurants)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump({str(workers): scenarios for workers, scenarios in results.items()}, output, indent=2)
+    return 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Vazão da aplicação com N processos compartilhando o backend de estado.")
+    parser.add_argument("--workers", default=[1, 2, 4], type=lambda value: [int(n) for n in value.split(",") if n.strip()],
+                        help="Quantidades de processos, separadas por vírgula.")
+    parser.add_argument("--state-url", help="URL do backend de estado (redis://...). Padrão: servidor local temporário.")
+    parser.add_argument("--restaurants", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos de carga nos cenários webhook e status.")
+    parser.add_argument("--storm-fanout", type=int, default=3, help="Requisições por restaurante e por processo na tempestade de tokens.")
+    parser.add_argument("--ifood-latency-ms", type=float, default=20.0)
+    parser.add_argument("--supabase-latency-ms", type=float, default=5.0)
+    parser.add_argument("--json", help="Grava o resultado em JSON.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
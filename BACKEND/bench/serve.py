@@ -0,0 +1,79 @@
+# bench/serve.py
+"""
+Sobe a aplicação (app.main) contra o Supabase em memória (bench/mock_supabase.py), com N
+restaurantes integrados (bench-rest-N / bench-merchant-N). O iFood é o apontado por
+IFOOD_API_BASE_URL (normalmente o bench/mock_ifood.py). Usado pelo bench/run.py, mas também
+serve para exercitar o backend localmente sem credenciais.
+
+Uso (a partir da pasta BACKEND):
+
+    IFOOD_API_BASE_URL=http://127.0.0.1:8081 python -m bench.serve --port 8000 --restaurants 50
+
+Rotas de controle, só neste processo:
+
+    POST /_bench/expire_tokens  -> vence todos os tokens (tempestade de renovação)
+    GET  /_bench/stats          -> queries por tabela/operação e pedidos gravados por status
+"""
+import argparse
+import os
+import tempfile
+
+# Antes de importar a aplicação: a fila durável vai para um arquivo novo e a renovação
+# proativa fica desligada (a tempestade de tokens mede o caminho sob demanda). O cliente
+# real do Supabase só seria criado no lifespan, e aqui é trocado pelo banco em memória.
+os.environ.setdefault("ORDER_QUEUE_PATH", os.path.join(tempfile.mkdtemp(prefix="bench-"), "order_queue.sqlite3"))
+os.environ.setdefault("TOKEN_REFRESHER_ENABLED", "0")
+
+import uvicorn  # noqa: E402
+
+from app import repositories  # noqa: E402
+from app.main import app  # noqa: E402
+from app.order_state import ORDER_STATUSES  # noqa: E402
+from app.routes import PLATFORM_NAME  # noqa: E402
+from app.shared_state import flush_invalidations  # noqa: E402
+from app.status_cache import merchant_status_cache  # noqa: E402
+from app.token_cache import token_cache  # noqa: E402
+from bench.mock_supabase import MockSupabase  # noqa: E402
+
+store = MockSupabase()
+# O lifespan chama init_repositories() sem cliente: ele passa a receber o banco em memória
+repositories.get_client = lambda: store
+
+
+@app.post("/_bench/expire_tokens", include_in_schema=False)
+async def expire_tokens():
+    expired = store.expire_tokens(PLATFORM_NAME)
+    for row in store.tables.get("restaurante_integracoes", []):
+        key = (row["restaurante_id"], PLATFORM_NAME)
+        token_cache.invalidate(key)
+        merchant_status_cache.invalidate(key)
+    # Com backend compartilhado: as cópias dos tokens somem antes da resposta
+    await flush_invalidations()
+    return {"expired": expired}
+
+
+@app.get("/_bench/stats", include_in_schema=False)
+async def bench_stats():
+    return {
+        "queries": dict(store.stats),
+        "orders": {order_status: store.count("pedidos", status=order_status) for order_status in ORDER_STATUSES},
+        "webhook_eventos": store.count("webhook_eventos"),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Aplicação + Supabase em memória para o benchmark.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--restaurants", type=int, default=int(os.getenv("BENCH_RESTAURANTS", "50")))
+    parser.add_argument("--expired-tokens", action="store_true", help="Semeia os tokens já vencidos (renovados no aquecimento).")
+    args = parser.parse_args()
+
+    store.seed_integrations(args.restaurants)
+    if args.expired_tokens:
+        store.expire_tokens(PLATFORM_NAME)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
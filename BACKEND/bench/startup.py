@@ -0,0 +1,193 @@
+# bench/startup.py
+"""
+Cold start: quanto tempo um processo novo da aplicação leva para importar, aceitar conexões
+e ficar pronto para tráfego, com um orçamento para cada fase.
+
+- import:  `import app.main` num interpretador novo, SEM as variáveis do Supabase (o
+           cliente é criado no lifespan, não no import; o supabase-py não deve ser
+           carregado aqui);
+- live:    do spawn do bench/serve.py até /health/live responder 200;
+- ready:   do spawn até /health/ready responder 200 (aquecimento do índice de merchants,
+           dos tokens e dos pedidos ativos concluído), mais a duração de cada etapa.
+
+Cada fase roda --runs vezes; o relatório usa a mediana. Sai com código 1 se alguma mediana
+passar do orçamento (--max-import-ms, --max-live-ms, --max-ready-ms) ou piorar mais que
+--max-regression em relação a uma rodada anterior (--baseline).
+
+Uso (a partir da pasta BACKEND):
+
+    python -m bench.startup --runs 5 --restaurants 500 --json startup.json
+    python -m bench.startup --baseline startup.json --max-regression 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from bench.run import BACKEND_DIR, free_port, spawn, wait_ready
+
+IMPORT_SCRIPT = """
+import sys, time
+started = time.perf_counter()
+import app.main
+print(round((time.perf_counter() - started) * 1000, 2), int("supabase" in sys.modules))
+"""
+CREDENTIAL_VARIABLES = ("SUPABASE_URL", "URL", "SUPABASE_SERVICE_ROLE_KEY", "SUPABASE_KEY", "KEY")
+
+
+# -----------------------------------------------------------
+# FASES
+# -----------------------------------------------------------
+def measure_import() -> Dict[str, Any]:
+    env = {name: value for name, value in os.environ.items() if name not in CREDENTIAL_VARIABLES}
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    ).stdout.split()
+    return {"import_ms": float(output[0]), "supabase_imported": bool(int(output[1]))}
+
+
+async def wait_status(http: httpx.AsyncClient, url: str, process: subprocess.Popen, timeout: float) -> None:
+    """Espera `url` responder 200 (poll de 10ms, mais fino que o wait_ready do bench.run)."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Aplicação encerrou antes de responder em {url} (código {process.returncode}).")
+        try:
+            if (await http.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.01)
+    raise RuntimeError(f"{url} não respondeu 200 em {timeout:.0f}s.")
+
+
+async def measure_startup(mock_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    app_port = free_port()
+    app_url = f"http://127.0.0.1:{app_port}"
+    command = [sys.executable, "-m", "bench.serve", "--port", str(app_port), "--restaurants", str(args.restaurants)]
+    if args.expired_tokens:
+        command.append("--expired-tokens")
+    started = time.perf_counter()
+    process = spawn(command, {
+        "IFOOD_API_BASE_URL": mock_url,
+        "MOCK_SUPABASE_LATENCY_MS": str(args.supabase_latency_ms),
+        "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+    })
+    try:
+        async with httpx.AsyncClient(timeout=5) as http:
+            await wait_status(http, f"{app_url}/health/live", process, args.timeout)
+            live_ms = (time.perf_counter() - started) * 1000
+            await wait_status(http, f"{app_url}/health/ready", process, args.timeout)
+            ready_ms = (time.perf_counter() - started) * 1000
+            report = (await http.get(f"{app_url}/health/ready")).json()
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    result: Dict[str, Any] = {"live_ms": round(live_ms, 2), "ready_ms": round(ready_ms, 2)}
+    for name, step in report["steps"].items():
+        result[f"{name}_ms"] = round((step["seconds"] or 0.0) * 1000, 2)
+        if step["status"] != "done":
+            result.setdefault("failed_steps", []).append(f"{name}={step['status']}")
+    return result
+
+
+def median_of(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {}
+    for key, value in runs[0].items():
+        if isinstance(value, float):
+            summary[key] = round(statistics.median(run[key] for run in runs), 2)
+            summary[f"{key}_max"] = round(max(run[key] for run in runs), 2)
+    return summary
+
+
+# -----------------------------------------------------------
+# ORÇAMENTO E COMPARAÇÃO COM A LINHA DE BASE
+# -----------------------------------------------------------
+def find_violations(
+    results: Dict[str, Any], budgets: Dict[str, float], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    violations = []
+    for key, budget in budgets.items():
+        if results[key] > budget:
+            violations.append(f"{key}: {results[key]}ms acima do orçamento de {budget:.0f}ms")
+        previous = baseline.get(key)
+        if previous and results[key] > previous * (1 + tolerance):
+            violations.append(f"{key}: {results[key]}ms (linha de base {previous}ms)")
+    if results.get("supabase_imported"):
+        violations.append("import: app.main carregou o supabase-py (o cliente deveria ser criado só no lifespan)")
+    for failed in results.get("failed_steps", []):
+        violations.append(f"aquecimento: etapa {failed}")
+    return violations
+
+
+async def run(args: argparse.Namespace) -> int:
+    print(f"-> import ({args.runs}x)...", flush=True)
+    import_runs = [measure_import() for _ in range(args.runs)]
+    results = median_of(import_runs)
+    results["supabase_imported"] = any(run["supabase_imported"] for run in import_runs)
+
+    mock_port = free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock = spawn([sys.executable, "-m", "uvicorn", "bench.mock_ifood:app", "--port", str(mock_port), "--log-level", "warning"], {})
+    try:
+        await wait_ready(f"{mock_url}/_mock/stats", mock)
+        print(f"-> startup ({args.runs}x, {args.restaurants} restaurantes)...", flush=True)
+        startup_runs = [await measure_startup(mock_url, args) for _ in range(args.runs)]
+    finally:
+        mock.terminate()
+        try:
+            mock.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            mock.kill()
+    results.update(median_of(startup_runs))
+    failed_steps = sorted({failed for run in startup_runs for failed in run.get("failed_steps", [])})
+    if failed_steps:
+        results["failed_steps"] = failed_steps
+
+    for key, value in results.items():
+        print(f"{key:<24}{value}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    budgets = {"import_ms": args.max_import_ms, "live_ms": args.max_live_ms, "ready_ms": args.max_ready_ms}
+    violations = find_violations(results, budgets, baseline, args.max_regression)
+    for violation in violations:
+        print(f"ORÇAMENTO: {violation}")
+    return 1 if violations else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Tempo de import, de liveness e de readiness de um processo novo da aplicação.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--restaurants", type=int, default=500, help="Integrações semeadas no Supabase em memória.")
+    parser.add_argument("--expired-tokens", action="store_true", help="Tokens semeados já vencidos (o aquecimento renova todos).")
+    parser.add_argument("--supabase-latency-ms", type=float, default=5.0)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Espera máxima por /health/live e /health/ready.")
+    parser.add_argument("--max-import-ms", type=float, default=1000.0)
+    parser.add_argument("--max-live-ms", type=float, default=3000.0)
+    parser.add_argument("--max-ready-ms", type=float, default=5000.0)
+    parser.add_argument("--json", help="Grava o resultado em JSON (serve de linha de base para as próximas rodadas).")
+    parser.add_argument("--baseline", help="JSON de uma rodada anterior para comparar.")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="Piora tolerada das medianas em relação à linha de base.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
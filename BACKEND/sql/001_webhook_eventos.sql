@@ -0,0 +1,13 @@
+-- Chaves dos eventos de webhook já recebidos (deduplicação entre réplicas da API).
+-- Ver app/webhook_dedup.py. Linhas mais antigas que WEBHOOK_DEDUP_RETENTION_SECONDS
+-- são expurgadas periodicamente pela própria aplicação.
+create table if not exists public.webhook_eventos (
+    event_key text primary key,            -- "<code>:<id>:<correlationId>"
+    code text not null,
+    restaurante_id uuid,
+    plataforma text not null default 'ifood',
+    received_at timestamptz not null default now()
+);
+
+create index if not exists webhook_eventos_received_at_idx
+    on public.webhook_eventos (received_at);
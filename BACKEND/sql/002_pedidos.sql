@@ -0,0 +1,11 @@
+-- Pedidos recebidos das plataformas (payload completo do iFood em JSONB).
+-- Gravados em lote pelos workers da fila (app/routes.py: _persist_orders), com upsert
+-- chaveado no ID do pedido na plataforma.
+create table if not exists public.pedidos (
+    id bigint generated always as identity primary key,
+    restaurante_id uuid not null references public.restaurantes (id),
+    plataforma text not null default 'ifood',
+    ifood_order_id text not null unique,
+    data jsonb not null,
+    created_at timestamptz not null default now()
+);
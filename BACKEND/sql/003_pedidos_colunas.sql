@@ -0,0 +1,20 @@
+-- Colunas normalizadas da tabela pedidos para as consultas do monitor ("pedidos do
+-- restaurante X com status Y, mais recentes primeiro"), sem abrir o JSONB.
+-- O payload completo do iFood continua em `data`.
+-- Os status seguem o vocabulário do front-end (src/types/Order.ts):
+-- pending, confirmed, preparing, shipped, delivered, cancelled.
+alter table public.pedidos
+    add column if not exists status text not null default 'pending',
+    add column if not exists display_id text,
+    add column if not exists order_type text,
+    add column if not exists order_created_at timestamptz,
+    add column if not exists total numeric(12, 2),
+    add column if not exists updated_at timestamptz not null default now();
+
+-- Lista por restaurante + status (cada coluna do Kanban do monitor)
+create index if not exists pedidos_restaurante_status_created_idx
+    on public.pedidos (restaurante_id, status, order_created_at desc);
+
+-- Lista de todos os pedidos do restaurante (aba "Todos")
+create index if not exists pedidos_restaurante_created_idx
+    on public.pedidos (restaurante_id, order_created_at desc);
@@ -0,0 +1,11 @@
+-- Transições de status são gravadas só com (restaurante_id, ifood_order_id, status,
+-- updated_at) pela máquina de estados (app/order_state.py). Se a transição chegar antes
+-- do pedido completo (ex.: evento do polling antes do worker da fila), o upsert cria a
+-- linha sem payload; o worker completa `data` depois.
+alter table public.pedidos
+    alter column data set default '{}'::jsonb;
+
+-- Aquecimento da máquina de estados no startup: pedidos ativos recentes
+create index if not exists pedidos_status_created_idx
+    on public.pedidos (status, order_created_at desc)
+    where status in ('pending', 'confirmed', 'preparing', 'shipped');
@@ -0,0 +1,28 @@
+-- Cardápio normalizado: um item por linha, sincronizado com o cardápio da plataforma por
+-- diferença (app/menu_store.py). Só itens novos/alterados são gravados e os que saíram do
+-- cardápio são apagados; o JSON completo continua vindo do iFood (/merchant/menu).
+create table if not exists public.cardapio_itens (
+    item_key text primary key,             -- "<restaurante_id>:<plataforma>:<item_id>"
+    restaurante_id uuid not null references public.restaurantes (id),
+    plataforma text not null default 'ifood',
+    item_id text not null,
+    name text not null,
+    category text,
+    status text not null,
+    price numeric(12, 2) not null,
+    updated_at timestamptz not null default now()
+);
+
+-- Carga do cardápio de um restaurante (snapshot para o diff)
+create index if not exists cardapio_itens_restaurante_idx
+    on public.cardapio_itens (restaurante_id, plataforma);
+
+-- Consultas por categoria e por status (ex.: itens indisponíveis)
+create index if not exists cardapio_itens_restaurante_category_idx
+    on public.cardapio_itens (restaurante_id, plataforma, category);
+create index if not exists cardapio_itens_restaurante_status_idx
+    on public.cardapio_itens (restaurante_id, plataforma, status);
+
+-- Busca por prefixo do nome (lower(name) like 'x%')
+create index if not exists cardapio_itens_restaurante_name_idx
+    on public.cardapio_itens (restaurante_id, plataforma, lower(name) text_pattern_ops);
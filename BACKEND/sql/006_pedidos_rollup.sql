@@ -0,0 +1,68 @@
+-- Agregados por hora dos pedidos (relatórios sem varrer a tabela pedidos).
+-- Cada transição de status da máquina de estados (app/order_state.py) soma 1 na linha
+-- (restaurante, plataforma, hora da transição, status); a aplicação acumula os incrementos em
+-- memória e os grava em lote pela função abaixo (app/order_rollups.py). Várias réplicas podem
+-- gravar ao mesmo tempo: a função soma, não sobrescreve.
+create table if not exists public.pedidos_rollup_hora (
+    restaurante_id uuid not null references public.restaurantes (id),
+    plataforma text not null default 'ifood',
+    hora timestamptz not null,             -- início da hora (UTC)
+    status text not null,                  -- status de destino da transição
+    pedidos integer not null default 0,
+    -- Latência de confirmação (pending -> confirmed), só nas linhas de status 'confirmed'
+    confirmacao_segundos_soma double precision not null default 0,
+    confirmacao_amostras integer not null default 0,
+    updated_at timestamptz not null default now(),
+    primary key (restaurante_id, hora, plataforma, status)
+);
+
+-- Lotes já aplicados: a aplicação reenvia um lote que falhou com o mesmo lote_id (pode ter sido
+-- gravado antes de um timeout) e a função o ignora. Ids com mais de um dia são apagados.
+create table if not exists public.pedidos_rollup_lotes (
+    lote_id uuid primary key,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists pedidos_rollup_lotes_created_at_idx
+    on public.pedidos_rollup_lotes (created_at);
+
+-- Incrementos em lote: [{restaurante_id, plataforma, hora, status, pedidos,
+-- confirmacao_segundos_soma, confirmacao_amostras}, ...]
+drop function if exists public.incrementar_pedidos_rollup(jsonb);
+
+create or replace function public.incrementar_pedidos_rollup(lote_id uuid, linhas jsonb)
+returns void
+language plpgsql
+as $$
+begin
+    insert into public.pedidos_rollup_lotes (lote_id) values (incrementar_pedidos_rollup.lote_id)
+    on conflict do nothing;
+    if not found then
+        return;  -- lote já aplicado
+    end if;
+
+    delete from public.pedidos_rollup_lotes where created_at < now() - interval '1 day';
+
+    insert into public.pedidos_rollup_hora as r
+        (restaurante_id, plataforma, hora, status, pedidos, confirmacao_segundos_soma, confirmacao_amostras, updated_at)
+    select l.restaurante_id, l.plataforma, l.hora, l.status, l.pedidos, l.confirmacao_segundos_soma, l.confirmacao_amostras, now()
+    from jsonb_to_recordset(linhas) as l(
+        restaurante_id uuid,
+        plataforma text,
+        hora timestamptz,
+        status text,
+        pedidos integer,
+        confirmacao_segundos_soma double precision,
+        confirmacao_amostras integer
+    )
+    on conflict (restaurante_id, hora, plataforma, status) do update set
+        pedidos = r.pedidos + excluded.pedidos,
+        confirmacao_segundos_soma = r.confirmacao_segundos_soma + excluded.confirmacao_segundos_soma,
+        confirmacao_amostras = r.confirmacao_amostras + excluded.confirmacao_amostras,
+        updated_at = now();
+end;
+$$;
+
+-- Exportação do histórico em páginas pela chave (restaurante_id, id), sem OFFSET
+create index if not exists pedidos_restaurante_id_idx
+    on public.pedidos (restaurante_id, id);
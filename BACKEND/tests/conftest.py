@@ -0,0 +1,11 @@
+# tests/conftest.py
+"""
+Configuração comum dos testes. Os testes assíncronos usam o plugin de pytest do anyio
+(@pytest.mark.anyio), sempre sobre o asyncio, como a aplicação.
+"""
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
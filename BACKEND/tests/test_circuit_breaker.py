@@ -0,0 +1,103 @@
+# tests/test_circuit_breaker.py
+import pytest
+
+from app import circuit_breaker
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record(False, breaker.before_call())
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("order_get", failure_threshold=3, reset_seconds=30)
+    breaker.record(False, breaker.before_call())
+    breaker.record(True, breaker.before_call())  # sucesso zera a sequência
+    breaker.record(False, breaker.before_call())
+    breaker.record(False, breaker.before_call())
+    assert breaker.state == CLOSED
+
+    breaker.record(False, breaker.before_call())
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == "30"
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker("order_get", failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock.now += 31
+
+    assert breaker.before_call() is True
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_probe_success_closes(clock):
+    breaker = CircuitBreaker("order_get", failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock.now += 31
+
+    breaker.record(True, breaker.before_call())
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+    assert breaker.before_call() is False
+
+
+def test_probe_failure_reopens_for_a_full_period(clock):
+    breaker = CircuitBreaker("order_get", failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock.now += 31
+
+    breaker.record(False, breaker.before_call())
+    assert breaker.state == OPEN
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 2
+    assert breaker.before_call() is True
+
+
+def test_neutral_probe_frees_the_probe_slot(clock):
+    breaker = CircuitBreaker("order_get", failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock.now += 31
+
+    breaker.record(None, breaker.before_call())  # ex.: chamada cancelada
+    assert breaker.state == HALF_OPEN
+    assert breaker.before_call() is True
+
+
+def test_late_results_of_non_probe_calls_do_not_decide_half_open(clock):
+    breaker = CircuitBreaker("order_get", failure_threshold=2, reset_seconds=30)
+    slow_call = breaker.before_call()  # liberada com o circuito fechado, termina depois
+    open_breaker(breaker)
+    clock.now += 31
+    probe = breaker.before_call()
+
+    breaker.record(True, slow_call)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record(False, probe)
+    assert breaker.state == OPEN
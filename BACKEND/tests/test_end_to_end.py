@@ -0,0 +1,174 @@
+# tests/test_end_to_end.py
+"""
+Fluxos completos da aplicação (app.main com o lifespan) contra os mocks do bench: o Supabase
+em memória (bench/mock_supabase.py) e o iFood local (bench/mock_ifood.py), servido pelo
+cliente HTTP compartilhado via ASGITransport.
+"""
+import asyncio
+import json
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict
+
+import httpx
+import pytest
+
+from app import ifood_http, main, order_queue, repositories, token_refresher
+from app.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from app.order_queue import JOBS_ENQUEUED, OrderQueue
+from app.order_rollups import get_order_rollups
+from app.routes import ORDER_PLACED_JOB
+from app.warmup import warmup_report
+from bench import mock_ifood
+from bench.mock_supabase import MockSupabase, MockSupabaseError
+
+pytestmark = pytest.mark.anyio
+
+CONFIRM_ROUTE = "POST /merchant/v1.0/orders/v1.0/orders/{order_id}/{action}"
+
+
+async def wait_for(predicate: Callable[[], Any], timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condição não atingida no prazo")
+        await asyncio.sleep(0.02)
+
+
+def placed_event(merchant_id: str = "bench-merchant-0") -> Dict[str, Any]:
+    order_id = str(uuid.uuid4())
+    return {
+        "id": order_id,
+        "code": "ORDER_PLACED",
+        "correlationId": str(uuid.uuid4()),
+        "createdAt": "2026-01-01T12:00:00Z",
+        "metadata": {"merchantId": merchant_id},
+    }
+
+
+def order_status(store: MockSupabase, order_id: str) -> Any:
+    rows = [row for row in store.tables.get("pedidos", []) if row.get("ifood_order_id") == order_id]
+    return rows[0].get("status") if rows else None
+
+
+@pytest.fixture
+async def backend(monkeypatch, tmp_path):
+    store = MockSupabase()
+    store.seed_integrations(2)
+    # Supabase: o lifespan chama init_repositories() sem cliente e recebe o banco em memória
+    monkeypatch.setattr(repositories, "get_client", lambda: store)
+    monkeypatch.setattr(token_refresher, "TOKEN_REFRESHER_ENABLED", False)
+    # iFood: o cliente compartilhado fala com o mock em processo (o host da URL não importa)
+    monkeypatch.setattr(ifood_http, "_client", None)
+    monkeypatch.setattr(ifood_http, "_breakers", {})
+    monkeypatch.setattr(ifood_http, "_build_client", lambda: httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=mock_ifood.app), headers={"accept": "application/json"}
+    ))
+    monkeypatch.setattr(mock_ifood, "config", mock_ifood.MockConfig(latency_ms=0, error_rate=0, throttle_rate=0))
+    # Fila durável num arquivo novo, com backoff curto para as novas tentativas
+    monkeypatch.setattr(order_queue, "ORDER_QUEUE_IDLE_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(order_queue, "_queue", OrderQueue(
+        path=str(tmp_path / "order_queue.sqlite3"), workers=2, backoff_base_seconds=0.05, backoff_max_seconds=0.2
+    ))
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await wait_for(lambda: warmup_report()["ready"])
+            yield SimpleNamespace(client=client, store=store, queue=order_queue.get_order_queue())
+
+
+async def post_webhook(backend, event: Dict[str, Any]) -> httpx.Response:
+    return await backend.client.post("/ifood/webhook", content=json.dumps(event))
+
+
+def queue_idle(queue: OrderQueue) -> bool:
+    depth = queue.depth
+    return not depth.get("pending") and not depth.get("running")
+
+
+# -----------------------------------------------------------
+# WEBHOOK -> FILA -> CONFIRMAÇÃO
+# -----------------------------------------------------------
+async def test_webhook_is_queued_fetched_persisted_and_confirmed(backend):
+    confirms_before = mock_ifood.stats[CONFIRM_ROUTE]
+    event = placed_event()
+
+    response = await post_webhook(backend, event)
+
+    assert response.status_code == 200
+    await wait_for(lambda: order_status(backend.store, event["id"]) == "confirmed")
+    row = next(row for row in backend.store.tables["pedidos"] if row["ifood_order_id"] == event["id"])
+    assert row["restaurante_id"] == "bench-rest-0"
+    assert row["plataforma"] == "ifood"
+    assert row["data"]["id"] == event["id"]
+    assert mock_ifood.stats[CONFIRM_ROUTE] - confirms_before == 1
+
+
+async def test_redelivered_webhook_is_confirmed_once(backend):
+    confirms_before = mock_ifood.stats[CONFIRM_ROUTE]
+    jobs_before = JOBS_ENQUEUED.get(kind=ORDER_PLACED_JOB)
+    event = placed_event()
+
+    await post_webhook(backend, event)
+    await wait_for(lambda: order_status(backend.store, event["id"]) == "confirmed")
+    # O iFood reentrega o mesmo evento (mesmo id e correlationId)
+    for _ in range(3):
+        assert (await post_webhook(backend, event)).status_code == 200
+    await wait_for(lambda: queue_idle(backend.queue))
+
+    # As reentregas são descartadas na deduplicação: um único job de busca + confirmação
+    assert JOBS_ENQUEUED.get(kind=ORDER_PLACED_JOB) - jobs_before == 1
+    assert mock_ifood.stats[CONFIRM_ROUTE] - confirms_before == 1
+    assert backend.store.count("webhook_eventos", event_key=f"ORDER_PLACED:{event['id']}:{event['correlationId']}") == 1
+
+
+# -----------------------------------------------------------
+# CIRCUIT BREAKER
+# -----------------------------------------------------------
+async def test_breaker_opens_while_ifood_fails_and_closes_after_recovery(backend):
+    breaker = ifood_http._breakers["order_get"] = CircuitBreaker("order_get", failure_threshold=2, reset_seconds=0.3)
+    mock_ifood.config.error_rate = 1.0
+    event = placed_event()
+
+    await post_webhook(backend, event)
+    await wait_for(lambda: breaker.state == OPEN)
+    assert order_status(backend.store, event["id"]) != "confirmed"
+
+    # iFood volta: a chamada de teste do meio-aberto fecha o circuito e o job conclui
+    mock_ifood.config.error_rate = 0.0
+    await wait_for(lambda: order_status(backend.store, event["id"]) == "confirmed")
+    assert breaker.state == CLOSED
+
+
+# -----------------------------------------------------------
+# AGREGADOS (ROLLUPS)
+# -----------------------------------------------------------
+async def test_rollup_batch_resent_after_timeout_is_counted_once(backend, monkeypatch):
+    event = placed_event("bench-merchant-1")
+    await post_webhook(backend, event)
+    await wait_for(lambda: order_status(backend.store, event["id"]) == "confirmed")
+
+    # A função SQL aplica o lote mas a resposta se perde (timeout depois do commit)
+    apply_batch = backend.store._rpc_incrementar_pedidos_rollup
+    calls = []
+
+    def commit_then_fail(**params):
+        calls.append(params["lote_id"])
+        apply_batch(**params)
+        if len(calls) == 1:
+            raise MockSupabaseError("mock: timeout depois do commit")
+
+    monkeypatch.setattr(backend.store, "_rpc_incrementar_pedidos_rollup", commit_then_fail)
+    rollups = get_order_rollups()
+    await rollups.flush()
+    await rollups.flush()
+
+    assert len(calls) == 2 and calls[0] == calls[1]
+    totals = {
+        row["status"]: row["pedidos"]
+        for row in backend.store.tables["pedidos_rollup_hora"]
+        if row["restaurante_id"] == "bench-rest-1"
+    }
+    assert totals == {"pending": 1, "confirmed": 1}
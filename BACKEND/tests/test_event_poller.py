@@ -0,0 +1,53 @@
+# tests/test_event_poller.py
+import httpx
+import pytest
+
+from app import event_poller
+from app.event_poller import EventPoller, to_webhook_event
+
+pytestmark = pytest.mark.anyio
+
+
+def test_short_codes_are_mapped_when_full_code_is_missing():
+    event = {"id": "evt-1", "code": "PLC", "orderId": "order-1", "merchantId": "m1"}
+    assert to_webhook_event(event)["code"] == "ORDER_PLACED"
+    assert to_webhook_event({**event, "code": "CAN"})["code"] == "ORDER_CANCELED"
+    assert to_webhook_event({**event, "code": "DSP"})["code"] == "ORDER_DISPATCHED"
+    assert to_webhook_event({**event, "code": "XYZ"}) is None
+    # Com fullCode, vale o fullCode
+    assert to_webhook_event({**event, "code": "CFM", "fullCode": "CONFIRMED"})["code"] == "ORDER_CONFIRMED"
+
+
+class FakeIntegracoes:
+    async def list_authorized(self, plataforma):
+        return [{"restaurante_id": "rest-1", "external_merchant_id": "m1"}]
+
+
+async def test_unknown_short_codes_are_not_acknowledged(monkeypatch):
+    polled = [
+        {"id": "evt-1", "code": "PLC", "orderId": "order-1", "merchantId": "m1"},
+        {"id": "evt-2", "code": "XYZ", "orderId": "order-1", "merchantId": "m1"},
+    ]
+    acked = []
+
+    async def fake_request(method, url, **kwargs):
+        if kwargs["endpoint"] == "events_poll":
+            return httpx.Response(200, json=polled, request=httpx.Request(method, url))
+        acked.extend(item["id"] for item in kwargs["json"])
+        return httpx.Response(202, request=httpx.Request(method, url))
+
+    ingested = []
+
+    async def ingest(mapped):
+        ingested.extend(mapped)
+        return {}
+
+    async def record(restaurante_id):
+        return {"access_token": "token"}
+
+    monkeypatch.setattr(event_poller, "ifood_request", fake_request)
+    poller = EventPoller(FakeIntegracoes(), record, ingest, lambda: 0)
+
+    assert await poller.poll_once() == 1
+    assert [(rid, event["code"]) for rid, event in ingested] == [("rest-1", "ORDER_PLACED")]
+    assert acked == ["evt-1"]
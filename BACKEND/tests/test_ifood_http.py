@@ -0,0 +1,83 @@
+# tests/test_ifood_http.py
+import httpx
+import pytest
+
+from app import ifood_http
+from app.circuit_breaker import OPEN, CircuitOpenError
+from app.ifood_http import ifood_request, merchant_rate_limiter
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def upstream(monkeypatch):
+    """Troca o pool compartilhado por um transporte em memória; `responses` é consumida em ordem."""
+    calls = []
+    responses = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return responses.pop(0) if responses else httpx.Response(200, json={})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(ifood_http, "_client", client)
+    monkeypatch.setattr(ifood_http, "_breakers", {})
+    yield calls, responses
+    await client.aclose()
+
+
+async def test_retry_after_pauses_only_the_merchant(upstream):
+    calls, responses = upstream
+    responses.append(httpx.Response(429, headers={"Retry-After": "1"}))
+
+    response = await ifood_request(
+        "GET", "https://api.test/orders/1", endpoint="order_get", merchant_key="rest-429",
+        headers={"Authorization": "Bearer token"},
+    )
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+    assert merchant_rate_limiter.bucket("ifood:rest-429").blocked_for == 0
+    assert merchant_rate_limiter.bucket("ifood:rest-other").blocked_for == 0
+    assert ifood_http.get_platform_rate_limiter("ifood").blocked_for == 0
+
+
+async def test_retry_after_pause_is_applied_to_the_merchant_bucket(upstream):
+    calls, responses = upstream
+    responses.extend([httpx.Response(429, headers={"Retry-After": "30"})])
+
+    response = await ifood_request("GET", "https://api.test/orders/2", endpoint="order_get", merchant_key="rest-30")
+
+    # Retry-After acima de IFOOD_RETRY_AFTER_MAX_SECONDS: devolve o 429 sem esperar
+    assert response.status_code == 429
+    assert len(calls) == 1
+    assert merchant_rate_limiter.bucket("ifood:rest-30").blocked_for > 25
+    assert ifood_http.get_platform_rate_limiter("ifood").blocked_for == 0
+
+
+async def test_platforms_without_authorization_header_get_merchant_buckets(upstream):
+    await ifood_request(
+        "GET", "https://rappi.test/orders/1", endpoint="order_get", platform="rappi",
+        merchant_key="rest-rappi", headers={"x-authorization": "Bearer app-token"},
+    )
+    await ifood_request(
+        "GET", "https://99food.test/order", endpoint="order_get", platform="99food",
+        merchant_key="rest-99", params={"auth_token": "token"},
+    )
+    assert "rappi:rest-rappi" in merchant_rate_limiter._buckets
+    assert "99food:rest-99" in merchant_rate_limiter._buckets
+
+
+async def test_breaker_opens_on_5xx_and_rejects_without_calling(upstream, monkeypatch):
+    calls, responses = upstream
+    breaker = ifood_http.get_circuit_breaker("merchant_status")
+    monkeypatch.setattr(breaker, "failure_threshold", 3)
+    responses.extend(httpx.Response(500) for _ in range(3))
+
+    for _ in range(3):
+        assert (await ifood_request("GET", "https://api.test/status", endpoint="merchant_status")).status_code == 500
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError):
+        await ifood_request("GET", "https://api.test/status", endpoint="merchant_status")
+    assert len(calls) == 3
@@ -0,0 +1,63 @@
+# tests/test_merchant_index.py
+from typing import Dict, Iterable, Optional
+
+import pytest
+
+from app import shared_state
+from app.merchant_index import MerchantIndex, _shared_key
+from app.shared_state import MemoryStateBackend
+
+pytestmark = pytest.mark.anyio
+
+
+class SharedMemoryBackend(MemoryStateBackend):
+    """Backend em memória que se comporta como compartilhado (o papel do Redis)."""
+    shared = True
+
+
+class FakeIntegracoes:
+    def __init__(self, mapping: Dict[str, str]):
+        self.mapping = mapping
+        self.queried = []
+
+    async def find_restaurante_id(self, external_merchant_id: str, plataforma: str) -> Optional[str]:
+        self.queried.append([external_merchant_id])
+        return self.mapping.get(external_merchant_id)
+
+    async def find_restaurante_ids(self, external_merchant_ids: Iterable[str], plataforma: str) -> Dict[str, str]:
+        ids = sorted(external_merchant_ids)
+        self.queried.append(ids)
+        return {mid: self.mapping[mid] for mid in ids if mid in self.mapping}
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = SharedMemoryBackend()
+    monkeypatch.setattr(shared_state, "_backend", backend)
+    return backend
+
+
+async def test_resolve_many_reads_the_shared_backend_before_the_database(backend):
+    await backend.set(_shared_key("ifood", "m1"), "rest-1", 60)
+    integracoes = FakeIntegracoes({"m2": "rest-2"})
+    index = MerchantIndex()
+
+    resolved = await index.resolve_many(["m1", "m2", "m3"], "ifood", integracoes)
+
+    assert resolved == {"m1": "rest-1", "m2": "rest-2", "m3": None}
+    assert integracoes.queried == [["m2", "m3"]]
+    # O que veio do banco fica visível aos outros processos; o ausente vai ao cache negativo
+    assert await backend.get(_shared_key("ifood", "m2")) == "rest-2"
+    assert index.is_known_missing("m3", "ifood")
+
+
+async def test_resolve_many_keeps_one_merchant_per_restaurant(backend):
+    # Loja trocou de merchant: o mapeamento antigo sai do índice local (put_local)
+    index = MerchantIndex()
+    index.put_local("m-antigo", "ifood", "rest-1")
+    integracoes = FakeIntegracoes({"m-novo": "rest-1"})
+
+    await index.resolve_many(["m-novo"], "ifood", integracoes)
+
+    assert index.get("m-novo", "ifood") == "rest-1"
+    assert index.get("m-antigo", "ifood") is None
@@ -0,0 +1,75 @@
+# tests/test_order_queue.py
+import asyncio
+
+import pytest
+
+from app.order_queue import OrderQueue
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def queue(tmp_path):
+    queue = OrderQueue(path=str(tmp_path / "queue.sqlite3"), workers=3, lease_seconds=0.3, backoff_base_seconds=0.05)
+    yield queue
+    await queue.stop()
+
+
+async def wait_until(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condição não atingida a tempo")
+        await asyncio.sleep(0.02)
+
+
+async def test_job_longer_than_lease_runs_once(queue):
+    runs = []
+
+    async def slow_handler(payload):
+        runs.append(payload["n"])
+        await asyncio.sleep(1.2)  # 4x o lease: só o heartbeat impede outro worker de reassumir
+
+    queue.register_handler("slow", slow_handler)
+    queue.start()
+    await queue.enqueue("slow", "rest-1", {"n": 1})
+    await asyncio.sleep(2.0)
+
+    assert runs == [1]
+    assert await queue._db(queue._count_by_status) == {}
+
+
+async def test_stolen_lease_discards_result(queue):
+    finished = asyncio.Event()
+
+    async def handler(payload):
+        finished.set()
+
+    queue.register_handler("job", handler)
+    await queue.enqueue("job", "rest-1", {})
+    job = await queue._db(queue._claim)
+    # Outro worker reassumiu o job depois de o lease expirar
+    await queue._db(lambda conn: conn.execute("UPDATE jobs SET lease_token = 'outro' WHERE id = ?", (job["id"],)))
+
+    await queue._run_job(job)
+
+    assert finished.is_set()
+    assert await queue._db(queue._count_by_status) == {"running": 1}
+
+
+async def test_partition_keeps_order_across_retries(queue):
+    seen = []
+    failures = {"placed": 1}
+
+    async def handler(payload):
+        if failures.get(payload["event"]):
+            failures[payload["event"]] -= 1
+            raise ConnectionError("falha transitória")
+        seen.append(payload["event"])
+
+    queue.register_handler("order", handler)
+    await queue.enqueue_many("order", [("rest-1", {"event": "placed"}), ("rest-1", {"event": "cancelled"})])
+    queue.start()
+
+    await wait_until(lambda: len(seen) == 2)
+    assert seen == ["placed", "cancelled"]
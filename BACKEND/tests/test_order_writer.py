@@ -0,0 +1,24 @@
+# tests/test_order_writer.py
+import pytest
+
+from app.order_writer import OrderWriter, status_row
+
+pytestmark = pytest.mark.anyio
+
+
+class FakePedidos:
+    def __init__(self):
+        self.rows = []
+
+    async def upsert_many(self, rows):
+        self.rows.extend(rows)
+        return rows
+
+
+async def test_status_only_rows_carry_the_order_platform():
+    pedidos = FakePedidos()
+    writer = OrderWriter(pedidos, name="status")
+
+    await writer.write([status_row("rest-1", "rappi:123", "confirmed"), status_row("rest-1", "456", "pending")])
+
+    assert {row["ifood_order_id"]: row["plataforma"] for row in pedidos.rows} == {"rappi:123": "rappi", "456": "ifood"}
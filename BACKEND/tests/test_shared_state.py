@@ -0,0 +1,88 @@
+# tests/test_shared_state.py
+import asyncio
+import gc
+
+import pytest
+
+from app import shared_state
+from app.shared_state import LockUnavailable, MemoryStateBackend, RedisStateBackend
+
+fakeredis = pytest.importorskip("fakeredis")
+
+pytestmark = pytest.mark.anyio
+
+
+# -----------------------------------------------------------
+# EM MEMÓRIA
+# -----------------------------------------------------------
+async def test_memory_locks_are_released_after_use():
+    backend = MemoryStateBackend()
+    for index in range(500):
+        async with backend.lock(f"token:rest-{index}:ifood"):
+            pass
+    gc.collect()
+    assert len(backend._locks) == 0
+
+
+async def test_memory_sweeps_expired_keys_on_write():
+    backend = MemoryStateBackend(sweep_seconds=0)
+    await backend.add_many([f"evento-{index}" for index in range(100)], ttl_seconds=0.01)
+    await asyncio.sleep(0.02)
+    await backend.set("merchant:m1", "rest-1", ttl_seconds=60)
+    assert len(backend) == 1
+    assert await backend.get("merchant:m1") == "rest-1"
+
+
+async def test_memory_bounds_the_number_of_keys():
+    backend = MemoryStateBackend(max_keys=10)
+    for index in range(50):
+        await backend.set(f"chave-{index}", index, ttl_seconds=60)
+    assert len(backend) == 10
+    assert await backend.get("chave-49") == 49
+    assert await backend.get("chave-0") is None
+
+
+# -----------------------------------------------------------
+# REDIS (fakeredis)
+# -----------------------------------------------------------
+@pytest.fixture
+async def redis_backend(monkeypatch):
+    monkeypatch.setattr(shared_state, "STATE_LOCK_TIMEOUT_SECONDS", 0.3)
+    monkeypatch.setattr(shared_state, "STATE_LOCK_WAIT_SECONDS", 0.1)
+    server = fakeredis.FakeServer()
+    backends = []
+
+    def build() -> RedisStateBackend:
+        backend = RedisStateBackend("redis://localhost:6379/0")
+        backend._client = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+        backends.append(backend)
+        return backend
+
+    yield build
+    for backend in backends:
+        await backend._client.aclose()
+
+
+async def test_redis_lock_is_extended_while_held(redis_backend):
+    first, second = redis_backend(), redis_backend()
+    async with first.lock("token:rest-1:ifood"):
+        # Bem além da validade de 0.3s: sem a extensão o outro processo entraria
+        await asyncio.sleep(0.8)
+        with pytest.raises(LockUnavailable):
+            async with second.lock("token:rest-1:ifood"):
+                pass
+    async with second.lock("token:rest-1:ifood"):
+        pass
+
+
+async def test_redis_lock_fails_instead_of_running_unlocked(redis_backend):
+    backend = redis_backend()
+    down = fakeredis.FakeServer()
+    down.connected = False  # Redis fora do ar
+    await backend._client.aclose()
+    backend._client = fakeredis.aioredis.FakeRedis(server=down, decode_responses=True)
+    entered = False
+    with pytest.raises(LockUnavailable):
+        async with backend.lock("token:rest-1:ifood"):
+            entered = True
+    assert not entered
@@ -0,0 +1,33 @@
+# tests/test_token_cache.py
+import asyncio
+import gc
+
+import pytest
+
+from app.token_cache import TokenCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_locks_are_released_after_use():
+    cache = TokenCache()
+    for index in range(1000):
+        async with cache.lock((f"rest-{index}", "ifood")):
+            pass
+    gc.collect()
+    assert len(cache._locks) == 0
+
+
+async def test_waiters_share_the_same_lock():
+    cache = TokenCache()
+    key = ("rest-1", "ifood")
+    order = []
+
+    async def refresh(name: str) -> None:
+        async with cache.lock(key):
+            order.append(f"{name}:start")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}:end")
+
+    await asyncio.gather(refresh("a"), refresh("b"))
+    assert order == ["a:start", "a:end", "b:start", "b:end"]
@@ -0,0 +1,65 @@
+# tests/test_webhook_intake.py
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.order_queue import get_order_queue
+from app.platform_routes import router as platform_router
+from app.routes import router
+from app.webhook_intake import WebhookRejected, decode_body
+
+pytestmark = pytest.mark.anyio
+
+EVENT = {"id": "evt-1", "code": "PLC", "orderId": "order-1", "metadata": {"merchantId": "m1"}}
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.jobs = []
+
+    async def enqueue(self, job_type, partition_key, payload):
+        self.jobs.append((job_type, partition_key, payload))
+
+
+@pytest.fixture
+def queue():
+    return RecordingQueue()
+
+
+@pytest.fixture
+async def client(queue):
+    app = FastAPI()
+    app.include_router(router)
+    app.include_router(platform_router)
+    app.dependency_overrides[get_order_queue] = lambda: queue
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+def test_decode_body_rejects_non_utf8():
+    assert decode_body(json.dumps(EVENT).encode("utf-8")) == json.dumps(EVENT)
+    with pytest.raises(WebhookRejected) as rejected:
+        decode_body(json.dumps(EVENT).encode("utf-16"))
+    assert rejected.value.status_code == 400
+
+
+async def test_webhook_rejects_utf16_body_with_400(client, queue):
+    response = await client.post("/ifood/webhook", content=json.dumps(EVENT).encode("utf-16"))
+    assert response.status_code == 400
+    assert queue.jobs == []
+
+
+async def test_webhook_enqueues_the_utf8_text(client, queue):
+    body = json.dumps(EVENT, ensure_ascii=False).encode("utf-8")
+    response = await client.post("/ifood/webhook", content=body)
+    assert response.status_code == 200
+    assert queue.jobs[0][2] == {"body": body.decode("utf-8")}
+
+
+async def test_platform_webhook_rejects_utf16_body_with_400(client, queue):
+    event = {"event": "ORDER_EVENT_CANCEL", "order_id": 1, "store_id": "s1"}
+    response = await client.post("/platforms/rappi/webhook", content=json.dumps(event).encode("utf-32"))
+    assert response.status_code == 400
+    assert queue.jobs == []